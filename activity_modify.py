@@ -10,15 +10,27 @@ import textwrap
 from collections import defaultdict
 import matplotlib.pyplot as plt
 import os
+import json
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
-from scipy.optimize import curve_fit
+import matrix_utils as mu
+from scipy import sparse
+from scipy.interpolate import CubicSpline
 
 from database_setup import find_activity_by_name_product_location
 from database_setup import find_activity_by_id
-from lifecycle import run_comprehensive_lcia
+from lifecycle import run_comprehensive_lcia, score_lca_methods
+from lifecycle import build_database_lca, lca_matrix_index, lcia_cache_enabled
+from lifecycle import solve_technosphere_demands, characterization_vectors
+from lifecycle import MATRIX_SNAPSHOTS
+from lifecycle import database_state_hash
+from profiling import profiled, profile_stage
 
 
+@profiled()
 def modify_activity_permanently(activity, scaling_coefficients, methods_list):
     """
     Permanently modify biosphere exchanges in an activity based on scaling coefficients,
@@ -55,7 +67,8 @@ def modify_activity_permanently(activity, scaling_coefficients, methods_list):
 
                 # Modify the exchange and save it
                 exc['amount'] = new_amount
-                exc.save()  # Save changes to the database
+                with profile_stage('exchange saves'):
+                    exc.save()  # Save changes to the database
 
                 modified_exchanges.append((exc, original_amount))  # Store for reporting
                 print(f"Modified exchange '{exchange_name}' "
@@ -73,6 +86,7 @@ def modify_activity_permanently(activity, scaling_coefficients, methods_list):
     return results_after  # Return the results from LCIA after modification
 
 
+@profiled()
 def modify_activity_temporarily(activity, scaling_coefficients, methods_list):
     """
     Temporarily modify biosphere exchanges in an activity based on scaling coefficients,
@@ -112,7 +126,8 @@ def modify_activity_temporarily(activity, scaling_coefficients, methods_list):
 
                 # Modify the exchange and save it
                 exc['amount'] = new_amount
-                exc.save()  # Save changes to the database
+                with profile_stage('exchange saves'):
+                    exc.save()  # Save changes to the database
 
                 print(f"Temporarily modified exchange '{exchange_name}' "
                       f"from amount {original_amount} to new amount: {new_amount}")
@@ -128,14 +143,168 @@ def modify_activity_temporarily(activity, scaling_coefficients, methods_list):
     print("\nReverting exchanges back to original values...")
     for exc, original_amount in original_exchanges:
         exc['amount'] = original_amount
-        exc.save()  # Save changes to the database
+        with profile_stage('exchange saves'):
+            exc.save()  # Save changes to the database
 
     print("Reversion complete.")
 
     return results_after  # Return the results from LCIA after modification
 
 
-def modify_activities_in_databases(project_name, databases, years, activity_name, reference_product, location, methods_list, modify_permanently=False, df=None):
+@profiled()
+def modify_activity_in_memory(activity, scaling_coefficients, methods_list, lca=None):
+    """
+    Non-persistent version of modify_activity_temporarily: the scaling coefficients are applied
+    to the biosphere matrix of an LCA object and the scores are recomputed, without any database I/O.
+    The biosphere matrix is restored afterwards, so the LCA object can be reused.
+
+    Parameters:
+    - activity: The activity to modify.
+    - scaling_coefficients: A dictionary with keys as exchange names (sub_activity)
+                            and values as scaling factors.
+    - methods_list: A list of tuples representing the impact assessment methods.
+    - lca: An LCA object already solved for {activity: 1} (optional). Built if not provided.
+
+    Returns:
+    - results_after: LCIA results after the modifications.
+    """
+    if lca is None:
+        lca = build_database_lca(activity, methods_list[0])
+
+    if not scaling_coefficients:
+        print("No scaling coefficients provided. Skipping modifications.")
+        # Run LCIA without modifications
+        results_after = run_comprehensive_lcia(activity, methods_list, lca=lca)
+        return results_after
+
+    print("\nApplying scaling coefficients to the biosphere matrix (in memory)...")
+    biosphere_matrix = lca.biosphere_matrix
+    activity_col = lca_matrix_index(lca.dicts.activity, activity)
+    original_values = {}
+
+    # Scale each biosphere flow of the activity once: the matrix entry already sums repeated exchanges
+    for exc in activity.biosphere():
+        exchange_name = exc.input['name']
+        if exchange_name not in scaling_coefficients:
+            continue
+
+        try:
+            flow_row = lca_matrix_index(lca.dicts.biosphere, exc.input)
+        except KeyError:
+            print(f"Biosphere flow '{exchange_name}' not found in the biosphere matrix. Skipping.")
+            continue
+
+        if flow_row in original_values:
+            continue
+
+        original_amount = biosphere_matrix[flow_row, activity_col]
+        new_amount = original_amount * scaling_coefficients[exchange_name]
+        original_values[flow_row] = original_amount
+        biosphere_matrix[flow_row, activity_col] = new_amount
+
+        print(f"Temporarily modified exchange '{exchange_name}' "
+              f"from amount {original_amount} to new amount: {new_amount}")
+
+    # The technosphere is unchanged, so only the inventory needs to be recomputed
+    print("\nLCIA after temporary modification:")
+    try:
+        lca.inventory = biosphere_matrix @ sparse.diags(lca.supply_array)
+        results_after = run_comprehensive_lcia(activity, methods_list, lca=lca)
+    finally:
+        # Restore the biosphere matrix and the inventory of the LCA object
+        for flow_row, original_amount in original_values.items():
+            biosphere_matrix[flow_row, activity_col] = original_amount
+        lca.inventory = biosphere_matrix @ sparse.diags(lca.supply_array)
+
+    return results_after
+
+
+def get_scaling_coefficients(df, activity_name, location, year, db_name):
+    """
+    Get the scaling coefficients of an activity for a given year from a coefficients DataFrame.
+
+    Parameters:
+    - df: DataFrame containing the sub-activities and coefficients (can be None).
+    - activity_name: Name of the main activity.
+    - location: Location of the main activity.
+    - year: Year of the coefficient column ('coeff_<year>').
+    - db_name: Name of the database (for reporting).
+
+    Returns:
+    - scaling_coefficients: A dictionary with sub_activity names as keys and scaling factors as values.
+                            Empty if there is nothing to modify.
+    """
+    # Check if df (coefficients DataFrame) is provided and contains modifications
+    if df is None or df.empty:
+        print(f"No modifications to apply for activity '{activity_name}' in database '{db_name}'.")
+        return {}
+
+    # Filter the DataFrame for the activity and VSI_modify == True
+    df_activity = df[
+        (df['activity_name'] == activity_name) &
+        (df['activity_location'] == location) &
+        (df['VSI_modify'] == True)
+    ]
+
+    # Proceed only if there are modifications to apply
+    if df_activity.empty:
+        print(f"No biosphere exchanges to modify for activity '{activity_name}' in database '{db_name}'.")
+        return {}
+
+    # Get the coefficient column for the current year
+    coeff_column = f'coeff_{year}'
+    if coeff_column not in df_activity.columns:
+        print(f"Coefficient column '{coeff_column}' not found in DataFrame.")
+        return {}
+
+    # Prepare scaling coefficients dictionary for biosphere exchanges
+    scaling_coefficients = {}
+    for sub_activity_name, scaling_coefficient in zip(df_activity['sub_activity'], df_activity[coeff_column]):
+        # Ensure the scaling coefficient is a valid number
+        if pd.isnull(scaling_coefficient):
+            print(f"Scaling coefficient for sub_activity '{sub_activity_name}' is NaN. Skipping.")
+            continue
+
+        scaling_coefficients[sub_activity_name] = scaling_coefficient
+
+    if not scaling_coefficients:
+        print(f"No valid scaling coefficients found for activity '{activity_name}' in database '{db_name}'.")
+
+    return scaling_coefficients
+
+
+def comparison_rows(db_name, year, activity_name, methods_list, results_before, results_after):
+    """
+    Build the result rows (one per method) comparing the scores before and after modification.
+
+    Returns:
+    - rows: A list of dictionaries, as collected in modify_activities_in_databases.
+    """
+    rows = []
+    for method in methods_list:
+        score_before = results_before.get(method, None)
+        score_after = results_after.get(method, None)
+        if score_before is not None and score_after is not None:
+            difference = score_after - score_before
+            percent_change = (difference / score_before) * 100 if score_before != 0 else float('inf')
+            rows.append({
+                'Database': db_name,
+                'Year': year,
+                'Activity': activity_name,
+                'Method': method,
+                'Score Before': score_before,
+                'Score After': score_after,
+                'Difference': difference,
+                'Percentage Change': percent_change
+            })
+        else:
+            print(f"Results not available for method: {method}")
+
+    return rows
+
+
+@profiled()
+def modify_activities_in_databases(project_name, databases, years, activity_name, reference_product, location, methods_list, modify_permanently=False, df=None, in_memory=False):
     """
     Modify specified biosphere exchanges in the given databases based on coefficients for each year.
     Collect and store results for comparison.
@@ -150,6 +319,8 @@ def modify_activities_in_databases(project_name, databases, years, activity_name
     - methods_list: List of impact assessment methods.
     - modify_permanently: Boolean indicating whether to modify permanently or temporarily.
     - df: DataFrame containing the sub-activities and coefficients (optional).
+    - in_memory: When modifying temporarily, patch the biosphere matrix in memory (see modify_activity_in_memory)
+                 instead of saving and reverting the exchanges in the database.
 
     Returns:
     - results_df: A pandas DataFrame containing the results from all scenarios.
@@ -167,8 +338,9 @@ def modify_activities_in_databases(project_name, databases, years, activity_name
     for db_name, year in zip(databases, years):
         print(f"\nProcessing database '{db_name}' for year {year}...")
 
-        # Set the project
-        bd.projects.set_current(project_name)
+        # Set the project (kept as is if already current, e.g. opened read-only by a worker)
+        if bd.projects.current != project_name:
+            bd.projects.set_current(project_name)
 
         # Ensure the database is loaded
         if db_name not in bd.databases:
@@ -184,85 +356,37 @@ def modify_activities_in_databases(project_name, databases, years, activity_name
             continue  # Skip to next database if activity not found
 
         # Run LCIA before modification
+        # For in-memory modifications, the same LCA object is reused for the modified scores
+        # (unless the LCIA result cache is enabled, so that the scores before modification can come from it)
+        activity_lca = None
+        if in_memory and not modify_permanently and not lcia_cache_enabled():
+            activity_lca = build_database_lca(activity, methods_list[0])
+
         print("\nLCIA before modification:")
-        results_before = run_comprehensive_lcia(activity, methods_list)
-
-        # Check if df (coefficients DataFrame) is provided and contains modifications
-        if df is not None and not df.empty:
-            # Filter the DataFrame for the activity and VSI_modify == True
-            df_activity = df[
-                (df['activity_name'] == activity_name) &
-                (df['activity_location'] == location) &
-                (df['VSI_modify'] == True)
-            ]
-
-            # Proceed only if there are modifications to apply
-            if not df_activity.empty:
-                # Get the coefficient column for the current year
-                coeff_column = f'coeff_{year}'
-                if coeff_column not in df_activity.columns:
-                    print(f"Coefficient column '{coeff_column}' not found in DataFrame.")
-                    # Since no modifications, set results_after same as results_before
-                    results_after = results_before
-                else:
-                    # Prepare scaling coefficients dictionary for biosphere exchanges
-                    scaling_coefficients = {}
-                    for idx, row in df_activity.iterrows():
-                        # Get the sub_activity (biosphere exchange name)
-                        sub_activity_name = row['sub_activity']
-
-                        # Get the scaling coefficient
-                        scaling_coefficient = row[coeff_column]
-
-                        # Ensure the scaling coefficient is a valid number
-                        if pd.isnull(scaling_coefficient):
-                            print(f"Scaling coefficient for sub_activity '{sub_activity_name}' is NaN. Skipping.")
-                            continue
-
-                        scaling_coefficients[sub_activity_name] = scaling_coefficient
-
-                    if not scaling_coefficients:
-                        print(f"No valid scaling coefficients found for activity '{activity_name}' in database '{db_name}'.")
-                        # Since no modifications, set results_after same as results_before
-                        results_after = results_before
-                    else:
-                        # Modify biosphere exchanges using the updated functions
-                        if modify_permanently:
-                            results_after = modify_activity_permanently(
-                                activity, scaling_coefficients, methods_list
-                            )
-                        else:
-                            results_after = modify_activity_temporarily(
-                                activity, scaling_coefficients, methods_list
-                            )
-            else:
-                print(f"No biosphere exchanges to modify for activity '{activity_name}' in database '{db_name}'.")
-                # Since no modifications, set results_after same as results_before
-                results_after = results_before
-        else:
-            print(f"No modifications to apply for activity '{activity_name}' in database '{db_name}'.")
+        results_before = run_comprehensive_lcia(activity, methods_list, lca=activity_lca)
+
+        # Scaling coefficients of the activity for the current year (empty if there is nothing to modify)
+        scaling_coefficients = get_scaling_coefficients(df, activity_name, location, year, db_name)
+
+        if not scaling_coefficients:
             # Since no modifications, set results_after same as results_before
             results_after = results_before
+        # Modify biosphere exchanges using the updated functions
+        elif modify_permanently:
+            results_after = modify_activity_permanently(
+                activity, scaling_coefficients, methods_list
+            )
+        elif in_memory:
+            results_after = modify_activity_in_memory(
+                activity, scaling_coefficients, methods_list, lca=activity_lca
+            )
+        else:
+            results_after = modify_activity_temporarily(
+                activity, scaling_coefficients, methods_list
+            )
 
         # Collect results for each method
-        for method in methods_list:
-            score_before = results_before.get(method, None)
-            score_after = results_after.get(method, None)
-            if score_before is not None and score_after is not None:
-                difference = score_after - score_before
-                percent_change = (difference / score_before) * 100 if score_before != 0 else float('inf')
-                results_list.append({
-                    'Database': db_name,
-                    'Year': year,
-                    'Activity': activity_name,
-                    'Method': method,
-                    'Score Before': score_before,
-                    'Score After': score_after,
-                    'Difference': difference,
-                    'Percentage Change': percent_change
-                })
-            else:
-                print(f"Results not available for method: {method}")
+        results_list.extend(comparison_rows(db_name, year, activity_name, methods_list, results_before, results_after))
 
         print(f"Modifications and analysis completed for activity '{activity_name}' in database '{db_name}'.")
 
@@ -272,7 +396,229 @@ def modify_activities_in_databases(project_name, databases, years, activity_name
     return results_df
 
 
-def process_all_csvs(project_name, input_folder, methods_list, databases, years, modify_permanently=False):
+@profiled()
+def load_coefficients(csv_file, interpolate=False, years=None, curve='logistic'):
+    """
+    Read a coefficient CSV and prepare it for modify_activities_in_databases.
+
+    Args:
+        csv_file (str): Path to the coefficient CSV file.
+        interpolate (bool): Whether to interpolate the missing coefficients.
+        years (list): Years that must have a coefficient when interpolating (optional).
+        curve (str): Interpolation curve (see interpolate_missing_coefficients).
+
+    Returns:
+        pd.DataFrame: The coefficients, with 'VSI_modify' as a boolean.
+    """
+    coeff_df = pd.read_csv(csv_file)
+
+    # Ensure 'VSI_modify' is a boolean
+    coeff_df['VSI_modify'] = coeff_df['VSI_modify'].fillna(False).astype(bool)
+
+    if interpolate:
+        coeff_df = interpolate_missing_coefficients(coeff_df, years=years, curve=curve)
+
+    return coeff_df
+
+
+def coefficient_years(coeff_df):
+    """Return the sorted years of the 'coeff_<year>' columns of a coefficient DataFrame."""
+    years = []
+    for column in coeff_df.columns:
+        if isinstance(column, str) and column.startswith('coeff_') and column[len('coeff_'):].isdigit():
+            years.append(int(column[len('coeff_'):]))
+    return sorted(years)
+
+
+def interpolate_missing_coefficients(coeff_df, years=None, curve='logistic'):
+    """
+    Interpolate the missing coefficients of every 'coeff_<year>' column, for all rows at once.
+    The logistic curve spans the first and last known coefficients of each row (by default 2025 and 2040),
+    the linear curve joins the closest known coefficients before and after each year, and the spline goes
+    through all known coefficients. Years outside the known range are left empty.
+
+    Args:
+        coeff_df (pd.DataFrame): Coefficients with 'coeff_<year>' columns.
+        years (list): Years that must have a coefficient column (optional). Missing columns are added.
+        curve (str): 'logistic' (direct_logistic, default), 'linear' or 'spline'.
+
+    Returns:
+        pd.DataFrame: A new DataFrame, with the missing coefficients filled (coeff_df is left unchanged).
+    """
+    if curve not in ('logistic', 'linear', 'spline'):
+        raise ValueError(f"Unknown interpolation curve '{curve}'. Use 'logistic', 'linear' or 'spline'.")
+
+    coeff_df = coeff_df.copy()
+
+    # Add the columns of the requested years
+    for year in years or []:
+        if f'coeff_{year}' not in coeff_df.columns:
+            coeff_df[f'coeff_{year}'] = np.nan
+
+    all_years = coefficient_years(coeff_df)
+    if not all_years or coeff_df.empty:
+        return coeff_df
+
+    columns = [f'coeff_{year}' for year in all_years]
+    values = coeff_df[columns].astype(float).to_numpy()  # rows x years
+    known = ~np.isnan(values)
+    year_grid = np.broadcast_to(np.array(all_years, dtype=float), values.shape)
+
+    # Closest known year and value before / after each cell
+    known_years = pd.DataFrame(np.where(known, year_grid, np.nan))
+    known_values = pd.DataFrame(values)
+    previous_year = known_years.ffill(axis=1).to_numpy()
+    previous_value = known_values.ffill(axis=1).to_numpy()
+    next_year = known_years.bfill(axis=1).to_numpy()
+    next_value = known_values.bfill(axis=1).to_numpy()
+    inside = ~np.isnan(previous_year) & ~np.isnan(next_year)
+
+    with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+        if curve == 'logistic':
+            # First and last known coefficients of each row
+            first_year, first_value = next_year[:, [0]], next_value[:, [0]]
+            last_year, last_value = previous_year[:, [-1]], previous_value[:, [-1]]
+            interpolated = direct_logistic(year_grid, first_year, first_value, last_year, last_value)
+        elif curve == 'linear':
+            interpolated = previous_value + (next_value - previous_value) * (year_grid - previous_year) / (next_year - previous_year)
+        else:
+            interpolated = _spline_coefficients(values, known, np.array(all_years, dtype=float))
+
+    coeff_df[columns] = np.where(known, values, np.where(inside, interpolated, np.nan))
+
+    return coeff_df
+
+
+def _spline_coefficients(values, known, years):
+    """
+    Cubic spline through the known coefficients of each row, evaluated at every year.
+    Rows sharing the same known years are fitted together.
+    """
+    result = np.full(values.shape, np.nan)
+    patterns, pattern_ids = np.unique(known, axis=0, return_inverse=True)
+
+    for pattern_id, pattern in enumerate(patterns):
+        if pattern.sum() < 2:
+            continue
+        rows = np.flatnonzero(pattern_ids.ravel() == pattern_id)
+        spline = CubicSpline(years[pattern], values[np.ix_(rows, pattern)].T, axis=0)
+        result[rows] = spline(years).T
+
+    return result
+
+
+def iter_csv_results(project_name, input_folder, methods_list, databases, years, modify_permanently=False, interpolate=False, curve='logistic'):
+    """
+    Generator behind process_all_csvs and process_all_csvs_interpolate: processes the CSV files one by one
+    and yields the result DataFrame of each activity as soon as it is available.
+
+    Args:
+        project_name (str): Name of the Brightway2 project.
+        input_folder (str): Path to the folder containing the input CSV files.
+        methods_list (list): List of LCIA methods to be used.
+        databases (list): List of databases to be modified.
+        years (list): List of years to apply the changes.
+        modify_permanently (bool): Whether to make the changes permanent.
+        interpolate (bool): Whether to interpolate missing coefficients.
+        curve (str): Interpolation curve (see interpolate_missing_coefficients).
+
+    Yields:
+        pd.DataFrame: Results for one activity (one CSV file), across all databases.
+    """
+    # Loop through all CSV files in the input folder
+    for file_name in sorted(os.listdir(input_folder)):
+        print(f'Processing activity from: {file_name}')
+        if not file_name.endswith('.csv'):
+            continue
+
+        # Read the CSV file (and interpolate missing coefficients if required)
+        csv_file = os.path.join(input_folder, file_name)
+        coeff_df = load_coefficients(csv_file, interpolate=interpolate, years=years, curve=curve)
+
+        # Extract activity details
+        activity_id = file_name.replace('.csv', '')  # Extract activity ID from file name
+
+        ## BIG WARNING! ##
+        # I'm not sure if this might cause issues in the future, but I'm considering the same activity ID across databases
+        # Right now, I've checked and when new DBs are generated, they replicate the original activity ID, so this works.
+        # Might not be the case in the future!!
+
+        db_name = databases[0]
+        activity = find_activity_by_id(db_name, activity_id)
+        activity_name = activity.get('name')
+        location = activity.get('location')
+        reference_product = activity.get('reference product')
+
+        # Call the function to modify activities and collect LCIA results
+        result_df = modify_activities_in_databases(
+            project_name,
+            databases,
+            years,
+            activity_name,
+            reference_product,
+            location,
+            methods_list,
+            modify_permanently=modify_permanently,
+            df=coeff_df
+        )
+
+        # I need to preserve activity_id for the case in which we get multiple activities with the same name:
+        result_df['activity_id'] = activity_id
+
+        yield result_df
+
+
+@profiled()
+def append_results_to_parquet(results, output_file):
+    """
+    Pass the result DataFrames through, appending each one to a Parquet file as it goes (one row group each),
+    so that partial results are on disk even if the run stops.
+
+    Args:
+        results (iterable): Result DataFrames, e.g. from iter_csv_results.
+        output_file (str): Path of the Parquet file (overwritten).
+
+    Yields:
+        pd.DataFrame: The same DataFrames.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for result_df in results:
+            if not result_df.empty:
+                if writer is None:
+                    table = pa.Table.from_pandas(result_df, preserve_index=False)
+                    writer = pq.ParquetWriter(output_file, table.schema)
+                else:
+                    table = pa.Table.from_pandas(result_df, schema=writer.schema, preserve_index=False)
+                writer.write_table(table)
+            yield result_df
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def combine_results(results):
+    """
+    Concatenate result DataFrames once, at the end (instead of growing a DataFrame in the loop).
+
+    Args:
+        results (iterable): Result DataFrames, e.g. from iter_csv_results.
+
+    Returns:
+        pd.DataFrame: Combined results.
+    """
+    results = [result_df for result_df in results if not result_df.empty]
+    if not results:
+        return pd.DataFrame()
+
+    return pd.concat(results, ignore_index=True)
+
+
+@profiled()
+def process_all_csvs(project_name, input_folder, methods_list, databases, years, modify_permanently=False, n_workers=None, output_file=None, batch=False):
     """
     Loops through all CSV files in the input folder and modifies corresponding activities
     in the specified databases across multiple years.
@@ -282,59 +628,27 @@ def process_all_csvs(project_name, input_folder, methods_list, databases, years,
         methods_list (list): List of LCIA methods to be used.
         databases (list): List of databases to be modified.
         years (list): List of years to apply the changes.
+        n_workers (int): Number of worker processes. If more than 1, see process_all_csvs_parallel.
+        output_file (str): Parquet file to which the results of each activity are appended as they come (optional).
+        batch (bool): Open each database once and apply all CSVs to it (see process_all_csvs_batch).
 
     Returns:
         pd.DataFrame: Combined results for all processed activities.
     """
-    # Prepare an empty DataFrame to store combined results
-    combined_results = pd.DataFrame()
-
-    # Loop through all CSV files in the input folder
-    for file_name in os.listdir(input_folder):
-        print(f'Processing activity from: {file_name}')
-        if file_name.endswith('.csv'):
-            # Read the CSV file
-            csv_file = os.path.join(input_folder, file_name)
-            coeff_df = pd.read_csv(csv_file)
-
-            # Ensure 'VSI_modify' is a boolean
-            coeff_df['VSI_modify'] = coeff_df['VSI_modify'].fillna(False).astype(bool)
-
-            # Extract activity details
-            activity_id = file_name.replace('.csv', '')  # Extract activity ID from file name
-            
-            ## BIG WARNING! ##
-            # I'm not sure if this might cause issues in the future, but I'm considering the same activity ID across databases
-            # Right now, I've checked and when new DBs are generated, they replicate the original activity ID, so this works.
-            # Might not be the case in the future!!
-
-            db_name = databases[0]
-            activity = find_activity_by_id(db_name, activity_id)
-            activity_name = activity.get('name')
-            location = activity.get('location')
-            reference_product = activity.get('reference product')
-            project_name = project_name
-            
-            # Call the function to modify activities and collect LCIA results
-            result_df = modify_activities_in_databases(
-                project_name,
-                databases, 
-                years,
-                activity_name, 
-                reference_product, 
-                location,
-                methods_list, 
-                modify_permanently=modify_permanently,
-                df=coeff_df
-            )
+    if batch:
+        return process_all_csvs_batch(project_name, input_folder, methods_list, databases, years,
+                                      interpolate=False, modify_permanently=modify_permanently)
 
-            # I need to preserve activity_id for the case in which we get multiple activities with the same name:
-            result_df['activity_id'] = activity_id
+    if n_workers is not None and n_workers > 1:
+        return process_all_csvs_parallel(project_name, input_folder, methods_list, databases, years,
+                                         interpolate=False, modify_permanently=modify_permanently, n_workers=n_workers)
 
-            # Append results to the combined DataFrame
-            combined_results = pd.concat([combined_results, result_df], ignore_index=True)
+    results = iter_csv_results(project_name, input_folder, methods_list, databases, years,
+                               modify_permanently=modify_permanently, interpolate=False)
+    if output_file is not None:
+        results = append_results_to_parquet(results, output_file)
 
-    return combined_results
+    return combine_results(results)
 
 
 def direct_logistic(target_year, initial_year, lower, final_year, upper):
@@ -344,7 +658,8 @@ def direct_logistic(target_year, initial_year, lower, final_year, upper):
     return lower + (upper - lower) / (1 + np.exp(k*(target_year - ((final_year + initial_year)/2))))
 
 
-def process_all_csvs_interpolate(project_name, input_folder, methods_list, databases, years, modify_permanently=False):
+@profiled()
+def process_all_csvs_interpolate(project_name, input_folder, methods_list, databases, years, modify_permanently=False, n_workers=None, output_file=None, curve='logistic', batch=False):
     """
     Loops through all CSV files in the input folder and modifies corresponding activities
     in the specified databases across multiple years, interpolating missing coefficients.
@@ -355,69 +670,958 @@ def process_all_csvs_interpolate(project_name, input_folder, methods_list, datab
         databases (list): List of databases to be modified.
         years (list): List of years to apply the changes.
         modify_permanently (bool): Whether to make the changes permanent.
+        n_workers (int): Number of worker processes. If more than 1, see process_all_csvs_parallel.
+        output_file (str): Parquet file to which the results of each activity are appended as they come (optional).
+        curve (str): Interpolation curve: 'logistic' (default), 'linear' or 'spline'.
+        batch (bool): Open each database once and apply all CSVs to it (see process_all_csvs_batch).
 
     Returns:
         pd.DataFrame: Combined results for all processed activities.
     """
-    # Prepare an empty DataFrame to store combined results
-    combined_results = pd.DataFrame()
+    if batch:
+        return process_all_csvs_batch(project_name, input_folder, methods_list, databases, years,
+                                      interpolate=True, modify_permanently=modify_permanently, curve=curve)
 
-    # Loop through all CSV files in the input folder
-    for file_name in os.listdir(input_folder):
-        print(f'Processing activity from: {file_name}')
-        if file_name.endswith('.csv'):
-            # Read the CSV file
-            csv_file = os.path.join(input_folder, file_name)
-            coeff_df = pd.read_csv(csv_file)
-
-            # Ensure 'VSI_modify' is a boolean
-            coeff_df['VSI_modify'] = coeff_df['VSI_modify'].fillna(False).astype(bool)
-
-            # Interpolate missing coefficients for each row
-            # TBD -> Need to generalise for any time span
-            for index, row in coeff_df.iterrows():
-                # Get known coefficient values
-                coeff_2025 = row['coeff_2025']
-                coeff_2040 = row['coeff_2040']
-
-                # Interpolate missing coefficients using logistic function
-                if np.isnan(row.get('coeff_2030', np.nan)):
-                    coeff_df.at[index, 'coeff_2030'] = direct_logistic(2030, 2025, coeff_2025, 2040, coeff_2040)
-                if np.isnan(row.get('coeff_2035', np.nan)):
-                    coeff_df.at[index, 'coeff_2035'] = direct_logistic(2035, 2025, coeff_2025, 2040, coeff_2040)
-
-            # Extract activity details
-            activity_id = file_name.replace('.csv', '')  # Extract activity ID from file name
-            
-            ## BIG WARNING! ##
-            # I'm not sure if this might cause issues in the future, but I'm considering the same activity ID across databases
-            # Right now, I've checked and when new DBs are generated, they replicate the original activity ID, so this works.
-            # Might not be the case in the future!!
-            
-            db_name = databases[0]
-            activity = find_activity_by_id(db_name, activity_id)
-            activity_name = activity.get('name')
-            location = activity.get('location')
-            reference_product = activity.get('reference product')
-            project_name = project_name
-
-            # Call the function to modify activities and collect LCIA results
-            result_df = modify_activities_in_databases(
-                project_name, 
-                databases, 
-                years,
-                activity_name, 
-                reference_product, 
-                location,
-                methods_list, 
-                modify_permanently=modify_permanently,
-                df=coeff_df
+    if n_workers is not None and n_workers > 1:
+        return process_all_csvs_parallel(project_name, input_folder, methods_list, databases, years,
+                                         interpolate=True, modify_permanently=modify_permanently, n_workers=n_workers,
+                                         curve=curve)
+
+    results = iter_csv_results(project_name, input_folder, methods_list, databases, years,
+                               modify_permanently=modify_permanently, interpolate=True, curve=curve)
+    if output_file is not None:
+        results = append_results_to_parquet(results, output_file)
+
+    return combine_results(results)
+
+
+#####################
+### BATCH RUNNING ###
+#####################
+
+@profiled()
+def process_all_csvs_batch(project_name, input_folder, methods_list, databases, years, interpolate=False, modify_permanently=False, curve='logistic'):
+    """
+    Database-first version of process_all_csvs / process_all_csvs_interpolate.
+    Each database is opened once: its matrices are built and factorized once, the supply of every activity
+    is solved in one go, and the coefficients of every CSV are applied in memory to that single state.
+
+    Args:
+        project_name (str): Name of the Brightway2 project.
+        input_folder (str): Path to the folder containing the input CSV files.
+        methods_list (list): List of LCIA methods to be used.
+        databases (list): List of databases to be modified.
+        years (list): List of years to apply the changes.
+        interpolate (bool): Whether to interpolate missing coefficients (as in process_all_csvs_interpolate).
+        modify_permanently (bool): Not supported in batch mode, as modifications are only applied in memory.
+        curve (str): Interpolation curve (see interpolate_missing_coefficients).
+
+    Returns:
+        pd.DataFrame: Combined results for all processed activities, ordered by CSV file name, then database.
+    """
+    if modify_permanently:
+        raise ValueError("Permanent modifications can't be run in batch mode. Use batch=False.")
+
+    assert len(databases) == len(years), "Databases and years lists must be of the same length."
+
+    if bd.projects.current != project_name:
+        bd.projects.set_current(project_name)
+
+    # Read every coefficient CSV once, and the activity details from the first database
+    # (same activity ID across databases, see process_all_csvs)
+    activities = []
+    for file_name in sorted(os.listdir(input_folder)):
+        if not file_name.endswith('.csv'):
+            continue
+        print(f'Loading coefficients from: {file_name}')
+        activity_id = file_name.replace('.csv', '')
+        coeff_df = load_coefficients(os.path.join(input_folder, file_name), interpolate=interpolate, years=years, curve=curve)
+        activity = find_activity_by_id(databases[0], activity_id)
+        activities.append({
+            'activity_id': activity_id,
+            'name': activity.get('name'),
+            'reference product': activity.get('reference product'),
+            'location': activity.get('location'),
+            'coefficients': coeff_df
+        })
+
+    # Results per (CSV, database), to be assembled in the same order as process_all_csvs
+    results = {}
+
+    for db_position, (db_name, year) in enumerate(zip(databases, years)):
+        print(f"\nProcessing database '{db_name}' for year {year}...")
+
+        if db_name not in bd.databases:
+            print(f"Database '{db_name}' not found in the current project.")
+            continue
+
+        # Find all activities in this database
+        found = []
+        for csv_position, details in enumerate(activities):
+            try:
+                activity = find_activity_by_name_product_location(
+                    db_name, details['name'], details['reference product'], details['location']
+                )
+                found.append((csv_position, activity))
+            except ValueError as e:
+                print(e)
+
+        if not found:
+            continue
+
+        # Build the matrices once and solve the supply of every activity with one factorization
+        lca = build_database_lca(found[0][1], methods_list[0])
+        demand_matrix = np.zeros((len(lca.dicts.product), len(found)))
+        for column, (_, activity) in enumerate(found):
+            demand_matrix[lca_matrix_index(lca.dicts.product, activity), column] = 1
+        supply_matrix = solve_technosphere_demands(lca, demand_matrix)
+
+        # Characterization factors of every method (methods x flows)
+        characterization = characterization_vectors(lca, methods_list)
+
+        for column, (csv_position, activity) in enumerate(found):
+            details = activities[csv_position]
+
+            # Scores of the activity's own supply, and their change with its scaling coefficients (see prepare_scaling_evaluator)
+            evaluator = prepare_scaling_evaluator(
+                activity, methods_list, lca=lca, supply=supply_matrix[:, column], characterization=characterization
+            )
+            results_before = dict(zip(methods_list, evaluator['scores_before'].tolist()))
+
+            scaling_coefficients = get_scaling_coefficients(
+                details['coefficients'], details['name'], details['location'], year, db_name
             )
+            results_after = evaluate_scaling(evaluator, scaling_coefficients, results_before=results_before)
+
+            result_df = pd.DataFrame(comparison_rows(db_name, year, details['name'], methods_list, results_before, results_after))
+            result_df['activity_id'] = details['activity_id']
+            results[(csv_position, db_position)] = result_df
+
+        print(f"Modifications and analysis completed for {len(found)} activities in database '{db_name}'.")
+
+    return combine_results(results[position] for position in sorted(results))
+
+
+########################
+### PARALLEL RUNNING ###
+########################
+
+def _init_worker(matrix_snapshots):
+    """Initializer of the process_all_csvs_parallel workers: same matrix snapshot settings as the parent process."""
+    MATRIX_SNAPSHOTS.update(matrix_snapshots)
+
+
+def _process_work_unit(work_unit):
+    """
+    Worker for process_all_csvs_parallel: run one (CSV, database, year) unit in a read-only project.
+    Returns the position of the unit and its result DataFrame.
+    """
+    position, project_name, csv_file, reference_db, db_name, year, methods_list, interpolate, curve = work_unit
+
+    # Workers never write to the databases
+    bd.projects.set_current(project_name, writable=False)
 
-            # I need to preserve activity_id for the case in which we get multiple activities with the same name:
+    coeff_df = load_coefficients(csv_file, interpolate=interpolate, years=[year], curve=curve)
+
+    # Same activity ID across databases (see process_all_csvs)
+    activity_id = os.path.basename(csv_file).replace('.csv', '')
+    activity = find_activity_by_id(reference_db, activity_id)
+
+    result_df = modify_activities_in_databases(
+        project_name,
+        [db_name],
+        [year],
+        activity.get('name'),
+        activity.get('reference product'),
+        activity.get('location'),
+        methods_list,
+        modify_permanently=False,
+        df=coeff_df,
+        in_memory=True
+    )
+    result_df['activity_id'] = activity_id
+
+    return position, result_df
+
+
+@profiled()
+def process_all_csvs_parallel(project_name, input_folder, methods_list, databases, years, interpolate=False, modify_permanently=False, n_workers=None, curve='logistic'):
+    """
+    Parallel version of process_all_csvs / process_all_csvs_interpolate.
+    Every (CSV, database, year) combination is an independent work unit, dispatched to a process pool.
+    Workers open the project read-only and modify the activities in memory.
+
+    Args:
+        project_name (str): Name of the Brightway2 project.
+        input_folder (str): Path to the folder containing the input CSV files.
+        methods_list (list): List of LCIA methods to be used.
+        databases (list): List of databases to be modified.
+        years (list): List of years to apply the changes.
+        interpolate (bool): Whether to interpolate missing coefficients (as in process_all_csvs_interpolate).
+        modify_permanently (bool): Not supported in parallel, as workers can't write to the databases.
+        n_workers (int): Number of worker processes (defaults to the number of CPUs).
+        curve (str): Interpolation curve (see interpolate_missing_coefficients).
+
+    Returns:
+        pd.DataFrame: Combined results for all processed activities, ordered by CSV file name, then database.
+    """
+    if modify_permanently:
+        raise ValueError("Permanent modifications can't be run in parallel. Use n_workers=None.")
+
+    assert len(databases) == len(years), "Databases and years lists must be of the same length."
+
+    bd.projects.set_current(project_name)
+
+    # Process the databases once in the parent, so that workers only read the datapackages
+    for db_name in databases:
+        if db_name in bd.databases and bd.databases[db_name].get('dirty'):
+            print(f"Processing database '{db_name}' before dispatching...")
+            bd.Database(db_name).process()
+
+    # Work units, in a deterministic order: CSV file name first, then database
+    csv_files = sorted(file_name for file_name in os.listdir(input_folder) if file_name.endswith('.csv'))
+    work_units = []
+    for file_name in csv_files:
+        csv_file = os.path.join(input_folder, file_name)
+        for db_name, year in zip(databases, years):
+            work_units.append((len(work_units), project_name, csv_file, databases[0], db_name, year, methods_list, interpolate, curve))
+
+    print(f"Dispatching {len(work_units)} work units ({len(csv_files)} CSVs x {len(databases)} databases) to {n_workers or os.cpu_count()} workers...")
+
+    return combine_results(run_work_units(work_units, n_workers=n_workers))
+
+
+def run_work_units(work_units, n_workers=None):
+    """
+    Run work units (see _process_work_unit) in a process pool.
+
+    Returns:
+        list: The result DataFrame of each work unit, in the order of the work units.
+    """
+    # 'spawn' avoids sharing SQLite connections with the forked workers.
+    # With matrix snapshots enabled, the workers map the same snapshot files and share their pages.
+    results = [pd.DataFrame()] * len(work_units)
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(dict(MATRIX_SNAPSHOTS),)) as executor:
+        for position, result_df in executor.map(_process_work_unit, work_units):
+            results[position] = result_df
+
+    return results
+
+
+###########################
+### INCREMENTAL RUNNING ###
+###########################
+
+def coefficient_fingerprints(input_folder, databases, years, methods_list, interpolate=True, curve='logistic'):
+    """
+    Fingerprint of every (activity_id, database, year) result: hash of the coefficient CSV,
+    of the database state (see lifecycle.database_state_hash) and of the run settings.
+    Results of a database with unprocessed changes get no fingerprint (None), so they are always recomputed.
+
+    Returns:
+        dict: {'<activity_id>|<database>|<year>': fingerprint}
+    """
+    settings = repr((list(methods_list), list(years), interpolate, curve))
+    db_states = {db_name: database_state_hash(db_name) for db_name in databases}
+
+    fingerprints = {}
+    for file_name in sorted(os.listdir(input_folder)):
+        if not file_name.endswith('.csv'):
+            continue
+        with open(os.path.join(input_folder, file_name), 'rb') as f:
+            csv_hash = hashlib.sha256(f.read()).hexdigest()
+
+        activity_id = file_name.replace('.csv', '')
+        for db_name, year in zip(databases, years):
+            db_state = db_states[db_name]
+            fingerprints[f"{activity_id}|{db_name}|{year}"] = (
+                None if db_state is None
+                else hashlib.sha256(repr((csv_hash, db_state, settings)).encode()).hexdigest()
+            )
+
+    return fingerprints
+
+
+@profiled()
+def process_all_csvs_incremental(project_name, input_folder, methods_list, databases, years, results_file, interpolate=True, curve='logistic', n_workers=None):
+    """
+    Incremental version of process_all_csvs / process_all_csvs_interpolate: only the (activity, database) pairs
+    whose coefficient CSV or database changed since the previous run are recomputed, and their results are
+    spliced into the previous combined results.
+
+    The combined results are kept in `results_file` (Parquet), and the fingerprint of each result
+    (see coefficient_fingerprints) in '<results_file>.manifest.json'.
+
+    Args:
+        project_name (str): Name of the Brightway2 project.
+        input_folder (str): Path to the folder containing the input CSV files.
+        methods_list (list): List of LCIA methods to be used.
+        databases (list): List of databases (modified in memory only).
+        years (list): List of years to apply the changes.
+        results_file (str): Parquet file of the combined results, read and updated.
+        interpolate (bool): Whether to interpolate missing coefficients.
+        curve (str): Interpolation curve (see interpolate_missing_coefficients).
+        n_workers (int): Number of worker processes for the recomputed pairs (see process_all_csvs_parallel).
+
+    Returns:
+        pd.DataFrame: Combined results for all activities, ordered by CSV file name, then database.
+    """
+    assert len(databases) == len(years), "Databases and years lists must be of the same length."
+
+    bd.projects.set_current(project_name)
+
+    manifest_file = f"{results_file}.manifest.json"
+    fingerprints = coefficient_fingerprints(input_folder, databases, years, methods_list, interpolate=interpolate, curve=curve)
+
+    # Previous results, if they are complete
+    previous_fingerprints = {}
+    previous_df = pd.DataFrame()
+    if os.path.exists(results_file) and os.path.exists(manifest_file):
+        with open(manifest_file) as f:
+            previous_fingerprints = json.load(f)
+        previous_df = pd.read_parquet(results_file)
+        if 'Method' in previous_df.columns:
+            previous_df['Method'] = previous_df['Method'].map(tuple)
+
+    stale = [
+        unit for unit, fingerprint in fingerprints.items()
+        if fingerprint is None or previous_fingerprints.get(unit) != fingerprint
+    ]
+    print(f"{len(stale)} of {len(fingerprints)} (activity, database) results to recompute")
+
+    # Recompute the stale pairs, CSV by CSV
+    stale_by_activity = defaultdict(list)
+    for unit in stale:
+        activity_id, db_name, year = unit.split('|')
+        stale_by_activity[activity_id].append((db_name, int(year)))
+
+    if n_workers is not None and n_workers > 1:
+        # Databases processed before dispatching, see process_all_csvs_parallel
+        for db_name in databases:
+            if db_name in bd.databases and bd.databases[db_name].get('dirty'):
+                bd.Database(db_name).process()
+        work_units = [
+            (position, project_name, os.path.join(input_folder, f"{activity_id}.csv"), databases[0], db_name, year,
+             methods_list, interpolate, curve)
+            for position, (activity_id, db_name, year) in enumerate(
+                (activity_id, db_name, year)
+                for activity_id, pairs in stale_by_activity.items() for db_name, year in pairs
+            )
+        ]
+        new_results = run_work_units(work_units, n_workers=n_workers) if work_units else []
+    else:
+        new_results = []
+        for activity_id, pairs in stale_by_activity.items():
+            csv_file = os.path.join(input_folder, f"{activity_id}.csv")
+            coeff_df = load_coefficients(csv_file, interpolate=interpolate, years=years, curve=curve)
+
+            # Same activity ID across databases (see iter_csv_results)
+            activity = find_activity_by_id(databases[0], activity_id)
+            result_df = modify_activities_in_databases(
+                project_name,
+                [db_name for db_name, _ in pairs],
+                [year for _, year in pairs],
+                activity.get('name'),
+                activity.get('reference product'),
+                activity.get('location'),
+                methods_list,
+                modify_permanently=False,
+                df=coeff_df,
+                in_memory=True
+            )
             result_df['activity_id'] = activity_id
+            new_results.append(result_df)
+
+    # Splice: keep the previous results of the pairs still up to date
+    if not previous_df.empty:
+        pairs = previous_df['activity_id'].astype(str) + '|' + previous_df['Database'] + '|' + previous_df['Year'].astype(str)
+        fresh = set(fingerprints) - set(stale)
+        previous_df = previous_df[pairs.isin(fresh)]
+
+    results_df = combine_results([previous_df] + new_results)
+
+    if not results_df.empty:
+        # Same order as a full run: CSV file name first, then database (methods keep their order)
+        activity_order = {activity_id: position for position, activity_id in enumerate(sorted({unit.split('|')[0] for unit in fingerprints}))}
+        database_order = {db_name: position for position, db_name in enumerate(databases)}
+        results_df = results_df.sort_values(
+            ['activity_id', 'Database'],
+            key=lambda column: column.map(activity_order if column.name == 'activity_id' else database_order),
+            kind='stable'
+        ).reset_index(drop=True)
+
+    # Written to temporary files first, so that the results and the manifest are replaced together
+    # (also when there are no results left, so that the previous results can't come back on the next run)
+    results_df.to_parquet(f"{results_file}.tmp", index=False)
+    os.replace(f"{results_file}.tmp", results_file)
+
+    with open(f"{manifest_file}.tmp", 'w') as f:
+        json.dump({unit: fingerprint for unit, fingerprint in fingerprints.items() if fingerprint is not None}, f)
+    os.replace(f"{manifest_file}.tmp", manifest_file)
+
+    return results_df
+
 
-            # Append results to the combined DataFrame
-            combined_results = pd.concat([combined_results, result_df], ignore_index=True)
+###################
+### MONTE CARLO ###
+###################
+
+def get_coefficient_sigmas(raw_df, activity_name, location, year, coefficient_sigma=0.1, interpolation_sigma=0.1):
+    """
+    Uncertainty of the scaling coefficients of an activity for a given year, as the standard deviation of the
+    logarithm of each coefficient (lognormal distribution around the coefficient).
+    Interpolated coefficients (missing in the CSV) add `interpolation_sigma` to `coefficient_sigma`.
+    A 'coeff_sigma' column in the CSV overrides `coefficient_sigma` for its rows.
+
+    Parameters:
+    - raw_df: Coefficients DataFrame before interpolation (see load_coefficients).
+    - activity_name: Name of the main activity.
+    - location: Location of the main activity.
+    - year: Year of the coefficient column ('coeff_<year>').
+    - coefficient_sigma: Default uncertainty of the coefficients.
+    - interpolation_sigma: Additional uncertainty of the interpolated coefficients.
+
+    Returns:
+    - sigmas: A dictionary with sub_activity names as keys and standard deviations as values.
+    """
+    df_activity = raw_df[
+        (raw_df['activity_name'] == activity_name) &
+        (raw_df['activity_location'] == location) &
+        (raw_df['VSI_modify'] == True)
+    ]
+
+    coeff_column = f'coeff_{year}'
+    sigmas = {}
+    for _, row in df_activity.iterrows():
+        sigma = row['coeff_sigma'] if 'coeff_sigma' in row and pd.notnull(row['coeff_sigma']) else coefficient_sigma
+        if coeff_column not in row or pd.isnull(row[coeff_column]):
+            sigma = np.sqrt(sigma ** 2 + interpolation_sigma ** 2)
+        sigmas[row['sub_activity']] = sigma
+
+    return sigmas
+
+
+def monte_carlo_activity(activity, scaling_coefficients, sigmas, methods_list, iterations=1000, exchange_uncertainty=False, lca=None, seed=None):
+    """
+    Monte Carlo propagation of the uncertainty of the scaling coefficients of an activity
+    (and, optionally, of the biosphere exchanges of its supply chain) to its LCIA scores.
+
+    The technosphere is solved once: the coefficients only scale biosphere exchanges of the activity,
+    so the samples are evaluated together from a scaling evaluator (see prepare_scaling_evaluator),
+    one coefficient per sub_activity name.
+
+    Parameters:
+    - activity: The activity to modify.
+    - scaling_coefficients: A dictionary with sub_activity names as keys and scaling factors as values.
+    - sigmas: A dictionary with sub_activity names as keys and log standard deviations as values (see get_coefficient_sigmas).
+    - methods_list: A list of tuples representing the impact assessment methods.
+    - iterations: Number of samples.
+    - exchange_uncertainty: Also sample the biosphere exchanges from their uncertainty distributions in the database.
+                            The technosphere matrix is kept static, so the factorization is still reused.
+    - lca: An LCA object already solved for {activity: 1} (optional). Built if not provided.
+    - seed: Seed of the random number generator (optional).
+
+    Returns:
+    - scores_after: Deterministic scores with the scaling coefficients applied (dictionary by method).
+    - samples: Array of sampled scores (methods x iterations).
+    """
+    if lca is None:
+        lca = build_database_lca(activity, methods_list[0])
+
+    rng = np.random.default_rng(seed)
+    characterization = characterization_vectors(lca, methods_list)
+
+    # Scores as a function of the coefficients (see prepare_scaling_evaluator)
+    flow_rows = scaled_flow_rows(lca, activity)
+    biosphere_matrix = lca.biosphere_matrix.tocsr()
+    evaluator = prepare_scaling_evaluator(
+        activity, methods_list, lca=lca, characterization=characterization, biosphere_matrix=biosphere_matrix, flow_rows=flow_rows
+    )
+    names = evaluator['names']
+    coefficients = np.array([scaling_coefficients.get(name, 1.0) for name in names], dtype=float)
+    name_sigmas = np.array([sigmas.get(name, 0.0) if name in scaling_coefficients else 0.0 for name in names], dtype=float)
+
+    # Sampled coefficients (names x iterations), lognormal around each coefficient
+    sampled_coefficients = coefficients[:, None] * np.exp(rng.normal(0.0, 1.0, (len(names), iterations)) * name_sigmas[:, None])
+
+    scores_after = dict(zip(methods_list, evaluate_scaling_array(evaluator, coefficients[:, None])[:, 0]))
+
+    if not exchange_uncertainty:
+        samples = evaluate_scaling_array(evaluator, sampled_coefficients)
+    else:
+        db_names = bd.Database(activity['database']).find_graph_dependents()
+        biosphere_mm = mu.MappedMatrix(
+            packages=[bd.Database(name).datapackage() for name in db_names],
+            matrix='biosphere_matrix',
+            use_distributions=True,
+            row_mapper=lca.biosphere_mm.row_mapper,
+            col_mapper=lca.technosphere_mm.col_mapper,
+            seed_override=int(rng.integers(2 ** 31)),
+            empty_ok=True
+        )
+        samples = np.empty((len(methods_list), iterations))
+        for iteration in range(iterations):
+            if iteration:
+                next(biosphere_mm)
+            # Same exchanges, sampled amounts
+            sampled_evaluator = prepare_scaling_evaluator(
+                activity, methods_list, lca=lca, characterization=characterization,
+                biosphere_matrix=biosphere_mm.matrix.tocsr(), flow_rows=flow_rows
+            )
+            samples[:, iteration] = evaluate_scaling_array(sampled_evaluator, sampled_coefficients[:, iteration:iteration + 1])[:, 0]
+
+    return scores_after, samples
+
+
+def monte_carlo_activities_in_databases(project_name, databases, years, activity_name, reference_product, location, methods_list, df, raw_df=None, iterations=1000, coefficient_sigma=0.1, interpolation_sigma=0.1, exchange_uncertainty=False, percentiles=(2.5, 50, 97.5), seed=None):
+    """
+    Monte Carlo version of modify_activities_in_databases: percentile bands of the scores
+    of an activity after modification, for each database and method.
+
+    Parameters:
+    - project_name: Name of the Brightway2 project.
+    - databases: List of database names.
+    - years: List of years corresponding to the databases.
+    - activity_name: Name of the main activity to modify.
+    - reference_product: Reference product of the main activity.
+    - location: Location of the main activity.
+    - methods_list: List of impact assessment methods.
+    - df: DataFrame containing the sub-activities and coefficients (interpolated if needed).
+    - raw_df: The same DataFrame before interpolation, to flag interpolated coefficients (optional, df by default).
+    - iterations: Number of samples per database.
+    - coefficient_sigma, interpolation_sigma: Uncertainty of the coefficients (see get_coefficient_sigmas).
+    - exchange_uncertainty: Also sample the biosphere exchanges (see monte_carlo_activity).
+    - percentiles: Percentiles of the sampled scores to report.
+    - seed: Seed of the random number generator (optional).
+
+    Returns:
+    - results_df: A pandas DataFrame with the deterministic scores, mean, standard deviation and percentiles.
+    """
+    assert len(databases) == len(years), "Databases and years lists must be of the same length."
+    raw_df = df if raw_df is None else raw_df
+    rng = np.random.default_rng(seed)
+
+    if bd.projects.current != project_name:
+        bd.projects.set_current(project_name)
+
+    rows = []
+    for db_name, year in zip(databases, years):
+        try:
+            activity = find_activity_by_name_product_location(db_name, activity_name, reference_product, location)
+        except ValueError as e:
+            print(e)
+            continue
 
-    return combined_results
\ No newline at end of file
+        scaling_coefficients = get_scaling_coefficients(df, activity_name, location, year, db_name)
+        sigmas = get_coefficient_sigmas(raw_df, activity_name, location, year, coefficient_sigma, interpolation_sigma)
+
+        lca = build_database_lca(activity, methods_list[0])
+        scores_before = score_lca_methods(lca, methods_list)
+        scores_after, samples = monte_carlo_activity(
+            activity, scaling_coefficients, sigmas, methods_list, iterations=iterations,
+            exchange_uncertainty=exchange_uncertainty, lca=lca, seed=int(rng.integers(2 ** 31))
+        )
+        bands = np.percentile(samples, percentiles, axis=1)
+
+        for position, method in enumerate(methods_list):
+            row = {
+                'Database': db_name,
+                'Year': year,
+                'Activity': activity_name,
+                'Method': method,
+                'Score Before': scores_before[method],
+                'Score After': scores_after[method],
+                'Mean': samples[position].mean(),
+                'Std': samples[position].std(ddof=1) if iterations > 1 else 0.0,
+            }
+            for percentile, band in zip(percentiles, bands):
+                row[f'P{percentile:g}'] = band[position]
+            rows.append(row)
+
+        print(f"Monte Carlo ({iterations} iterations) completed for activity '{activity_name}' in database '{db_name}'.")
+
+    return pd.DataFrame(rows)
+
+
+def _monte_carlo_work_unit(work_unit):
+    """Worker for process_all_csvs_monte_carlo: Monte Carlo of one CSV in a read-only project."""
+    position, project_name, csv_file, databases, years, methods_list, kwargs = work_unit
+
+    bd.projects.set_current(project_name, writable=False)
+
+    return position, _monte_carlo_csv(project_name, csv_file, databases, years, methods_list, **kwargs)
+
+
+def _monte_carlo_csv(project_name, csv_file, databases, years, methods_list, interpolate=True, curve='logistic', **kwargs):
+    raw_df = load_coefficients(csv_file)
+    coeff_df = interpolate_missing_coefficients(raw_df, years=years, curve=curve) if interpolate else raw_df
+
+    # Same activity ID across databases (see iter_csv_results)
+    activity_id = os.path.basename(csv_file).replace('.csv', '')
+    activity = find_activity_by_id(databases[0], activity_id)
+
+    result_df = monte_carlo_activities_in_databases(
+        project_name, databases, years,
+        activity.get('name'), activity.get('reference product'), activity.get('location'),
+        methods_list, coeff_df, raw_df=raw_df, **kwargs
+    )
+    result_df['activity_id'] = activity_id
+    return result_df
+
+
+@profiled()
+def process_all_csvs_monte_carlo(project_name, input_folder, methods_list, databases, years, iterations=1000, interpolate=True, curve='logistic', coefficient_sigma=0.1, interpolation_sigma=0.1, exchange_uncertainty=False, percentiles=(2.5, 50, 97.5), seed=None, n_workers=None):
+    """
+    Monte Carlo version of process_all_csvs_interpolate: percentile bands of the modified scores of every activity,
+    per database (year) and method.
+
+    Args:
+        project_name (str): Name of the Brightway2 project.
+        input_folder (str): Path to the folder containing the input CSV files.
+        methods_list (list): List of LCIA methods to be used.
+        databases (list): List of databases (modified in memory only).
+        years (list): List of years to apply the changes.
+        iterations (int): Number of samples per activity and database.
+        interpolate (bool): Whether to interpolate missing coefficients.
+        curve (str): Interpolation curve (see interpolate_missing_coefficients).
+        coefficient_sigma (float): Log standard deviation of the coefficients (see get_coefficient_sigmas).
+        interpolation_sigma (float): Additional log standard deviation of the interpolated coefficients.
+        exchange_uncertainty (bool): Also sample the biosphere exchanges (see monte_carlo_activity).
+        percentiles (tuple): Percentiles of the sampled scores to report.
+        seed (int): Seed of the random number generator (optional). Each CSV gets its own seed derived from it.
+        n_workers (int): Number of worker processes, one CSV per work unit (optional).
+
+    Returns:
+        pd.DataFrame: Monte Carlo results for all activities, ordered by CSV file name, then database.
+    """
+    assert len(databases) == len(years), "Databases and years lists must be of the same length."
+
+    bd.projects.set_current(project_name)
+
+    csv_files = sorted(file_name for file_name in os.listdir(input_folder) if file_name.endswith('.csv'))
+    seeds = np.random.SeedSequence(seed).spawn(len(csv_files))
+    kwargs = [
+        dict(interpolate=interpolate, curve=curve, iterations=iterations, coefficient_sigma=coefficient_sigma,
+             interpolation_sigma=interpolation_sigma, exchange_uncertainty=exchange_uncertainty,
+             percentiles=percentiles, seed=int(csv_seed.generate_state(1)[0]))
+        for csv_seed in seeds
+    ]
+
+    if n_workers is None or n_workers <= 1:
+        return combine_results(
+            _monte_carlo_csv(project_name, os.path.join(input_folder, file_name), databases, years, methods_list, **csv_kwargs)
+            for file_name, csv_kwargs in zip(csv_files, kwargs)
+        )
+
+    # Databases processed before dispatching, see process_all_csvs_parallel
+    for db_name in databases:
+        if db_name in bd.databases and bd.databases[db_name].get('dirty'):
+            bd.Database(db_name).process()
+
+    work_units = [
+        (position, project_name, os.path.join(input_folder, file_name), databases, years, methods_list, csv_kwargs)
+        for position, (file_name, csv_kwargs) in enumerate(zip(csv_files, kwargs))
+    ]
+    results = [pd.DataFrame()] * len(work_units)
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(dict(MATRIX_SNAPSHOTS),)) as executor:
+        for position, result_df in executor.map(_monte_carlo_work_unit, work_units):
+            results[position] = result_df
+
+    return combine_results(results)
+
+
+############################
+### SENSITIVITY ANALYSIS ###
+############################
+
+def sensitivity_indices(sensitivities, coefficients, sigmas):
+    """
+    Variance-based (Sobol) and Morris indices of the coefficients, for a score linear in independent
+    lognormal coefficients (see get_coefficient_sigmas). The Morris elementary effect of a coefficient
+    is its sensitivity times the width of its 95% interval.
+
+    Parameters:
+    - sensitivities: Array of the derivatives of one score with respect to each coefficient.
+    - coefficients: Array of the coefficients (medians of their distributions).
+    - sigmas: Array of the log standard deviations of the coefficients.
+
+    Returns:
+    - first_order: Sobol first-order indices, Var(E[score | coefficient]) / Var(score).
+    - total_order: Sobol total indices, 1 - Var(E[score | other coefficients]) / Var(score). The score has no
+                   interaction terms, so these equal the first-order indices.
+    - mu_star: Morris mean absolute elementary effects.
+    First and total orders are NaN if the score has no variance.
+    """
+    variances = coefficients ** 2 * np.exp(sigmas ** 2) * (np.exp(sigmas ** 2) - 1)
+    partial_variances = sensitivities ** 2 * variances
+    total_variance = partial_variances.sum()
+    if total_variance > 0:
+        first_order = partial_variances / total_variance
+        # Variance explained by all the other coefficients together: the sum of their partial variances
+        total_order = 1 - (total_variance - partial_variances) / total_variance
+    else:
+        first_order = np.full_like(partial_variances, np.nan)
+        total_order = np.full_like(partial_variances, np.nan)
+
+    interval = coefficients * (np.exp(1.96 * sigmas) - np.exp(-1.96 * sigmas))
+    mu_star = np.abs(sensitivities * interval)
+
+    return first_order, total_order, mu_star
+
+
+@profiled()
+def rank_coefficients(project_name, input_folder, methods_list, databases, years, interpolate=True, curve='logistic', coefficient_sigma=0.1, interpolation_sigma=0.1):
+    """
+    Rank the sub_activity coefficients of every coefficient CSV by their influence on each impact category,
+    in every database. Each database is solved once for all activities (as in process_all_csvs_batch), and the
+    indices come from the characterized contribution of each coefficient, without sampling.
+
+    Args:
+        project_name (str): Name of the Brightway2 project.
+        input_folder (str): Path to the folder containing the input CSV files.
+        methods_list (list): List of LCIA methods to be used.
+        databases (list): List of databases.
+        years (list): List of years of the coefficients, one per database.
+        interpolate (bool): Whether to interpolate missing coefficients.
+        curve (str): Interpolation curve (see interpolate_missing_coefficients).
+        coefficient_sigma (float): Log standard deviation of the coefficients (see get_coefficient_sigmas).
+        interpolation_sigma (float): Additional log standard deviation of the interpolated coefficients.
+
+    Returns:
+        pd.DataFrame: One row per (activity, database, method, sub_activity), with the 'Sensitivity'
+                      (score change per unit of coefficient), 'First Order' and 'Total Order' Sobol indices
+                      (equal, see sensitivity_indices), 'Mu Star' (Morris) and 'Rank' (by Mu Star, 1 for the most
+                      influential coefficient). Indices and ranks are missing for scores without variance.
+    """
+    assert len(databases) == len(years), "Databases and years lists must be of the same length."
+
+    if bd.projects.current != project_name:
+        bd.projects.set_current(project_name)
+
+    # Read every coefficient CSV once (same activity ID across databases, see process_all_csvs)
+    activities = []
+    for file_name in sorted(os.listdir(input_folder)):
+        if not file_name.endswith('.csv'):
+            continue
+        activity_id = file_name.replace('.csv', '')
+        raw_df = load_coefficients(os.path.join(input_folder, file_name))
+        coeff_df = interpolate_missing_coefficients(raw_df, years=years, curve=curve) if interpolate else raw_df
+        activity = find_activity_by_id(databases[0], activity_id)
+        activities.append({
+            'activity_id': activity_id,
+            'name': activity.get('name'),
+            'reference product': activity.get('reference product'),
+            'location': activity.get('location'),
+            'coefficients': coeff_df,
+            'raw_coefficients': raw_df
+        })
+
+    rows = []
+    for db_name, year in zip(databases, years):
+        if db_name not in bd.databases:
+            print(f"Database '{db_name}' not found in the current project.")
+            continue
+
+        found = []
+        for details in activities:
+            try:
+                activity = find_activity_by_name_product_location(
+                    db_name, details['name'], details['reference product'], details['location']
+                )
+                found.append((details, activity))
+            except ValueError as e:
+                print(e)
+
+        if not found:
+            continue
+
+        # Build the matrices once and solve the supply of every activity with one factorization
+        lca = build_database_lca(found[0][1], methods_list[0])
+        demand_matrix = np.zeros((len(lca.dicts.product), len(found)))
+        for column, (_, activity) in enumerate(found):
+            demand_matrix[lca_matrix_index(lca.dicts.product, activity), column] = 1
+        supply_matrix = solve_technosphere_demands(lca, demand_matrix)
+        characterization = characterization_vectors(lca, methods_list)
+
+        for column, (details, activity) in enumerate(found):
+            scaling_coefficients = get_scaling_coefficients(details['coefficients'], details['name'], details['location'], year, db_name)
+            if not scaling_coefficients:
+                continue
+            sigmas = get_coefficient_sigmas(
+                details['raw_coefficients'], details['name'], details['location'], year, coefficient_sigma, interpolation_sigma
+            )
+
+            # Score change per unit of each coefficient (see prepare_scaling_evaluator)
+            evaluator = prepare_scaling_evaluator(
+                activity, methods_list, lca=lca, supply=supply_matrix[:, column], characterization=characterization
+            )
+            names = [name for name in evaluator['names'] if name in scaling_coefficients]
+            if not names:
+                continue
+
+            coefficients = np.array([scaling_coefficients[name] for name in names], dtype=float)
+            name_sigmas = np.array([sigmas.get(name, coefficient_sigma) for name in names], dtype=float)
+            sensitivity_matrix = evaluator['sensitivities'][:, [evaluator['index'][name] for name in names]]  # methods x coefficients
+
+            for method_position, method in enumerate(methods_list):
+                first_order, total_order, mu_star = sensitivity_indices(sensitivity_matrix[method_position], coefficients, name_sigmas)
+                # No ranking for a score without variance (all coefficients would tie)
+                if np.isnan(first_order).all():
+                    ranks = pd.Series(pd.NA, index=range(len(names)), dtype='Int64')
+                else:
+                    ranks = pd.Series(mu_star).rank(ascending=False, method='min').astype('Int64')
+                for position, name in enumerate(names):
+                    rows.append({
+                        'activity_id': details['activity_id'],
+                        'Database': db_name,
+                        'Year': year,
+                        'Activity': details['name'],
+                        'Method': method,
+                        'sub_activity': name,
+                        'Coefficient': coefficients[position],
+                        'Sigma': name_sigmas[position],
+                        'Sensitivity': sensitivity_matrix[method_position, position],
+                        'First Order': first_order[position],
+                        'Total Order': total_order[position],
+                        'Mu Star': mu_star[position],
+                        'Rank': ranks[position]
+                    })
+
+        print(f"Sensitivity of {len(found)} activities computed in database '{db_name}'.")
+
+    rankings = pd.DataFrame(rows)
+    if not rankings.empty:
+        rankings['Rank'] = rankings['Rank'].astype('Int64')
+    return rankings
+
+
+#######################
+### FAST EVALUATION ###
+#######################
+
+def scaled_flow_rows(lca, activity):
+    """
+    Rows of the biosphere matrix that the scaling coefficients of an activity apply to, by sub_activity name.
+    Each row is listed once: the matrix entry already sums repeated exchanges with the same flow.
+
+    Parameters:
+    - lca: An LCA object with the matrices of the activity's database.
+    - activity: The activity to modify.
+
+    Returns:
+    - flow_rows: A dictionary with the names of the activity's biosphere exchanges as keys and lists of rows as values.
+    """
+    flow_rows = {}
+    scaled_rows = set()
+    for exc in activity.biosphere():
+        exchange_name = exc.input['name']
+        try:
+            flow_row = lca_matrix_index(lca.dicts.biosphere, exc.input)
+        except KeyError:
+            print(f"Biosphere flow '{exchange_name}' not found in the biosphere matrix. Skipping.")
+            continue
+        if flow_row in scaled_rows:
+            continue
+        scaled_rows.add(flow_row)
+        flow_rows.setdefault(exchange_name, []).append(flow_row)
+
+    return flow_rows
+
+
+@profiled()
+def prepare_scaling_evaluator(activity, methods_list, lca=None, supply=None, characterization=None, biosphere_matrix=None, flow_rows=None):
+    """
+    Precompute what is needed to evaluate the scores of an activity for any set of scaling coefficients.
+    The coefficients only rescale the activity's own biosphere exchanges, so every score is its value before
+    modification plus the characterized contribution of each scaled exchange times (coefficient - 1):
+    CF * B[flow, activity] * supply[activity] * (coefficient - 1).
+
+    Parameters:
+    - activity: The activity to modify.
+    - methods_list: A list of tuples representing the impact assessment methods.
+    - lca: An LCA object already solved for {activity: 1} (optional). Built if not provided.
+    - supply: Supply array to evaluate the scores for (optional, lca.supply_array by default),
+              e.g. one column of the supply matrix of several demands.
+    - characterization: Characterization factors of each method (optional, see characterization_vectors).
+    - biosphere_matrix: Biosphere matrix to evaluate with (optional, lca.biosphere_matrix by default), e.g. a sampled one.
+    - flow_rows: Rows of the activity's exchanges (optional, see scaled_flow_rows), to query the database only once
+                 when the evaluator is prepared again for other matrices.
+
+    Returns:
+    - evaluator: A dictionary with the 'methods', the sub_activity 'names' of the activity's biosphere exchanges,
+                 their 'index', the 'scores_before' (one per method) and the 'sensitivities' (methods x names),
+                 for evaluate_scaling and evaluate_scaling_array.
+    """
+    if lca is None:
+        lca = build_database_lca(activity, methods_list[0])
+    if supply is None:
+        supply = lca.supply_array
+    if characterization is None:
+        characterization = characterization_vectors(lca, methods_list)
+    if biosphere_matrix is None:
+        biosphere_matrix = lca.biosphere_matrix
+    if flow_rows is None:
+        flow_rows = scaled_flow_rows(lca, activity)
+
+    activity_col = lca_matrix_index(lca.dicts.activity, activity)
+    names = list(flow_rows)
+    sensitivities = np.zeros((len(methods_list), len(names)))
+    for position, name in enumerate(names):
+        rows = flow_rows[name]
+        amounts = np.array([biosphere_matrix[row, activity_col] for row in rows], dtype=float)
+        sensitivities[:, position] = characterization[:, rows] @ amounts * supply[activity_col]
+
+    return {
+        'methods': list(methods_list),
+        'names': names,
+        'index': {name: position for position, name in enumerate(names)},
+        'scores_before': characterization @ (biosphere_matrix @ supply),
+        'sensitivities': sensitivities
+    }
+
+
+def evaluate_scaling(evaluator, scaling_coefficients, results_before=None):
+    """
+    Scores of the activity after modification, from a prepared evaluator (see prepare_scaling_evaluator).
+    Gives the same scores as scaling the biosphere matrix and recomputing the LCIA, without touching the LCA object.
+
+    Parameters:
+    - evaluator: The evaluator of the activity.
+    - scaling_coefficients: A dictionary with sub_activity names as keys and scaling factors as values.
+                            Names without a biosphere exchange in the activity are ignored.
+    - results_before: LCIA results before modification to apply the changes to (optional, the evaluator's
+                      'scores_before' by default), so that unaffected scores are kept exactly.
+
+    Returns:
+    - results_after: A dictionary with methods as keys and their LCIA scores as values.
+    """
+    index = evaluator['index']
+    change = np.zeros(len(index))
+    for name, scaling_coefficient in scaling_coefficients.items():
+        position = index.get(name)
+        if position is not None:
+            change[position] = scaling_coefficient - 1
+
+    scores_before = evaluator['scores_before']
+    if results_before is not None:
+        scores_before = np.array([results_before[method] for method in evaluator['methods']], dtype=float)
+
+    scores = scores_before + evaluator['sensitivities'] @ change
+    return defaultdict(float, zip(evaluator['methods'], scores.tolist()))
+
+
+def evaluate_scaling_array(evaluator, coefficient_matrix):
+    """
+    Scores of the activity for many sets of scaling coefficients at once.
+
+    Parameters:
+    - evaluator: The evaluator of the activity (see prepare_scaling_evaluator).
+    - coefficient_matrix: Array of scaling coefficients (names x scenarios), with rows in the order of evaluator['names'].
+
+    Returns:
+    - scores: Array of scores (methods x scenarios).
+    """
+    coefficient_matrix = np.asarray(coefficient_matrix, dtype=float)
+    return evaluator['scores_before'][:, None] + evaluator['sensitivities'] @ (coefficient_matrix - 1)
@@ -1,48 +1,184 @@
 import pandas as pd
+import numpy as np
 import os
+import time
+import tempfile
 
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+
+from profiling import profiled
+
+
+######################
+### REPORT WRITING ###
+######################
+
+# Header cells styled as pandas' DataFrame.to_excel header (pandas < 3)
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='top')
+
+
+def _excel_value(value):
+    """Convert a DataFrame value into a value openpyxl can write (NaN -> empty cell)."""
+    if value is None:
+        return None
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _combined_dtype(dtype, other):
+    """Dtype of a column read as a whole, from the dtypes inferred for two of its parts (None for no part yet)."""
+    if dtype is None or dtype == other:
+        return other
+    if dtype.kind in 'iuf' and other.kind in 'iuf':
+        return np.dtype('float64')
+    return np.dtype('object')
+
+
+def _read_dtypes(dtypes):
+    """read_csv dtypes reproducing the given column dtypes (object columns are read as strings)."""
+    return {column: (str if dtype.kind == 'O' else dtype) for column, dtype in dtypes.items()}
+
+
+def spool_groups(csv_paths, activity_col, spool_dir, columns=None, chunksize=100000):
+    """
+    Split CSV files into one temporary CSV per group of `activity_col`, reading them in chunks,
+    so that a group can be written to its sheet without holding the other groups in memory.
+    The dtype of each column is inferred over all the rows, as if the CSVs were read at once,
+    so that the group files can be read back with the same dtypes in every sheet.
+
+    Parameters:
+    - csv_paths: List of CSV file paths, read in order.
+    - activity_col: The column to group by.
+    - spool_dir: Folder of the temporary group files.
+    - columns: Columns of the group files (optional, the columns of the CSVs in order of appearance by default).
+    - chunksize: Number of rows read at a time.
+
+    Returns:
+    - groups: List of (group key, group file path), sorted by group key (as DataFrame.groupby).
+    - dtypes: Dictionary of the dtype of each column, for reading the group files back (see write_sheet).
+    """
+    if columns is None:
+        columns = []
+        for csv_path in csv_paths:
+            for column in pd.read_csv(csv_path, nrows=0).columns:
+                if column not in columns:
+                    columns.append(column)
+
+    group_files = {}
+    dtypes = dict.fromkeys(columns)
+    for csv_path in csv_paths:
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            chunk = chunk.reindex(columns=columns)
+            for column, dtype in chunk.dtypes.items():
+                dtypes[column] = _combined_dtype(dtypes[column], dtype)
+            for group_key, subdf in chunk.groupby(activity_col, sort=False):
+                if group_key not in group_files:
+                    group_files[group_key] = os.path.join(spool_dir, f"group_{len(group_files)}.csv")
+                    subdf.to_csv(group_files[group_key], index=False)
+                else:
+                    subdf.to_csv(group_files[group_key], mode='a', header=False, index=False)
+
+    return [(group_key, group_files[group_key]) for group_key in sorted(group_files)], dtypes
+
+
+def write_sheet(workbook, sheet_name, csv_path, dtypes=None, chunksize=100000):
+    """
+    Stream a CSV file into a new sheet of a write-only workbook, one chunk at a time,
+    with the header styled as by DataFrame.to_excel.
+
+    Parameters:
+    - dtypes: Dtypes of the columns (optional, see spool_groups), inferred from each chunk if not given.
+
+    Returns:
+    - rows: Number of rows written (header excluded).
+    """
+    worksheet = workbook.create_sheet(title=sheet_name)
+    rows = 0
+    read_dtypes = _read_dtypes(dtypes) if dtypes is not None else None
+    for chunk_idx, chunk in enumerate(pd.read_csv(csv_path, chunksize=chunksize, dtype=read_dtypes, float_precision='round_trip')):
+        if chunk_idx == 0:
+            header = []
+            for column in chunk.columns:
+                cell = WriteOnlyCell(worksheet, value=column)
+                cell.font = HEADER_FONT
+                cell.border = HEADER_BORDER
+                cell.alignment = HEADER_ALIGNMENT
+                header.append(cell)
+            worksheet.append(header)
+        for row in chunk.itertuples(index=False, name=None):
+            worksheet.append([_excel_value(value) for value in row])
+        rows += len(chunk)
+
+    # Finish the sheet now, so that only one sheet is open at a time
+    worksheet.close()
+    return rows
+
+
+def write_groups_to_excel(workbook, groups, sheet_names, dtypes=None, progress_every=50, start_time=None):
+    """
+    Write each (group key, group file) to its sheet, with the same column dtypes in every sheet (see spool_groups),
+    printing progress every `progress_every` sheets.
+
+    Returns:
+    - rows: Number of rows written.
+    """
+    start_time = time.time() if start_time is None else start_time
+    rows = 0
+    for position, ((group_key, group_file), sheet_name) in enumerate(zip(groups, sheet_names), start=1):
+        rows += write_sheet(workbook, sheet_name, group_file, dtypes=dtypes)
+        os.remove(group_file)
+        if progress_every and (position % progress_every == 0 or position == len(groups)):
+            print(f"  {position}/{len(groups)} sheets written ({rows} rows, {time.time() - start_time:.1f} s)")
+    return rows
+
+
+@profiled()
 def combine_csvs_into_excel(
-    folder_path, 
-    csv_list, 
-    output_file, 
-    activity_col="activity_id"
+    folder_path,
+    csv_list,
+    output_file,
+    activity_col="activity_id",
+    progress_every=50
 ):
-    import os
-    import pandas as pd
+    """
+    Groups the rows of all CSVs in `csv_list` by `activity_col` and writes each group to a sheet
+    named "EF Contributions_{i}" (groups sorted by `activity_col`).
 
-    df_list = []
-    for csv_name in csv_list:
-        full_path = os.path.join(folder_path, csv_name)
-        df = pd.read_csv(full_path)
-        df_list.append(df)
-    
-    # Concatenate all CSV data
-    df_combined = pd.concat(df_list, ignore_index=True)
-    
-    # Create Excel writer
-    writer = pd.ExcelWriter(output_file, engine="openpyxl")
-
-    # Group by your chosen column
-    grouped = df_combined.groupby(activity_col)
-
-    # Enumerate each group, starting from 1
-    for i, (idx_value, subdf) in enumerate(grouped, start=1):
-        # Instead of using idx_value in the sheet name,
-        # use a simple sequential index i
-        sheet_name = f"EF Contributions_{i}"
+    The CSVs are read in chunks and the sheets are streamed into a write-only workbook,
+    so memory stays flat regardless of the number of sheets.
+    """
+    start_time = time.time()
+    csv_paths = [os.path.join(folder_path, csv_name) for csv_name in csv_list]
+
+    # Create a write-only workbook
+    workbook = Workbook(write_only=True)
 
-        # Write group to sheet
-        subdf.to_excel(writer, sheet_name=sheet_name, index=False)
+    with tempfile.TemporaryDirectory() as spool_dir:
+        # Group by your chosen column
+        groups, dtypes = spool_groups(csv_paths, activity_col, spool_dir)
 
-    # Close the writer (instead of .save())
-    writer.close()
+        # Instead of using the group value in the sheet name,
+        # use a simple sequential index i
+        sheet_names = [f"EF Contributions_{i}" for i in range(1, len(groups) + 1)]
+        write_groups_to_excel(workbook, groups, sheet_names, dtypes=dtypes, progress_every=progress_every, start_time=start_time)
+
+    workbook.save(output_file)
     print(f"Excel file saved as: {output_file}")
 
+@profiled()
 def combine_csvs_in_order(
     folder_path,
     csv_list,
     output_file,
-    activity_col="activity_id"
+    activity_col="activity_id",
+    progress_every=50
 ):
     """
     Reads each CSV in `csv_list` in order, groups by `activity_col`,
@@ -53,6 +189,9 @@ def combine_csvs_in_order(
       - i = index of the CSV file in `csv_list` (1-based)
       - j = index of the group within that CSV (also 1-based)
 
+    The CSVs are read in chunks and the sheets are streamed into a write-only workbook,
+    so memory stays flat regardless of the number of sheets.
+
     Parameters
     ----------
     folder_path : str
@@ -63,21 +202,24 @@ def combine_csvs_in_order(
         Path (including filename) for the resulting Excel file.
     activity_col : str
         The column name in the CSV(s) to group by. Defaults to 'activity_id'.
+    progress_every : int
+        Print progress every `progress_every` sheets (0 to disable). Defaults to 50.
     """
-    writer = pd.ExcelWriter(output_file, engine="openpyxl")
+    start_time = time.time()
+    workbook = Workbook(write_only=True)
 
     # Go through each CSV in the provided order
     for csv_idx, csv_name in enumerate(csv_list, start=1):
         full_path = os.path.join(folder_path, csv_name)
-        df = pd.read_csv(full_path)
 
-        # Group rows by the given column
-        grouped = df.groupby(activity_col)
+        with tempfile.TemporaryDirectory() as spool_dir:
+            # Group rows by the given column
+            groups, dtypes = spool_groups([full_path], activity_col, spool_dir)
 
-        # Write each group to a separate sheet
-        for group_idx, (group_key, subdf) in enumerate(grouped, start=1):
-            sheet_name = f"File{csv_idx}_Group{group_idx}"
-            subdf.to_excel(writer, sheet_name=sheet_name, index=False)
+            # Write each group to a separate sheet
+            sheet_names = [f"File{csv_idx}_Group{group_idx}" for group_idx in range(1, len(groups) + 1)]
+            print(f"{csv_name}: {len(groups)} groups")
+            write_groups_to_excel(workbook, groups, sheet_names, dtypes=dtypes, progress_every=progress_every, start_time=start_time)
 
-    writer.close()
+    workbook.save(output_file)
     print(f"Excel file saved as: {output_file}")
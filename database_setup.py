@@ -15,9 +15,95 @@ import matplotlib.pyplot as plt
 
 import os
 import ast
+import pickle
 
+from profiling import profiled
 
-def find_activity_by_name_product_location(db_name, activity_name, reference_product=None, location=None):
+
+#######################
+### ACTIVITY LOOKUP ###
+#######################
+
+# In-memory copy of the activity indexes, keyed by database name
+_activity_indexes = {}
+
+
+def activity_index_path(db_name):
+    """Path of the on-disk activity index of a database, inside the current project directory."""
+    return os.path.join(bd.projects.dir, 'activity_index', f"{db_name}.pickle")
+
+
+@profiled()
+def build_activity_index(db_name):
+    """
+    Build the lookup index of a database: {activity name: [(reference product, location, code), ...]}.
+    
+    Parameters:
+    - db_name: The name of the database to index.
+    
+    Returns:
+    - index: A dictionary with the exact activity names as keys.
+    """
+    index = defaultdict(list)
+
+    for act in bd.Database(db_name):
+        index[act['name']].append((act.get('reference product'), act.get('location'), act['code']))
+
+    return dict(index)
+
+
+def get_activity_index(db_name, rebuild=False):
+    """
+    Return the lookup index of a database, loading it from memory or disk when it is still valid.
+    The index is rebuilt and saved when the database modification timestamp has changed.
+    
+    Parameters:
+    - db_name: The name of the database.
+    - rebuild: Force the index to be rebuilt (optional).
+    
+    Returns:
+    - index: A dictionary with the exact activity names as keys (see build_activity_index).
+    """
+    if db_name not in bd.databases:
+        raise ValueError(f"Database '{db_name}' not found in project '{bd.projects.current}'")
+
+    modified = bd.databases[db_name].get('modified')
+    cache_key = (bd.projects.current, db_name)
+    index_path = activity_index_path(db_name)
+
+    if not rebuild:
+        # In-memory copy
+        cached = _activity_indexes.get(cache_key)
+        if cached is not None and cached['modified'] == modified:
+            return cached['index']
+
+        # On-disk copy
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'rb') as f:
+                    cached = pickle.load(f)
+                if cached.get('modified') == modified:
+                    _activity_indexes[cache_key] = cached
+                    return cached['index']
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+                print(f"Unable to read activity index '{index_path}' due to {e}. Rebuilding it.")
+
+    print(f"Building activity index for database '{db_name}'...")
+    cached = {'modified': modified, 'index': build_activity_index(db_name)}
+
+    # Write to a temporary file first, so that parallel workers never read a partial index
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, index_path)
+
+    _activity_indexes[cache_key] = cached
+    return cached['index']
+
+
+@profiled()
+def find_activity_by_name_product_location(db_name, activity_name, reference_product=None, location=None, use_index=True):
     """
     Find an activity by name, reference product, and location in a given database.
     
@@ -26,10 +112,34 @@ def find_activity_by_name_product_location(db_name, activity_name, reference_pro
     - activity_name: The name of the activity to search for.
     - reference_product: The reference product to filter the search (optional).
     - location: The location to filter the search (optional).
+    - use_index: If True (default), use the cached activity index, which only returns exact name matches.
+                 If False, use the database full-text search.
     
     Returns:
     - activity: The activity object found in the database.
     """
+    if use_index:
+        candidates = get_activity_index(db_name).get(activity_name)
+
+        if not candidates:
+            raise ValueError(f"Activity '{activity_name}' not found in database '{db_name}'")
+
+        # Filter by reference product if provided
+        if reference_product:
+            candidates = [entry for entry in candidates if entry[0] == reference_product]
+
+            if not candidates:
+                raise ValueError(f"No activity found with reference product '{reference_product}' for '{activity_name}'")
+
+        # Filter by location if provided
+        if location:
+            candidates = [entry for entry in candidates if entry[1] == location]
+
+            if not candidates:
+                raise ValueError(f"No activity found with location '{location}' for '{activity_name}' and '{reference_product}'")
+
+        return bd.get_activity((db_name, candidates[0][2]))
+
     db = bd.Database(db_name)
     search_results = db.search(activity_name)
     
@@ -59,6 +169,7 @@ def find_activity_by_name_product_location(db_name, activity_name, reference_pro
 
 
 
+@profiled()
 def find_activity_by_id(db_name, activity_id):
 
     db = bd.Database(db_name)
@@ -73,12 +184,62 @@ def find_activity_by_id(db_name, activity_id):
 
 
 
+# Additional exchange details kept as columns when present (e.g. the depth and path of supply chain impacts)
+RESULT_EXTRA_COLUMNS = ['depth', 'path']
+
+
+def _activity_metadata(activity):
+    """Activity attributes of the rows of results_to_dataframe (one production() query per activity)."""
+    production_exchanges = list(activity.production())
+    if production_exchanges:
+        production_exchange = production_exchanges[0]
+        production_amount = production_exchange['amount']
+        production_unit = production_exchange.input.get('unit', None)
+        production_location = production_exchange.input.get('location', None)
+    else:
+        production_amount = None
+        production_unit = None
+        production_location = None
+
+    return {
+        'activity_id': (activity.get('database', None), activity.get('code', None)),  # Unique ID for the main activity
+        'activity_unit': activity.get('unit', None),
+        'activity_location': activity.get('location', None),
+        'production_amount': production_amount,
+        'production_unit': production_unit,
+        'production_location': production_location,
+        'activity_categories': ' | '.join(activity.get('categories', ())) if 'categories' in activity else None
+    }
+
+
+def _object_array(values):
+    """1-D object array of the given values (tuples are kept as elements)."""
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _split_compartments(compartments):
+    """Split compartment tuples into compartment and sub_compartment arrays, once per distinct tuple."""
+    codes, uniques = pd.factorize(_object_array(compartments))
+    compartment_values = _object_array([values[0] for values in uniques] + [None])
+    sub_compartment_values = _object_array([' | '.join(values[1:]) if len(values) > 1 else None for values in uniques] + [None])
+    # Code -1 (no compartment) picks the trailing None
+    return compartment_values[codes], sub_compartment_values[codes]
+
+
+@profiled()
 def results_to_dataframe(results, project_name, db_name):
     """
     Converts the results dictionary into a pandas DataFrame, including additional details like
     project name, database name, activity information, exchange details, and splits the compartment
     into compartment and sub_compartment.
 
+    The DataFrame is assembled column by column: activity and method details are resolved once per result key
+    (and the production exchange once per activity), and compartments once per distinct tuple. Text columns are
+    left as object columns, so they can be filled and assigned to as before; the results store
+    (see results_store.write_results) converts them to categoricals when writing.
+
     Parameters:
     - results: Dictionary containing the calculation results.
     - project_name: Name of the Brightway2 project.
@@ -89,154 +250,184 @@ def results_to_dataframe(results, project_name, db_name):
     """
     import pandas as pd
 
-    # Convert dictionary to list of rows
-    rows = []
+    # Per result key: activity and method details, and the number of exchange rows
+    key_rows = []
+    counts = []
+    totals = []
+    activity_metadata = {}
+
+    # Per exchange row
+    sub_activity_ids = []
+    sub_activities = []
+    sub_activity_units = []
+    sub_activity_locations = []
+    values = []
+    exchange_types = []
+    compartments = []
+    extras = {column: [] for column in RESULT_EXTRA_COLUMNS}
+
     for key, result in results.items():
-        activity_name = key[0]
-        method = key[2]  # Ensure this is the method tuple (method, category, indicator)
         activity = result['activity']
         exchange_list = result['impacts']
 
-        # Extract activity attributes
-        activity_unit = activity.get('unit', None)
-        activity_location = activity.get('location', None)
-        activity_code = activity.get('code', None)
-        activity_database = activity.get('database', None)
-        activity_id = (activity_database, activity_code)  # Unique ID for the main activity
-        activity_categories = ' | '.join(activity.get('categories', ())) if 'categories' in activity else None
-
-        # Include production exchange details if needed
-        production_exchanges = list(activity.production())
-        if production_exchanges:
-            production_exchange = production_exchanges[0]
-            production_amount = production_exchange['amount']
-            production_unit = production_exchange.input.get('unit', None)
-            production_location = production_exchange.input.get('location', None)
-        else:
-            production_amount = None
-            production_unit = None
-            production_location = None
+        activity_key = activity.get('database', None), activity.get('code', None)
+        if activity_key not in activity_metadata:
+            activity_metadata[activity_key] = _activity_metadata(activity)
+
+        # Method tuple (method, category, indicator), missing parts are None
+        method = tuple(key[2])
+        impact_method, impact_category, impact_indicator = (method + (None, None, None))[:3]
+
+        key_rows.append(dict(
+            activity_metadata[activity_key],
+            activity_name=key[0],
+            impact_method=impact_method,
+            impact_category=impact_category,
+            impact_indicator=impact_indicator
+        ))
+        counts.append(len(exchange_list))
 
         # Calculate total impact for the category
-        total_impact = sum(exchange['impact'] for exchange in exchange_list)
-        
+        totals.append(sum(exchange['impact'] for exchange in exchange_list))
+
         for exchange_details in exchange_list:
-            # Handle compartment and sub_compartment
-            if 'compartment' in exchange_details and exchange_details['compartment']:
-                compartment_tuple = exchange_details['compartment']
-                if len(compartment_tuple) >= 1:
-                    compartment = compartment_tuple[0]
-                    if len(compartment_tuple) > 1:
-                        sub_compartment = ' | '.join(compartment_tuple[1:])
-                    else:
-                        sub_compartment = None
-                else:
-                    compartment = None
-                    sub_compartment = None
-            else:
-                compartment = None
-                sub_compartment = None
-
-            # Check the length of method to avoid 'index out of range' error
-            if len(method) == 3:
-                impact_method, impact_category, impact_indicator = method
-            elif len(method) == 2:
-                impact_method, impact_category = method
-                impact_indicator = None  # Default if the third element is missing
-            elif len(method) == 1:
-                impact_method = method[0]
-                impact_category = None
-                impact_indicator = None
-
-            row = {
-                'project_name': project_name,          # Include project name
-                'db_name': db_name,                    # Include database name
-                'activity_id': activity_id,            # Unique ID for the main activity
-                'activity_name': activity_name,
-                'activity_unit': activity_unit,
-                'activity_location': activity_location,
-                'impact_method': impact_method,
-                'impact_category': impact_category,
-                'impact_indicator': impact_indicator,
-                'sub_activity_id': exchange_details['exchange_id'],  # Unique ID for sub-activity
-                'sub_activity': exchange_details['exchange_name'],
-                'sub_activity_unit': exchange_details['exchange_unit'],
-                'sub_activity_location': exchange_details['exchange_location'],
-                'value': float(exchange_details['impact']),
-                'percentage': float(exchange_details['impact'] / total_impact * 100 if total_impact > 0 else 0),  # Include percentage
-                'total_impact': float(total_impact),   # Include total impact for the category
-                'exchange_type': exchange_details['type'],
-                'compartment': compartment,
-                'sub_compartment': sub_compartment,
-                'production_amount': production_amount,
-                'production_unit': production_unit,
-                'production_location': production_location,
-                'activity_categories': activity_categories
-            }
-            rows.append(row)
-
-    # Create DataFrame
-    df = pd.DataFrame(rows)
-    return df
+            sub_activity_ids.append(exchange_details['exchange_id'])
+            sub_activities.append(exchange_details['exchange_name'])
+            sub_activity_units.append(exchange_details['exchange_unit'])
+            sub_activity_locations.append(exchange_details['exchange_location'])
+            values.append(exchange_details['impact'])
+            exchange_types.append(exchange_details['type'])
+            compartment = exchange_details.get('compartment')
+            compartments.append(tuple(compartment) if compartment else None)
+            for column, column_values in extras.items():
+                column_values.append(exchange_details.get(column))
+
+    if not values:
+        return pd.DataFrame()
+
+    counts = np.asarray(counts)
+
+    def key_column(name):
+        # Repeat a per-key value over the exchange rows of each key
+        return np.repeat(_object_array([key_row[name] for key_row in key_rows]), counts)
+
+    values = np.asarray(values, dtype=float)
+    total_impacts = np.repeat(np.asarray(totals, dtype=float), counts)
+    percentages = np.zeros_like(values)
+    np.divide(values, total_impacts, out=percentages, where=total_impacts > 0)
+    percentages *= 100
+    compartment_column, sub_compartment_column = _split_compartments(compartments)
+
+    columns = {
+        'project_name': np.full(len(values), project_name, dtype=object),  # Include project name
+        'db_name': np.full(len(values), db_name, dtype=object),            # Include database name
+        'activity_id': key_column('activity_id'),                          # Unique ID for the main activity
+        'activity_name': key_column('activity_name'),
+        'activity_unit': key_column('activity_unit'),
+        'activity_location': key_column('activity_location'),
+        'impact_method': key_column('impact_method'),
+        'impact_category': key_column('impact_category'),
+        'impact_indicator': key_column('impact_indicator'),
+        'sub_activity_id': _object_array(sub_activity_ids),                # Unique ID for sub-activity
+        'sub_activity': _object_array(sub_activities),
+        'sub_activity_unit': _object_array(sub_activity_units),
+        'sub_activity_location': _object_array(sub_activity_locations),
+        'value': values,
+        'percentage': percentages,
+        'total_impact': total_impacts,                                     # Include total impact for the category
+        'exchange_type': _object_array(exchange_types),
+        'compartment': compartment_column,
+        'sub_compartment': sub_compartment_column,
+        'production_amount': key_column('production_amount'),
+        'production_unit': key_column('production_unit'),
+        'production_location': key_column('production_location'),
+        'activity_categories': key_column('activity_categories')
+    }
+    for column, column_values in extras.items():
+        if any(value is not None for value in column_values):
+            columns[column] = pd.Series(column_values)
+
+    df = pd.DataFrame(columns)
+    df['production_amount'] = pd.to_numeric(df['production_amount'])
 
+    return df
 
 
-def convert_excel_to_csvs(input_excel, output_folder):
+def coefficient_file_name(activity_id):
+    """
+    Extract the alphanumeric part of an 'activity_id' value (the code of a (database, code) tuple,
+    or of its string representation) for the coefficient file names. Returns None if it can't be parsed.
+    """
+    # Handle cases where 'activity_id' is a tuple or string representation of a tuple
+    if isinstance(activity_id, tuple):
+        activity_id = activity_id[1]  # Extract second element if it's a tuple
+    elif isinstance(activity_id, str) and activity_id.startswith("("):
+        try:
+            # Safely parse the string into a tuple
+            parsed_tuple = ast.literal_eval(activity_id)
+            if isinstance(parsed_tuple, tuple) and len(parsed_tuple) > 1:
+                activity_id = parsed_tuple[1]
+        except (ValueError, SyntaxError):
+            print(f"Unable to parse 'activity_id': {activity_id}")
+            return None
+    return activity_id
+
+
+@profiled()
+def convert_excel_to_csvs(input_excel, output_folder, combined_file=None, sheet_prefix='EF Contribution'):
     """
     Converts specific tabs in an Excel file into separate CSV files,
     saving them in a folder named 'input_coefficients'.
     Extracts only the alphanumeric part of 'activity_id' for file names.
+    The workbook is opened once (openpyxl read-only mode) and each sheet is written as soon as it is parsed.
 
     Args:
         input_excel (str): Path to the input Excel file.
+        output_folder (str): Folder of the CSV files (None to only write the combined file).
+        combined_file (str): Path of a Parquet file with the coefficients of all activities (optional).
+            A 'coefficient_file' column holds the name each CSV would have.
+        sheet_prefix (str): Prefix of the sheets to convert.
         
     Returns:
         None
     """
-    # Define the output folder
-    output_folder = output_folder
-    
     # Ensure the output folder exists
-    os.makedirs(output_folder, exist_ok=True)
-    
-    # Load the Excel file
-    excel_data = pd.ExcelFile(input_excel)
-    
-    # Filter sheets that start with 'EF'
-    ## TBD -> Change this to a variable
-    relevant_sheets = [sheet for sheet in excel_data.sheet_names if sheet.startswith('EF Contribution')]
-    
-    for sheet in relevant_sheets:
-        # Read the sheet into a DataFrame
-        df = pd.read_excel(input_excel, sheet_name=sheet)
-        
-        # Check if 'activity_id' column exists
-        if 'activity_id' not in df.columns:
-            print(f"Skipping sheet '{sheet}' as it doesn't contain 'activity_id'")
-            continue
-        
-        # Extract the value for the file name
-        activity_id = df['activity_id'].iloc[0]  # Assuming the first row contains the name
-        
-        # Handle cases where 'activity_id' is a tuple or string representation of a tuple
-        if isinstance(activity_id, tuple):
-            activity_id = activity_id[1]  # Extract second element if it's a tuple
-        elif isinstance(activity_id, str) and activity_id.startswith("("):
-            try:
-                # Safely parse the string into a tuple
-                parsed_tuple = ast.literal_eval(activity_id)
-                if isinstance(parsed_tuple, tuple) and len(parsed_tuple) > 1:
-                    activity_id = parsed_tuple[1]
-            except (ValueError, SyntaxError):
-                print(f"Unable to parse 'activity_id': {activity_id}")
+    if output_folder is not None:
+        os.makedirs(output_folder, exist_ok=True)
+
+    combined = []
+    # Load the Excel file once; sheets are parsed from the open workbook instead of re-reading the file
+    with pd.ExcelFile(input_excel, engine='openpyxl') as excel_data:
+        # Filter sheets that start with the prefix
+        relevant_sheets = [sheet for sheet in excel_data.sheet_names if sheet.startswith(sheet_prefix)]
+
+        for sheet in relevant_sheets:
+            # Read the sheet into a DataFrame
+            df = excel_data.parse(sheet_name=sheet)
+
+            # Check if 'activity_id' column exists
+            if 'activity_id' not in df.columns:
+                print(f"Skipping sheet '{sheet}' as it doesn't contain 'activity_id'")
                 continue
-        
-        # Define the output file path
-        output_file = os.path.join(output_folder, f"{activity_id}.csv")
-        
-        # Save the DataFrame as a CSV
-        df.to_csv(output_file, index=False)
-        print(f"Saved sheet '{sheet}' as '{output_file}'")
+
+            # Extract the value for the file name (first row)
+            activity_id = coefficient_file_name(df['activity_id'].iloc[0])
+            if activity_id is None:
+                continue
+
+            if output_folder is not None:
+                # Save the DataFrame as a CSV
+                output_file = os.path.join(output_folder, f"{activity_id}.csv")
+                df.to_csv(output_file, index=False)
+                print(f"Saved sheet '{sheet}' as '{output_file}'")
+
+            if combined_file is not None:
+                combined.append(df.assign(coefficient_file=f"{activity_id}.csv"))
+
+    if combined_file is not None and combined:
+        combined_df = pd.concat(combined, ignore_index=True)
+        combined_df.to_parquet(combined_file, index=False)
+        print(f"Saved {len(combined)} sheets as '{combined_file}'")
 
 
 
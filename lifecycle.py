@@ -9,24 +9,72 @@ import numpy as np
 
 import textwrap
 
-from collections import defaultdict
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+
+from collections import defaultdict, deque
+from functools import partial
+from types import SimpleNamespace
+
+import matrix_utils as mu
+from scipy import sparse
+from scipy.sparse.linalg import splu
 
 import matplotlib.pyplot as plt
 
 from database_setup import find_activity_by_name_product_location
+from profiling import profiled, profile_stage
 
 
 ##########################
 ### LIFECYCLE ANALYSIS ###
 ##########################
 
-def run_comprehensive_lcia(activity, methods_list):
+@profiled()
+def score_lca_methods(lca, methods_list):
+    """
+    Apply several impact assessment methods to the inventory of an LCA object that has already been solved.
+    The technosphere is not rebuilt nor re-solved: only the characterization matrix is swapped for each method.
+
+    Parameters:
+    - lca: A Brightway2 LCA object on which lci() has already been run.
+    - methods_list: A list of tuples representing the impact assessment methods.
+
+    Returns:
+    - scores: A dictionary with methods as keys and their corresponding LCIA scores as values.
+    """
+    scores = {}
+
+    for method in methods_list:
+        # Swap the characterization matrix only, the inventory stays the same
+        if getattr(lca, 'method', None) != method:
+            lca.switch_method(method)
+
+        if hasattr(lca, 'characterization_matrix'):
+            lca.lcia_calculation()
+        else:
+            lca.lcia()
+
+        scores[method] = lca.score
+
+    return scores
+
+
+@profiled()
+def run_comprehensive_lcia(activity, methods_list, multi_method=True, lca=None):
     """
     Perform a comprehensive LCIA for a given activity across multiple impact categories.
     
     Parameters:
     - activity: The specific activity for which the LCIA is to be performed.
     - methods_list: A list of tuples representing the impact assessment methods.
+    - multi_method: If True (default), build and solve the inventory once and apply every
+                    characterization matrix to it. If False, a new LCA is built and solved for each method.
+    - lca: An LCA object already solved for {activity: 1} (optional). If given, it is reused
+           instead of building a new one.
 
     Returns:
     - lca_results: A dictionary with methods as keys and their corresponding LCIA scores as values.
@@ -38,15 +86,37 @@ def run_comprehensive_lcia(activity, methods_list):
     # Initialize a dictionary to store the results
     lca_results = defaultdict(float)
 
-    # Loop over all impact categories in the method
-    for method in methods_list:
-        # Run LCI and LCIA
-        lca = bc.LCA(functional_unit, method)
-        lca.lci()
-        lca.lcia()
-        
-        # Store the result for each category
-        lca_results[method] = lca.score
+    # Scores already in the LCIA result cache (only if enabled, and never for an LCA object provided,
+    # which may have been modified in memory)
+    missing_methods = list(methods_list)
+    if lca is None and lcia_cache_enabled():
+        cached_scores = get_cached_lcia_scores(activity, methods_list)
+        lca_results.update(cached_scores)
+        missing_methods = [method for method in methods_list if method not in cached_scores]
+
+    if lca is not None:
+        # Reuse the inventory of the LCA object provided
+        lca_results.update(score_lca_methods(lca, methods_list))
+    elif multi_method and missing_methods:
+        # Run LCI once, then characterize the same inventory with every method
+        lca = build_database_lca(activity, missing_methods[0])
+        new_scores = score_lca_methods(lca, missing_methods)
+        lca_results.update(new_scores)
+        store_lcia_scores(activity, new_scores)
+    else:
+        # Loop over all impact categories in the method
+        for method in missing_methods:
+            # Run LCI and LCIA
+            lca = bc.LCA(functional_unit, method)
+            lca.lci()
+            lca.lcia()
+            
+            # Store the result for each category
+            lca_results[method] = lca.score
+            store_lcia_scores(activity, {method: lca.score})
+
+    # Keep the order of methods_list
+    lca_results = defaultdict(float, {method: lca_results[method] for method in methods_list})
 
     # Output the results
     for category, score in lca_results.items():
@@ -86,11 +156,570 @@ def run_comparative_lcia(activities_list, db_name, methods_list, reference_produ
     return comparative_results
 
 
+@profiled()
+def run_batch_lcia(activities_list, databases, methods_list, reference_product=None):
+    """
+    Perform LCIA for several activities in several databases at once, and return the scores as a labelled cube.
+    Within each database, the matrices are built and factorized once and all activities are solved together
+    as one multi-column demand matrix.
+
+    Parameters:
+    - activities_list: A list of tuples where each tuple contains an activity name and a location.
+    - databases: A list of database names (e.g. config.db_remindSSP1_baseline + config.db_remindSSP1_VSI).
+    - methods_list: A list of tuples representing the impact assessment methods.
+    - reference_product: Optional reference product for filtering activity results.
+
+    Returns:
+    - cube: A dictionary with the 'scores' array (activities x databases x methods, NaN for the activities not found)
+            and its labels: 'activities' ("name (location)", as in run_comparative_lcia), 'databases' and 'methods'.
+    """
+    scores = np.full((len(activities_list), len(databases), len(methods_list)), np.nan)
+
+    for db_position, db_name in enumerate(databases):
+        print(f"\nProcessing database '{db_name}'...")
+        found = []
+        for activity_position, (activity_name, location) in enumerate(activities_list):
+            try:
+                activity = find_activity_by_name_product_location(db_name, activity_name, reference_product, location)
+                found.append((activity_position, activity))
+            except ValueError as e:
+                print(e)
+
+        if not found:
+            continue
+
+        # One factorization and one solve for all activities of the database
+        lca = build_database_lca(found[0][1], methods_list[0])
+        demand_matrix = np.zeros((len(lca.dicts.product), len(found)))
+        for column, (_, activity) in enumerate(found):
+            demand_matrix[lca_matrix_index(lca.dicts.product, activity), column] = 1
+        supply_matrix = solve_technosphere_demands(lca, demand_matrix)
+        inventories = lca.biosphere_matrix @ supply_matrix
+        database_scores = characterization_vectors(lca, methods_list) @ inventories  # methods x activities
+
+        for column, (activity_position, activity) in enumerate(found):
+            scores[activity_position, db_position] = database_scores[:, column]
+            store_lcia_scores(activity, dict(zip(methods_list, database_scores[:, column].tolist())))
+
+        print(f"LCIA of {len(found)} activities completed in database '{db_name}'.")
+
+    return {
+        'scores': scores,
+        'activities': [f"{activity_name} ({location})" for activity_name, location in activities_list],
+        'databases': list(databases),
+        'methods': list(methods_list)
+    }
+
+
+def lcia_cube_to_dataframe(cube):
+    """
+    Convert an LCIA cube (see run_batch_lcia) into a long DataFrame with the
+    'Database', 'Activity', 'Method' and 'Score' columns (activities not found are left out).
+    """
+    activity_positions, db_positions, method_positions = np.nonzero(~np.isnan(cube['scores']))
+    return pd.DataFrame({
+        'Database': [cube['databases'][i] for i in db_positions],
+        'Activity': [cube['activities'][i] for i in activity_positions],
+        'Method': [cube['methods'][i] for i in method_positions],
+        'Score': cube['scores'][activity_positions, db_positions, method_positions]
+    })
+
+
+#########################
+### LCIA RESULT CACHE ###
+#########################
+
+# Settings of the LCIA result cache. Disabled until enable_lcia_cache() is called.
+LCIA_CACHE = {
+    'enabled': False,
+    'path': None,
+    'max_entries': 200000
+}
+
+# Hashes of processed datapackages already computed, keyed by (path, modification time, size)
+_datapackage_hashes = {}
+
+
+def enable_lcia_cache(cache_path=None, max_entries=200000):
+    """
+    Enable the persistent LCIA result cache used by run_comprehensive_lcia.
+    
+    Parameters:
+    - cache_path: Path of the SQLite cache file (optional). Defaults to 'lcia_cache.sqlite' in the project directory.
+    - max_entries: Maximum number of scores kept. The least recently used ones are removed first.
+    """
+    LCIA_CACHE['enabled'] = True
+    LCIA_CACHE['path'] = cache_path
+    LCIA_CACHE['max_entries'] = max_entries
+    _connect_lcia_cache().close()
+
+
+def disable_lcia_cache():
+    """Disable the LCIA result cache (the file is kept)."""
+    LCIA_CACHE['enabled'] = False
+
+
+def lcia_cache_enabled():
+    return LCIA_CACHE['enabled']
+
+
+def clear_lcia_cache():
+    """Remove every score from the LCIA result cache."""
+    with _connect_lcia_cache() as connection:
+        connection.execute("DELETE FROM scores")
+
+
+def _connect_lcia_cache():
+    cache_path = LCIA_CACHE['path'] or os.path.join(bd.projects.dir, 'lcia_cache.sqlite')
+    connection = sqlite3.connect(cache_path, timeout=60)
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS scores ("
+        "key TEXT PRIMARY KEY, db_name TEXT, db_state TEXT, score REAL, last_used REAL)"
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS scores_last_used ON scores (last_used)")
+    return connection
+
+
+def _datapackage_hash(filepath):
+    """SHA-256 of a processed datapackage, recomputed only when the file changes."""
+    stat = os.stat(filepath)
+    file_id = (str(filepath), stat.st_mtime_ns, stat.st_size)
+
+    if file_id not in _datapackage_hashes:
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        _datapackage_hashes[file_id] = digest.hexdigest()
+
+    return _datapackage_hashes[file_id]
+
+
+def database_state_hash(db_name):
+    """
+    Hash of the processed datapackages of a database and of all the databases it depends on.
+    Returns None if one of them has unprocessed changes, in which case the cache is not used.
+    """
+    db_names = sorted(bd.Database(db_name).find_graph_dependents())
+
+    if any(bd.databases[name].get('dirty') for name in db_names):
+        return None
+
+    digest = hashlib.sha256()
+    for name in db_names:
+        digest.update(name.encode())
+        digest.update(_datapackage_hash(bd.Database(name).filepath_processed()).encode())
+
+    return digest.hexdigest()
+
+
+def _lcia_cache_key(db_state, activity, method, amount):
+    method_state = _datapackage_hash(bd.Method(method).filepath_processed())
+    return hashlib.sha256(repr((db_state, activity.key, method, method_state, float(amount))).encode()).hexdigest()
+
+
+def get_cached_lcia_scores(activity, methods_list, amount=1):
+    """
+    Return the cached scores of an activity, for the methods found in the cache.
+    
+    Parameters:
+    - activity: The activity of the functional unit.
+    - methods_list: A list of tuples representing the impact assessment methods.
+    - amount: The amount of the functional unit.
+    
+    Returns:
+    - scores: A dictionary with methods as keys and cached LCIA scores as values (possibly empty).
+    """
+    db_state = database_state_hash(activity['database'])
+    if db_state is None:
+        return {}
+
+    keys = {_lcia_cache_key(db_state, activity, method, amount): method for method in methods_list}
+
+    with _connect_lcia_cache() as connection:
+        placeholders = ','.join('?' * len(keys))
+        rows = connection.execute(f"SELECT key, score FROM scores WHERE key IN ({placeholders})", list(keys)).fetchall()
+        connection.executemany("UPDATE scores SET last_used = ? WHERE key = ?", [(time.time(), key) for key, _ in rows])
+
+    return {keys[key]: score for key, score in rows}
+
+
+def store_lcia_scores(activity, scores, amount=1):
+    """
+    Store LCIA scores of an activity in the cache, if enabled.
+    Scores computed on a previous state of the same database are removed.
+    
+    Parameters:
+    - activity: The activity of the functional unit.
+    - scores: A dictionary with methods as keys and LCIA scores as values.
+    - amount: The amount of the functional unit.
+    """
+    if not lcia_cache_enabled() or not scores:
+        return
+
+    db_name = activity['database']
+    db_state = database_state_hash(db_name)
+    if db_state is None:
+        return
+
+    now = time.time()
+    rows = [
+        (_lcia_cache_key(db_state, activity, method, amount), db_name, db_state, float(score), now)
+        for method, score in scores.items()
+    ]
+
+    with _connect_lcia_cache() as connection:
+        # The database was rewritten since these scores were computed
+        connection.execute("DELETE FROM scores WHERE db_name = ? AND db_state != ?", (db_name, db_state))
+        connection.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?)", rows)
+
+        # Least recently used scores go first
+        excess = connection.execute("SELECT COUNT(*) FROM scores").fetchone()[0] - LCIA_CACHE['max_entries']
+        if excess > 0:
+            connection.execute(
+                "DELETE FROM scores WHERE key IN (SELECT key FROM scores ORDER BY last_used LIMIT ?)", (excess,)
+            )
+
+
+########################
+### MATRIX SNAPSHOTS ###
+########################
+
+# Settings of the matrix snapshots. Disabled until enable_matrix_snapshots() is called.
+MATRIX_SNAPSHOTS = {
+    'enabled': False,
+    'path': None
+}
+
+# Matrices and index arrays of a snapshot
+SNAPSHOT_MATRICES = ['technosphere', 'biosphere']
+SNAPSHOT_INDEXES = ['product', 'activity', 'biosphere']
+
+
+def enable_matrix_snapshots(snapshot_path=None):
+    """
+    Enable the matrix snapshots used by build_database_lca. The technosphere and biosphere matrices of a database
+    (and its index mappings) are saved as .npy files after the first build, and later LCA objects of the same
+    database state are loaded from them as memory-mapped arrays instead of being rebuilt from the datapackages.
+    
+    Parameters:
+    - snapshot_path: Folder of the snapshots (optional). Defaults to 'matrix_snapshots' in the project directory.
+    """
+    MATRIX_SNAPSHOTS['enabled'] = True
+    MATRIX_SNAPSHOTS['path'] = snapshot_path
+
+
+def disable_matrix_snapshots():
+    """Disable the matrix snapshots (the files are kept)."""
+    MATRIX_SNAPSHOTS['enabled'] = False
+
+
+def matrix_snapshots_enabled():
+    return MATRIX_SNAPSHOTS['enabled']
+
+
+def _matrix_snapshot_dir(db_name):
+    snapshot_path = MATRIX_SNAPSHOTS['path'] or os.path.join(bd.projects.dir, 'matrix_snapshots')
+    return os.path.join(snapshot_path, db_name)
+
+
+def save_matrix_snapshot(lca, db_name, db_state):
+    """
+    Save the technosphere and biosphere matrices and the index mappings of an LCA object
+    as the snapshot of a database state. Snapshots of previous states of the database are removed.
+    
+    Parameters:
+    - lca: An LCA object with the matrices loaded (see build_database_lca).
+    - db_name: Name of the database of the LCA object.
+    - db_state: State of the database (see database_state_hash).
+    """
+    db_dir = _matrix_snapshot_dir(db_name)
+    snapshot_dir = os.path.join(db_dir, db_state)
+    if os.path.isdir(snapshot_dir):
+        return
+
+    # Written to a temporary folder first, so that a snapshot is never read half-written
+    tmp_dir = f"{snapshot_dir}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    for name in SNAPSHOT_MATRICES:
+        matrix = getattr(lca, f'{name}_matrix').tocsr()
+        np.save(os.path.join(tmp_dir, f'{name}_data.npy'), matrix.data)
+        np.save(os.path.join(tmp_dir, f'{name}_indices.npy'), matrix.indices)
+        np.save(os.path.join(tmp_dir, f'{name}_indptr.npy'), matrix.indptr)
+
+    mappers = {
+        'product': lca.technosphere_mm.row_mapper,
+        'activity': lca.technosphere_mm.col_mapper,
+        'biosphere': lca.biosphere_mm.row_mapper
+    }
+    for name in SNAPSHOT_INDEXES:
+        np.save(os.path.join(tmp_dir, f'{name}_ids.npy'), mappers[name].array)
+
+    try:
+        os.replace(tmp_dir, snapshot_dir)
+    except OSError:
+        # Saved by another process in the meantime
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return
+
+    for name in os.listdir(db_dir):
+        if name != db_state and not name.endswith('.tmp'):
+            shutil.rmtree(os.path.join(db_dir, name), ignore_errors=True)
+
+    print(f"Saved matrix snapshot of database '{db_name}'")
+
+
+def load_matrix_snapshot(activity, method, db_state):
+    """
+    Build an LCA object for {activity: 1} from the matrix snapshot of its database, without rebuilding the matrices.
+    The arrays are memory-mapped copy-on-write: pages are shared between processes, and
+    in-memory modifications of the matrices are never written back to the snapshot.
+    
+    Parameters:
+    - activity: The activity of the functional unit.
+    - method: The LCIA method the LCA object is initialised with.
+    - db_state: State of the database (see database_state_hash).
+    
+    Returns:
+    - lca: An LCA object with the matrices loaded, or None if there is no snapshot of this database state.
+    """
+    snapshot_dir = os.path.join(_matrix_snapshot_dir(activity['database']), db_state)
+    if not os.path.isdir(snapshot_dir):
+        return None
+
+    def load(name):
+        return np.load(os.path.join(snapshot_dir, f'{name}.npy'), mmap_mode='c')
+
+    ids = {name: np.asarray(load(f'{name}_ids')) for name in SNAPSHOT_INDEXES}
+    shapes = {
+        'technosphere': (len(ids['product']), len(ids['activity'])),
+        'biosphere': (len(ids['biosphere']), len(ids['activity']))
+    }
+    matrices = {
+        name: sparse.csr_matrix((load(f'{name}_data'), load(f'{name}_indices'), load(f'{name}_indptr')), shape=shapes[name])
+        for name in SNAPSHOT_MATRICES
+    }
+
+    return lca_from_matrices(
+        {activity.id: 1}, method, matrices['technosphere'], matrices['biosphere'],
+        ids['product'], ids['activity'], ids['biosphere']
+    )
+
+
+def lca_from_matrices(demand, method, technosphere_matrix, biosphere_matrix, product_ids, activity_ids, biosphere_ids):
+    """
+    Build an LCA object from technosphere and biosphere matrices that are already built, e.g. from a matrix snapshot.
+    Only the characterization datapackage of the method is loaded.
+    
+    Parameters:
+    - demand: Demand dictionary, keyed by node ids.
+    - method: The LCIA method the LCA object is initialised with.
+    - technosphere_matrix, biosphere_matrix: The matrices (sparse).
+    - product_ids, activity_ids, biosphere_ids: Sorted node ids of the matrix rows and columns.
+    
+    Returns:
+    - lca: An LCA object with the matrices loaded, on which lci() can be called.
+    """
+    mappers = {
+        'product': mu.ArrayMapper(array=np.asarray(product_ids), empty_ok=True),
+        'activity': mu.ArrayMapper(array=np.asarray(activity_ids), empty_ok=True),
+        'biosphere': mu.ArrayMapper(array=np.asarray(biosphere_ids), empty_ok=True)
+    }
+
+    lca = bc.LCA(demand, data_objs=[bd.Method(method).datapackage()])
+    lca.method = method
+    lca.technosphere_matrix = technosphere_matrix
+    lca.biosphere_matrix = biosphere_matrix
+
+    # Stand-ins for the matrix_utils objects, which only need their mappers after the matrices are built
+    lca.technosphere_mm = SimpleNamespace(row_mapper=mappers['product'], col_mapper=mappers['activity'], matrix=technosphere_matrix)
+    lca.biosphere_mm = SimpleNamespace(row_mapper=mappers['biosphere'], col_mapper=mappers['activity'], matrix=biosphere_matrix)
+    lca.dicts.product = partial(mappers['product'].to_dict)
+    lca.dicts.activity = partial(mappers['activity'].to_dict)
+    lca.dicts.biosphere = partial(mappers['biosphere'].to_dict)
+
+    return lca
+
+
 #########################
 ### EXCHANGE ANALYSIS ###
 #########################
 
-def calculate_exchange_impacts(activity, method):
+@profiled()
+def build_database_lca(activity, method):
+    """
+    Build an LCA object whose matrices cover the whole database of the given activity (and its dependencies),
+    so that it can be reused for any activity of that database.
+    With matrix snapshots enabled (see enable_matrix_snapshots), the matrices are loaded from the snapshot of the database.
+
+    Parameters:
+    - activity: Any activity of the database.
+    - method: The LCIA method the LCA object is initialised with.
+
+    Returns:
+    - lca: A Brightway2 LCA object with the technosphere and biosphere matrices loaded.
+    """
+    # Start from the matrix snapshot of the database, if enabled and up to date
+    db_state = database_state_hash(activity['database']) if matrix_snapshots_enabled() else None
+    if db_state is not None:
+        with profile_stage('matrix snapshot loading'):
+            lca = load_matrix_snapshot(activity, method, db_state)
+        if lca is not None:
+            with profile_stage('lci solve'):
+                lca.lci()
+            return lca
+
+    lca = bc.LCA({activity: 1}, method)
+    with profile_stage('matrix building'):
+        lca.load_lci_data()
+    with profile_stage('lci solve'):
+        lca.lci()
+
+    if db_state is not None:
+        save_matrix_snapshot(lca, activity['database'], db_state)
+
+    return lca
+
+
+def lca_matrix_index(mapping, node):
+    """
+    Return the matrix index of a node from one of the LCA dictionaries (lca.dicts.product, lca.dicts.biosphere, ...).
+    These are keyed by database ids, or by (database, code) keys once remapped.
+    """
+    if node.id in mapping:
+        return mapping[node.id]
+    return mapping[node.key]
+
+
+def technosphere_factorization(lca):
+    """LU factorization of the technosphere matrix, computed on the first call and kept on the LCA object."""
+    if not hasattr(lca, 'technosphere_lu'):
+        with profile_stage('factorization'):
+            lca.technosphere_lu = splu(lca.technosphere_matrix.tocsc())
+    return lca.technosphere_lu
+
+
+def solve_technosphere_demands(lca, demand_matrix):
+    """
+    Solve the technosphere system for several demand vectors at once.
+    The technosphere matrix is factorized on the first call and the factorization is kept on the LCA object.
+
+    Parameters:
+    - lca: A Brightway2 LCA object with the technosphere matrix loaded.
+    - demand_matrix: A dense array (products x demands), one demand vector per column.
+
+    Returns:
+    - supply_matrix: A dense array (activities x demands), one supply vector per column.
+    """
+    return technosphere_factorization(lca).solve(np.asarray(demand_matrix, dtype=float))
+
+
+def characterization_vectors(lca, methods_list):
+    """Characterization factors of each method over the biosphere rows of the LCA object (methods x flows)."""
+    characterization = np.zeros((len(methods_list), lca.biosphere_matrix.shape[0]))
+    for method_position, method in enumerate(methods_list):
+        if getattr(lca, 'method', None) != method:
+            lca.switch_method(method)
+        elif not hasattr(lca, 'characterization_matrix'):
+            lca.load_lcia_data()
+        characterization[method_position] = lca.characterization_matrix.diagonal()
+    return characterization
+
+
+def calculate_exchange_impacts_batched(activity, method, lca=None):
+    """
+    Same as calculate_exchange_impacts, but all technosphere exchanges are solved together
+    as one multi-column right-hand side against a single factorization of the technosphere matrix.
+
+    Parameters:
+    - activity: The activity for which the impacts of exchanges are calculated.
+    - method: The LCIA method used to calculate the impacts.
+    - lca: An LCA object built with build_database_lca for the activity's database (optional).
+           Passing the same object for all activities of a database avoids refactorizing it.
+
+    Returns:
+    - A list of dictionaries containing exchange details and their corresponding impacts (unsorted).
+    """
+    if lca is None:
+        lca = build_database_lca(activity, method)
+
+    # Load the characterization matrix for the method (the inventory matrices are not rebuilt)
+    if getattr(lca, 'method', None) != method:
+        lca.switch_method(method)
+    elif not hasattr(lca, 'characterization_matrix'):
+        lca.load_lcia_data()
+
+    product_dict = lca.dicts.product
+    biosphere_dict = lca.dicts.biosphere
+
+    # Step 1: Collect the exchanges and build the demand matrix
+    # Column 0 is the activity itself, the following columns are its technosphere inputs
+    biosphere_exchanges = []
+    technosphere_exchanges = []
+    columns = [(lca_matrix_index(product_dict, activity), 1)]
+
+    for exchange in activity.exchanges():
+        exchange_type = exchange['type']
+        if exchange_type == 'biosphere':
+            biosphere_exchanges.append(exchange)
+        elif exchange_type == 'technosphere':
+            try:
+                columns.append((lca_matrix_index(product_dict, exchange.input), exchange['amount']))
+                technosphere_exchanges.append(exchange)
+            except KeyError as e:
+                print(f"Failed to compute LCA for exchange {exchange.input['name']} due to {e}")
+
+    demand_matrix = np.zeros((len(product_dict), len(columns)))
+    for col, (row, amount) in enumerate(columns):
+        demand_matrix[row, col] = amount
+
+    # Step 2: One solve for all demands, then characterize all of them with one product
+    supply_matrix = solve_technosphere_demands(lca, demand_matrix)
+    characterization_factors = lca.characterization_matrix.diagonal()
+    characterized_biosphere = lca.biosphere_matrix.T @ characterization_factors  # Impact per unit of each activity
+    scores = characterized_biosphere @ supply_matrix
+
+    # Life cycle inventory of the activity itself, for the biosphere contributions
+    activity_inventory = lca.biosphere_matrix @ supply_matrix[:, 0]
+
+    exchange_impacts = []
+
+    for exchange in biosphere_exchanges:
+        biosphere_flow = exchange.input
+        try:
+            bio_flow_index = lca_matrix_index(biosphere_dict, biosphere_flow)
+        except KeyError as e:
+            print(f"Failed to compute LCA for exchange {biosphere_flow['name']} due to {e}")
+            continue
+
+        exchange_impacts.append({
+            'exchange_name': biosphere_flow['name'],
+            'exchange_unit': biosphere_flow['unit'],
+            'exchange_location': biosphere_flow.get('location', None),
+            'exchange_id': biosphere_flow.key,
+            'impact': float(characterization_factors[bio_flow_index] * activity_inventory[bio_flow_index]),
+            'type': 'biosphere',
+            'compartment': biosphere_flow['categories']
+        })
+
+    for col, exchange in enumerate(technosphere_exchanges, start=1):
+        technosphere_input = exchange.input
+        exchange_impacts.append({
+            'exchange_name': technosphere_input['name'],
+            'exchange_unit': technosphere_input['unit'],
+            'exchange_location': technosphere_input.get('location', None),
+            'exchange_id': technosphere_input.key,
+            'impact': float(scores[col]),
+            'type': 'technosphere',
+            'compartment': None
+        })
+
+    return exchange_impacts
+
+
+@profiled()
+def calculate_exchange_impacts(activity, method, lca=None, batched=True):
     """
     Function to calculate and sort the impacts of both technosphere and biosphere exchanges for a given activity.
     It also calculates the percentage contribution of each exchange's impact to the total impact.
@@ -98,11 +727,35 @@ def calculate_exchange_impacts(activity, method):
     Parameters:
     - activity: The activity for which the impacts of exchanges are calculated.
     - method: The LCIA method used to calculate the impacts.
+    - lca: A shared LCA object from build_database_lca, only used when batched is True (optional).
+    - batched: If True (default), solve all technosphere exchanges against one factorization.
+               If False, a separate LCA is built for every technosphere exchange.
 
     Returns:
     - A sorted list of dictionaries containing exchange details, their corresponding impacts, 
       and their percentage contribution to the total impact, in descending order.
     """
+    if batched:
+        exchange_impacts = calculate_exchange_impacts_batched(activity, method, lca=lca)
+        total_impact = sum(exchange_details['impact'] for exchange_details in exchange_impacts)
+    else:
+        exchange_impacts, total_impact = _calculate_exchange_impacts_per_exchange(activity, method)
+
+    # Step 3: Calculate percentage contribution for each exchange
+    for exchange_details in exchange_impacts:
+        exchange_details['percentage'] = (exchange_details['impact'] / total_impact) * 100 if total_impact > 0 else 0
+
+    # Step 4: Sort and return the impacts to find the highest contributors
+    sorted_impacts = sorted(exchange_impacts, key=lambda item: item['impact'], reverse=True)
+
+    return sorted_impacts
+
+
+def _calculate_exchange_impacts_per_exchange(activity, method):
+    """
+    Original per-exchange calculation: one LCA for the activity and one for each technosphere exchange.
+    Returns the unsorted list of exchange details and the total impact.
+    """
     # List to track the impact of each exchange
     exchange_impacts = []
     total_impact = 0  # Track total impact for the activity
@@ -121,7 +774,7 @@ def calculate_exchange_impacts(activity, method):
                 # For biosphere flows, the exchange input is a biosphere flow
                 biosphere_flow = exchange.input
                 # Get the biosphere flow index in the biosphere dictionary
-                bio_flow_index = lca.biosphere_dict[biosphere_flow.key]
+                bio_flow_index = lca_matrix_index(lca.dicts.biosphere, biosphere_flow)
                 # Get the impact contribution
                 total_impact_contribution = lca.characterized_inventory[bio_flow_index, :].sum()
                 total_impact += total_impact_contribution  # Add to total impact
@@ -167,17 +820,11 @@ def calculate_exchange_impacts(activity, method):
         except Exception as e:
             print(f"Failed to compute LCA for exchange {exchange.input['name']} due to {e}")
 
-    # Step 3: Calculate percentage contribution for each exchange
-    for exchange_details in exchange_impacts:
-        exchange_details['percentage'] = (exchange_details['impact'] / total_impact) * 100 if total_impact > 0 else 0
-
-    # Step 4: Sort and return the impacts to find the highest contributors
-    sorted_impacts = sorted(exchange_impacts, key=lambda item: item['impact'], reverse=True)
-
-    return sorted_impacts
+    return exchange_impacts, total_impact
 
 
-def calculate_impacts_for_activities(activities_list, methods_list, database_name, reference_product=None):
+@profiled()
+def calculate_impacts_for_activities(activities_list, methods_list, database_name, reference_product=None, batched=True):
     """
     Function to loop through a range of activities and LCIA methods, calculate the impacts of exchanges,
     and return the results.
@@ -187,12 +834,16 @@ def calculate_impacts_for_activities(activities_list, methods_list, database_nam
     - methods_list: List of LCIA methods (tuples) used for calculating impacts.
     - database_name: The name of the database containing the activities.
     - reference_product: Optional reference product for filtering activity results.
+    - batched: If True (default), one factorized LCA is shared by all activities and methods of the database.
 
     Returns:
     - A dictionary containing activity, method, and sorted impacts for each combination.
     """
     results = {}
 
+    # Shared LCA object for the database, built on the first activity found
+    database_lca = None
+
     # Loop through each activity and its location (tuple)
     for activity_name, location in activities_list:
         try:
@@ -205,7 +856,10 @@ def calculate_impacts_for_activities(activities_list, methods_list, database_nam
 
                 # Call the calculate_exchange_impacts function
                 try:
-                    sorted_impacts = calculate_exchange_impacts(activity, method)
+                    if batched and database_lca is None:
+                        database_lca = build_database_lca(activity, method)
+
+                    sorted_impacts = calculate_exchange_impacts(activity, method, lca=database_lca, batched=batched)
                     
                     # Store results in the dictionary along with the activity object
                     results[(activity_name, location, method)] = {
@@ -227,40 +881,322 @@ def calculate_impacts_for_activities(activities_list, methods_list, database_nam
     return results
 
 
-def find_most_impactful_exchanges(lca, top_n=2):
+def get_node_names(nodes):
+    """
+    Fetch the names of several nodes in one query.
+
+    Parameters:
+    - nodes: A list of database ids or (database, code) keys, as found in the reversed LCA dictionaries.
+
+    Returns:
+    - names: A dictionary with the given ids / keys as keys and the node names as values.
+    """
+    from bw2data.backends import ActivityDataset as AD
+
+    ids = [node for node in nodes if isinstance(node, (int, np.integer))]
+    keys = {tuple(node) for node in nodes if not isinstance(node, (int, np.integer))}
+    names = {}
+
+    if ids:
+        query = AD.select(AD.id, AD.name).where(AD.id << [int(i) for i in ids])
+        names.update({node_id: name for node_id, name in query.tuples()})
+    if keys:
+        query = AD.select(AD.database, AD.code, AD.name).where(AD.code << [code for _, code in keys])
+        names.update({(database, code): name for database, code, name in query.tuples() if (database, code) in keys})
+
+    return names
+
+
+def find_most_impactful_exchanges(lca, top_n=2, aggregate_by=None):
     """
     Find the most impactful exchanges (both technosphere and biosphere) from a characterized LCA.
     
     Parameters:
     - lca: A Brightway2 LCA object that has already been run.
     - top_n: Number of top contributors to return.
+    - aggregate_by: None (default) to rank individual entries of the characterized inventory, reported by
+                    their biosphere flow, 'exchange' to rank the same entries reported as 'flow (process)',
+                    'flow' to rank biosphere flow totals, or 'process' to rank process totals.
     
     Returns:
-    - A list of tuples containing the top N most impactful exchanges and their contributions.
+    - A list of tuples containing the top N most impactful exchanges and their contributions:
+      (contribution, name, type), with type 'biosphere' (default and 'flow'), 'exchange' or 'technosphere'.
     """
-    # Initialize a list to store contributions
-    exchange_contributions = []
-    
-    # Get the reverse dictionaries for technosphere and biosphere
-    rev_techno, rev_prod, rev_bio = lca.reverse_dict()
+    if aggregate_by not in (None, 'exchange', 'flow', 'process'):
+        raise ValueError(f"Unknown aggregation '{aggregate_by}'. Use None, 'exchange', 'flow' or 'process'.")
 
-    # Loop over the non-zero elements of the characterized inventory
-    for row, col in zip(*lca.characterized_inventory.nonzero()):
-        contribution = lca.characterized_inventory[row, col]
-        
-        # Check if this is a biosphere or technosphere exchange
-        if col in rev_bio:
-            # Biosphere flow
-            flow = rev_bio[col]
-            flow_name = bd.get_activity(flow)["name"]
-            exchange_contributions.append((contribution, flow_name, "biosphere"))
+    # Contributions and their (flow row, process column)
+    if aggregate_by == 'flow':
+        contributions = np.asarray(lca.characterized_inventory.sum(axis=1)).ravel()
+        rows = np.arange(len(contributions))
+        cols = None
+    elif aggregate_by == 'process':
+        contributions = np.asarray(lca.characterized_inventory.sum(axis=0)).ravel()
+        rows = None
+        cols = np.arange(len(contributions))
+    else:
+        characterized_inventory = lca.characterized_inventory.tocoo()
+        contributions = characterized_inventory.data
+        rows = characterized_inventory.row
+        cols = characterized_inventory.col
+
+    if top_n <= 0 or len(contributions) == 0:
+        return []
+
+    # Partial sort by absolute impact, then sort the N winners only
+    top_n = min(top_n, len(contributions))
+    winners = np.argpartition(-np.abs(contributions), top_n - 1)[:top_n]
+    winners = winners[np.argsort(-np.abs(contributions[winners]))]
+
+    # Resolve the names of the winners only, in one query
+    flows = [lca.dicts.biosphere.reversed[rows[i]] for i in winners] if rows is not None else []
+    processes = [lca.dicts.activity.reversed[cols[i]] for i in winners] if aggregate_by in ('exchange', 'process') else []
+    names = get_node_names(flows + processes)
+
+    exchange_contributions = []
+    for position, i in enumerate(winners):
+        contribution = float(contributions[i])
+        if aggregate_by == 'process':
+            exchange_contributions.append((contribution, names.get(processes[position]), "technosphere"))
+        elif aggregate_by == 'exchange':
+            flow_name = names.get(flows[position])
+            process_name = names.get(processes[position])
+            exchange_contributions.append((contribution, f"{flow_name} ({process_name})", "exchange"))
         else:
-            # Technosphere flow (process contribution)
-            process = rev_techno[col]
-            process_name = bd.get_activity(process)["name"]
-            exchange_contributions.append((contribution, process_name, "technosphere"))
+            exchange_contributions.append((contribution, names.get(flows[position]), "biosphere"))
 
-    # Sort contributions by absolute impact (descending)
-    exchange_contributions.sort(key=lambda x: abs(x[0]), reverse=True)
-    
-    return exchange_contributions[:top_n]
\ No newline at end of file
+    return exchange_contributions
+
+
+##############################
+### SUPPLY CHAIN TRAVERSAL ###
+##############################
+
+def cumulative_unit_impacts(lca, method):
+    """
+    Cumulative impact of one unit of every product of the LCA object (its whole supply chain included),
+    from one transposed solve against the factorized technosphere matrix.
+
+    Parameters:
+    - lca: An LCA object built with build_database_lca.
+    - method: The LCIA method.
+
+    Returns:
+    - unit_impacts: Array of cumulative impacts, indexed by product row.
+    - direct_impacts: Array of the impacts of the direct emissions of one unit of every activity, indexed by activity column.
+    """
+    if getattr(lca, 'method', None) != method:
+        lca.switch_method(method)
+    elif not hasattr(lca, 'characterization_matrix'):
+        lca.load_lcia_data()
+
+    direct_impacts = lca.biosphere_matrix.T @ lca.characterization_matrix.diagonal()
+    unit_impacts = technosphere_factorization(lca).solve(np.asarray(direct_impacts, dtype=float), trans='T')
+    return unit_impacts, direct_impacts
+
+
+def get_node_details(ids):
+    """
+    Fetch the key, name, unit and location of several nodes in one query.
+
+    Returns:
+    - details: A dictionary with the database ids as keys and dictionaries of node details as values.
+    """
+    from bw2data.backends import ActivityDataset as AD
+
+    query = AD.select(AD.id, AD.database, AD.code, AD.name, AD.location, AD.data).where(AD.id << [int(i) for i in ids])
+    return {
+        node_id: {'key': (database, code), 'name': name, 'location': location, 'unit': data.get('unit')}
+        for node_id, database, code, name, location, data in query.tuples()
+    }
+
+
+def producer_column(lca, row):
+    """
+    Column of the activity producing the product of a technosphere row. Found through the ids of the product
+    and the activity (the same node), not through the largest entry of the row: waste treatments have a negative
+    production amount, below the positive entries of the activities sending waste to them.
+    """
+    product_id = lca.dicts.product.reversed[row]
+    if product_id not in lca.dicts.activity:
+        raise ValueError(f"Product {product_id} is not produced by an activity of the same id; its supply chain can't be traversed")
+    return lca.dicts.activity[product_id]
+
+
+@profiled()
+def traverse_supply_chain(activity, method, lca=None, cutoff=0.01, max_depth=10, max_nodes=1000):
+    """
+    Walk the supply chain of an activity breadth-first, using one factorized LCA object for every node.
+    The cumulative impact of each input comes from the unit impacts of the products (see cumulative_unit_impacts),
+    so no LCA is solved per node. Inputs whose cumulative impact is below `cutoff` times the total impact are
+    not visited, and their impacts are kept as the 'cutoff_impact' of their parent.
+
+    Parameters:
+    - activity: The activity at the root of the supply chain.
+    - method: The LCIA method.
+    - lca: An LCA object built with build_database_lca for the activity's database (optional).
+           Passing the same object for all activities of a database avoids refactorizing it.
+    - cutoff: Relative impact (share of the absolute total impact) under which inputs are not visited.
+    - max_depth: Maximum depth of the nodes visited (the activity itself is at depth 0 and is always expanded).
+    - max_nodes: Maximum number of nodes expanded.
+
+    Returns:
+    - tree: A list of node dictionaries in breadth-first order, with the 'parent' position in the list (None for the root),
+            the 'depth', the 'amount' of product supplied, its 'cumulative_impact', and for expanded nodes the 'direct_impact'
+            of their own emissions and the 'cutoff_impact' of their inputs not visited. The cumulative impact of an expanded
+            node is the sum of its direct impact, its cut-off impact and the cumulative impacts of its children.
+    """
+    if lca is None:
+        lca = build_database_lca(activity, method)
+
+    unit_impacts, direct_impacts = cumulative_unit_impacts(lca, method)
+    technosphere = lca.technosphere_matrix.tocsc()
+
+    root_row = lca_matrix_index(lca.dicts.product, activity)
+    total_impact = unit_impacts[root_row]
+    threshold = abs(total_impact) * cutoff
+
+    tree = [{'row': root_row, 'parent': None, 'depth': 0, 'amount': 1.0, 'cumulative_impact': float(total_impact)}]
+    queue = deque([0])
+    expanded = 0
+
+    while queue:
+        position = queue.popleft()
+        node = tree[position]
+        row = node['row']
+        col = producer_column(lca, row)
+        node['col'] = col
+        node['expanded'] = node['depth'] == 0 or (node['depth'] < max_depth and expanded < max_nodes)
+        if not node['expanded']:
+            continue
+        expanded += 1
+
+        # Scale of the producing activity, its own emissions and its inputs
+        scale = node['amount'] / technosphere[row, col]
+        node['direct_impact'] = float(direct_impacts[col] * scale)
+
+        start, end = technosphere.indptr[col], technosphere.indptr[col + 1]
+        input_rows = technosphere.indices[start:end]
+        input_amounts = -technosphere.data[start:end] * scale
+        inputs = input_rows != row
+        input_rows, input_amounts = input_rows[inputs], input_amounts[inputs]
+        input_impacts = unit_impacts[input_rows] * input_amounts
+
+        # Visit the largest inputs first, so that the node budget goes to the hotspots
+        visited = np.abs(input_impacts) >= threshold
+        node['cutoff_impact'] = float(input_impacts[~visited].sum())
+        for child in np.argsort(-np.abs(input_impacts)):
+            if not visited[child]:
+                continue
+            tree.append({
+                'row': input_rows[child],
+                'parent': position,
+                'depth': node['depth'] + 1,
+                'amount': float(input_amounts[child]),
+                'cumulative_impact': float(input_impacts[child])
+            })
+            queue.append(len(tree) - 1)
+
+    # Node details, in one query
+    node_ids = {node['col']: lca.dicts.activity.reversed[node['col']] for node in tree}
+    details = get_node_details(node_ids.values())
+    for node in tree:
+        node_id = node_ids[node['col']]
+        node.update(details.get(node_id, {'key': node_id, 'name': None, 'location': None, 'unit': None}))
+        node['id'] = node_id
+        del node['row'], node['col']
+
+    return tree
+
+
+def supply_chain_impacts(tree):
+    """
+    Flatten a supply chain tree (see traverse_supply_chain) into exchange details, as returned by calculate_exchange_impacts:
+    - 'direct' rows for the own emissions of the expanded nodes
+    - 'cut-off' rows for the inputs of the expanded nodes not visited
+    - 'technosphere' rows for the cumulative impacts of the nodes not expanded
+    The impacts sum to the total impact of the root. Each row also has the 'depth' of its node and its 'path' from the root.
+
+    Returns:
+    - A sorted list of dictionaries containing exchange details, their impacts and percentage contributions, in descending order.
+    """
+    paths = []
+    for node in tree:
+        parent_path = paths[node['parent']] if node['parent'] is not None else None
+        paths.append(node['name'] if parent_path is None else f"{parent_path} > {node['name']}")
+
+    exchange_impacts = []
+    for node, path in zip(tree, paths):
+        exchange_details = {
+            'exchange_name': node['name'],
+            'exchange_unit': node['unit'],
+            'exchange_location': node['location'],
+            'exchange_id': node['key'],
+            'compartment': None,
+            'depth': node['depth'],
+            'path': path
+        }
+        if not node['expanded']:
+            exchange_impacts.append(dict(exchange_details, impact=node['cumulative_impact'], type='technosphere'))
+            continue
+        exchange_impacts.append(dict(exchange_details, impact=node['direct_impact'], type='direct'))
+        if node['cutoff_impact'] != 0:
+            exchange_impacts.append(dict(exchange_details, impact=node['cutoff_impact'], type='cut-off'))
+
+    total_impact = tree[0]['cumulative_impact']
+    for exchange_details in exchange_impacts:
+        exchange_details['percentage'] = (exchange_details['impact'] / total_impact) * 100 if total_impact > 0 else 0
+
+    return sorted(exchange_impacts, key=lambda item: item['impact'], reverse=True)
+
+
+def calculate_supply_chain_for_activities(activities_list, methods_list, database_name, reference_product=None, cutoff=0.01, max_depth=10, max_nodes=1000):
+    """
+    Same as calculate_impacts_for_activities, but the impacts are traced through the supply chain of each activity
+    (see traverse_supply_chain) instead of its direct exchanges only. One factorized LCA is shared by all activities
+    and methods of the database. The results can be converted with database_setup.results_to_dataframe.
+
+    Parameters:
+    - activities_list: List of tuples where each tuple contains an activity name and its location.
+    - methods_list: List of LCIA methods (tuples) used for calculating impacts.
+    - database_name: The name of the database containing the activities.
+    - reference_product: Optional reference product for filtering activity results.
+    - cutoff: Relative impact under which inputs are not visited.
+    - max_depth: Maximum depth of the nodes visited.
+    - max_nodes: Maximum number of nodes expanded per activity and method.
+
+    Returns:
+    - A dictionary containing activity, method, flattened impacts and supply chain tree for each combination.
+    """
+    results = {}
+    database_lca = None
+
+    for activity_name, location in activities_list:
+        try:
+            activity = find_activity_by_name_product_location(database_name, activity_name, reference_product, location)
+        except ValueError as e:
+            print(e)
+            continue
+
+        for method in methods_list:
+            print(f"\n -- Tracing the supply chain of '{activity_name}' in location '{location}' using method '{method}'...")
+            try:
+                if database_lca is None:
+                    database_lca = build_database_lca(activity, method)
+
+                tree = traverse_supply_chain(activity, method, lca=database_lca, cutoff=cutoff, max_depth=max_depth, max_nodes=max_nodes)
+                sorted_impacts = supply_chain_impacts(tree)
+                results[(activity_name, location, method)] = {
+                    'activity': activity,
+                    'impacts': sorted_impacts,
+                    'tree': tree
+                }
+
+                print(f"\n ---- {sum(node['expanded'] for node in tree)} nodes expanded, top hotspots:")
+                for exchange in sorted_impacts[:5]:
+                    print(f"Path: {exchange['path']}, Type: {exchange['type']}, Impact: {exchange['impact']}")
+
+            except Exception as e:
+                print(f"\n -- Failed to trace the supply chain of {activity_name} in location {location} using {method} due to: {e}")
+
+    return results
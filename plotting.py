@@ -1,9 +1,12 @@
+import os
 import numpy as np
 import pandas as pd
 import seaborn as sns
 import textwrap
 import matplotlib.pyplot as plt
 
+from results_store import read_results
+
 
 
 def plot_lcia_radar_log(lcia_results, activity_name, reference_product=None, location=None, wrap_width=20):
@@ -167,9 +170,19 @@ def plot_activity_impact_changes(activity_name, df):
 ## CONTRIBUTION ANALYSIS ##
 ###########################
 
-def visualize_contribution_all_activities_with_grid(csv_path):
-    # Load data
-    df = pd.read_csv(csv_path)
+def visualize_contribution_all_activities_with_grid(csv_path, activities=None, methods=None):
+    # Load data: from a results store folder, only the activities and methods needed
+    if os.path.isdir(csv_path):
+        df = read_results(
+            csv_path, activities=activities, methods=methods,
+            columns=['activity_id', 'activity_name', 'impact_indicator', 'sub_activity', 'compartment', 'exchange_type', 'percentage']
+        )
+    else:
+        df = pd.read_csv(csv_path)
+        if activities is not None:
+            df = df[df['activity_name'].isin([activity[0] if isinstance(activity, tuple) else activity for activity in activities])]
+        if methods is not None:
+            df = df[df[['impact_method', 'impact_category', 'impact_indicator']].apply(tuple, axis=1).isin(methods)]
     
     # Convert percentage column to numeric
     df['percentage'] = pd.to_numeric(df['percentage'], errors='coerce')
@@ -205,7 +218,8 @@ def visualize_contribution_all_activities_with_grid(csv_path):
             index="impact_indicator", 
             columns="sub_activity_label", 
             aggfunc="sum",
-            fill_value=0
+            fill_value=0,
+            observed=True
         )
 
         # Define colors: different shades for technosphere and biosphere
@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import tracemalloc
+
+from functools import wraps
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+#################
+### PROFILING ###
+#################
+
+# Settings and records of the profiler. Disabled until enable_profiling() is called.
+# Stages run in worker processes (process_all_csvs_parallel, n_workers > 1) are not recorded, only the parallel run as a whole.
+# - stats: per stage, number of calls, total and maximum wall time, own time (without nested stages) and peak memory
+# - events: every call of a stage (start, duration, depth), for the JSON trace
+PROFILING = {
+    'enabled': False,
+    'memory': False,
+    'tracemalloc_started': False,
+    'max_events': 100000,
+    'start': None,
+    'stats': {},
+    'events': [],
+    'stack': []
+}
+
+
+def enable_profiling(memory=True, max_events=100000):
+    """
+    Enable the profiling of the pipeline stages (see profile_stage and profiled), and clear previous records.
+
+    Parameters:
+    - memory: Also record the peak memory of each stage (with tracemalloc, which slows down allocations).
+    - max_events: Maximum number of calls kept for the JSON trace (the summary counts all calls).
+    """
+    reset_profiling()
+    PROFILING['enabled'] = True
+    PROFILING['memory'] = memory
+    PROFILING['max_events'] = max_events
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        PROFILING['tracemalloc_started'] = True
+
+
+def disable_profiling():
+    """Disable the profiling. The records are kept until the next enable_profiling() or reset_profiling()."""
+    PROFILING['enabled'] = False
+    PROFILING['memory'] = False
+    if PROFILING['tracemalloc_started'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    PROFILING['tracemalloc_started'] = False
+
+
+def profiling_enabled():
+    return PROFILING['enabled']
+
+
+def reset_profiling():
+    PROFILING['start'] = time.perf_counter()
+    PROFILING['stats'] = {}
+    PROFILING['events'] = []
+    PROFILING['stack'] = []
+
+
+@contextmanager
+def profile_stage(name):
+    """
+    Record the wall time (and peak memory, if enabled) of a block of code as one call of the stage `name`.
+    Stages can be nested; the own time of a stage excludes the time of the stages nested in it.
+    Does nothing when profiling is disabled.
+    """
+    if not PROFILING['enabled']:
+        yield
+        return
+
+    stack = PROFILING['stack']
+    memory = PROFILING['memory'] and tracemalloc.is_tracing()
+    frame = {'children_time': 0.0, 'peak': 0}
+    if memory:
+        # Keep the peak of the enclosing stage before measuring this one from the current memory
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        stack.pop()
+        peak = max(frame['peak'], tracemalloc.get_traced_memory()[1]) if memory else None
+        if stack:
+            stack[-1]['children_time'] += duration
+            if memory:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+
+        stats = PROFILING['stats'].setdefault(name, {'calls': 0, 'total_time': 0.0, 'own_time': 0.0, 'max_time': 0.0, 'peak_memory': None})
+        stats['calls'] += 1
+        stats['total_time'] += duration
+        stats['own_time'] += duration - frame['children_time']
+        stats['max_time'] = max(stats['max_time'], duration)
+        if memory:
+            stats['peak_memory'] = max(stats['peak_memory'] or 0, peak)
+
+        if len(PROFILING['events']) < PROFILING['max_events']:
+            PROFILING['events'].append({
+                'name': name,
+                'start': start - PROFILING['start'],
+                'duration': duration,
+                'depth': len(stack),
+                'peak_memory': peak
+            })
+
+
+def profiled(name=None):
+    """
+    Decorator recording every call of a function as a stage (see profile_stage),
+    named after the function ('module.function') unless `name` is given.
+    """
+    def decorator(func):
+        stage = name or f"{func.__module__}.{func.__name__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILING['enabled']:
+                return func(*args, **kwargs)
+            with profile_stage(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def profiling_summary():
+    """
+    Summary of the stages recorded since profiling was enabled.
+
+    Returns:
+    - summary: A DataFrame with one row per stage, sorted by own time: 'Calls', 'Total (s)', 'Own (s)' (without nested stages),
+               'Mean (s)', 'Max (s)', 'Share (%)' (own time as a share of the time since profiling was enabled)
+               and 'Peak Memory (MB)' (peak traced memory during the stage, if recorded).
+    """
+    elapsed = time.perf_counter() - PROFILING['start'] if PROFILING['start'] is not None else 0
+    rows = []
+    for name, stats in PROFILING['stats'].items():
+        rows.append({
+            'Stage': name,
+            'Calls': stats['calls'],
+            'Total (s)': stats['total_time'],
+            'Own (s)': stats['own_time'],
+            'Mean (s)': stats['total_time'] / stats['calls'],
+            'Max (s)': stats['max_time'],
+            'Share (%)': stats['own_time'] / elapsed * 100 if elapsed > 0 else 0,
+            'Peak Memory (MB)': stats['peak_memory'] / 1e6 if stats['peak_memory'] is not None else None
+        })
+
+    columns = ['Stage', 'Calls', 'Total (s)', 'Own (s)', 'Mean (s)', 'Max (s)', 'Share (%)', 'Peak Memory (MB)']
+    return pd.DataFrame(rows, columns=columns).sort_values('Own (s)', ascending=False).reset_index(drop=True)
+
+
+def print_profiling_summary():
+    """Print the summary of the stages recorded (see profiling_summary)."""
+    summary = profiling_summary()
+    if summary.empty:
+        print("No stages recorded. Call enable_profiling() before the run.")
+        return
+    print(summary.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+
+
+def write_profiling_trace(trace_file):
+    """
+    Write the stages recorded to a JSON trace, in the Trace Event format (viewable in chrome://tracing or Perfetto),
+    with the summary of every stage under 'summary'.
+
+    Parameters:
+    - trace_file: Path of the JSON file.
+    """
+    trace_events = []
+    for event in PROFILING['events']:
+        trace_event = {
+            'name': event['name'],
+            'ph': 'X',
+            'ts': event['start'] * 1e6,
+            'dur': event['duration'] * 1e6,
+            'pid': os.getpid(),
+            'tid': 0,
+            'args': {'depth': event['depth']}
+        }
+        if event['peak_memory'] is not None:
+            trace_event['args']['peak_memory_mb'] = event['peak_memory'] / 1e6
+        trace_events.append(trace_event)
+
+    summary = profiling_summary()
+    trace = {
+        'traceEvents': trace_events,
+        'displayTimeUnit': 'ms',
+        'summary': json.loads(summary.to_json(orient='records'))
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+    with open(trace_file, 'w') as f:
+        json.dump(trace, f)
+    print(f"Profiling trace of {len(trace_events)} calls saved to '{trace_file}'")
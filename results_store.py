@@ -0,0 +1,195 @@
+import os
+import re
+
+import pandas as pd
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from profiling import profiled
+
+
+#####################
+### RESULTS STORE ###
+#####################
+
+# Columns holding method tuples, and the columns they are split into
+METHOD_COLUMN = 'Method'
+METHOD_PARTS = ['impact_method', 'impact_category', 'impact_indicator']
+
+# Columns holding (database, code) tuples
+ID_COLUMNS = ['activity_id', 'sub_activity_id']
+
+# Partitions of the store: scenario / year / impact category
+PARTITION_COLUMNS = ['scenario', 'year', 'impact_category']
+
+# Columns with few distinct values, stored as categoricals (dictionary encoded)
+CATEGORICAL_COLUMNS = [
+    'Database', 'Activity', 'project_name', 'db_name', 'activity_name', 'activity_unit', 'activity_location',
+    'impact_method', 'impact_indicator', 'sub_activity', 'sub_activity_unit', 'sub_activity_location',
+    'exchange_type', 'compartment', 'sub_compartment', 'production_unit', 'production_location',
+    'activity_categories', 'activity_id_database', 'sub_activity_id_database'
+]
+
+
+def year_from_db_name(db_name):
+    """Extract the year of a scenario database name (see database_setup.scenario_db_name), or None."""
+    match = re.search(r'_(\d{4})_', str(db_name))
+    return int(match.group(1)) if match else None
+
+
+def _is_tuple_column(series):
+    values = series.dropna()
+    return not values.empty and values.map(lambda value: isinstance(value, tuple)).all()
+
+
+def normalize_results(df, scenario):
+    """
+    Turn a results DataFrame (combined results from process_all_csvs*, or contribution results from
+    database_setup.results_to_dataframe) into the typed layout of the store:
+    - method tuples are split into impact_method / impact_category / impact_indicator
+    - (database, code) tuples are split into <column>_database / <column>_code
+    - scenario and year partition columns are added
+    - repeated strings become categoricals
+
+    Parameters:
+    - df: The results DataFrame.
+    - scenario: Name of the scenario run (e.g. 'remindSSP1_baseline').
+
+    Returns:
+    - df: A new DataFrame in the store layout.
+    """
+    df = df.copy()
+    df['scenario'] = scenario
+
+    # Method tuples -> method parts
+    if METHOD_COLUMN in df.columns:
+        methods = df[METHOD_COLUMN].map(lambda method: tuple(method) if isinstance(method, (tuple, list)) else (method,))
+        for position, part in enumerate(METHOD_PARTS):
+            df[part] = methods.map(lambda method: method[position] if len(method) > position else None)
+        df = df.drop(columns=[METHOD_COLUMN])
+
+    # (database, code) tuples -> two columns
+    for column in ID_COLUMNS:
+        if column in df.columns and _is_tuple_column(df[column]):
+            df[f'{column}_database'] = df[column].map(lambda key: key[0] if isinstance(key, tuple) else None)
+            df[f'{column}_code'] = df[column].map(lambda key: key[1] if isinstance(key, tuple) else None)
+            df = df.drop(columns=[column])
+
+    # Year partition: from the results, or from the database name
+    if 'Year' in df.columns:
+        df['year'] = df['Year'].astype('Int64')
+    elif 'db_name' in df.columns:
+        df['year'] = df['db_name'].map(year_from_db_name).astype('Int64')
+    else:
+        df['year'] = pd.Series(pd.NA, index=df.index, dtype='Int64')
+
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+
+    return df
+
+
+@profiled()
+def write_results(df, store_path, scenario):
+    """
+    Write a results DataFrame to the store, partitioned by scenario / year / impact category.
+    Partitions already written for the same scenario, year and category are replaced.
+
+    Parameters:
+    - df: The results DataFrame (see normalize_results).
+    - store_path: Root folder of the store (e.g. './outputs/results_store/combined_results').
+    - scenario: Name of the scenario run (e.g. 'remindSSP1_baseline').
+    """
+    df = normalize_results(df, scenario)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    os.makedirs(store_path, exist_ok=True)
+    ds.write_dataset(
+        table,
+        store_path,
+        format='parquet',
+        partitioning=ds.partitioning(table.select(PARTITION_COLUMNS).schema, flavor='hive'),
+        existing_data_behavior='delete_matching',
+        basename_template=f"{scenario}-part-{{i}}.parquet"
+    )
+    print(f"Saved {len(df)} rows of scenario '{scenario}' to '{store_path}'")
+
+
+def _methods_filter(methods):
+    """Filter expression matching any of the given method tuples on the method parts."""
+    expression = None
+    for method in methods:
+        method_expression = None
+        for part, value in zip(METHOD_PARTS, method):
+            part_expression = ds.field(part) == value
+            method_expression = part_expression if method_expression is None else method_expression & part_expression
+        expression = method_expression if expression is None else expression | method_expression
+    return expression
+
+
+@profiled()
+def read_results(store_path, scenarios=None, years=None, methods=None, activities=None, activity_ids=None, columns=None, as_tuples=True):
+    """
+    Read results from the store. Filters are pushed down to the Parquet reader, so that only the
+    partitions and row groups needed are read.
+
+    Parameters:
+    - store_path: Root folder of the store, or the folder of one scenario partition ('.../scenario=<name>').
+    - scenarios: List of scenario names (optional).
+    - years: List of years (optional).
+    - methods: List of method tuples (optional).
+    - activities: List of activity names, or (activity name, location) tuples (optional).
+    - activity_ids: List of activity codes (optional).
+    - columns: List of columns to read (optional, all by default).
+    - as_tuples: Rebuild the 'Method' and (database, code) tuple columns, as in the original DataFrames.
+
+    Returns:
+    - df: A pandas DataFrame with the matching results.
+    """
+    dataset = ds.dataset(store_path, format='parquet', partitioning='hive')
+    names = dataset.schema.names
+
+    filters = []
+    if scenarios is not None and 'scenario' in names:
+        filters.append(ds.field('scenario').isin(list(scenarios)))
+    if years is not None:
+        filters.append(ds.field('year').isin([int(year) for year in years]))
+    if methods is not None:
+        filters.append(_methods_filter(methods))
+    if activities is not None:
+        activity_names = [activity[0] if isinstance(activity, tuple) else activity for activity in activities]
+        activity_column = 'Activity' if 'Activity' in names else 'activity_name'
+        filters.append(ds.field(activity_column).isin(activity_names))
+    if activity_ids is not None:
+        activity_id_column = 'activity_id_code' if 'activity_id_code' in names else 'activity_id'
+        filters.append(ds.field(activity_id_column).isin(list(activity_ids)))
+
+    expression = None
+    for condition in filters:
+        expression = condition if expression is None else expression & condition
+
+    if columns is not None:
+        # Columns needed to rebuild the tuples
+        needed = set(columns)
+        if METHOD_COLUMN in needed:
+            needed.discard(METHOD_COLUMN)
+            needed.update(METHOD_PARTS)
+        for column in ID_COLUMNS:
+            if column in needed and f'{column}_code' in names:
+                needed.discard(column)
+                needed.update([f'{column}_database', f'{column}_code'])
+        columns = [column for column in names if column in needed]
+
+    df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+    if as_tuples:
+        if all(part in df.columns for part in METHOD_PARTS):
+            parts = df[METHOD_PARTS].astype(object).where(df[METHOD_PARTS].notna(), None)
+            df[METHOD_COLUMN] = [tuple(part for part in method if part is not None) for method in parts.itertuples(index=False)]
+        for column in ID_COLUMNS:
+            if f'{column}_code' in df.columns and f'{column}_database' in df.columns:
+                df[column] = list(zip(df[f'{column}_database'].astype(object), df[f'{column}_code'].astype(object)))
+
+    return df
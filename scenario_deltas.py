@@ -0,0 +1,439 @@
+# Import BW25 packages.
+import bw2data as bd
+import bw2calc as bc
+from bw2data.backends import ActivityDataset as AD, ExchangeDataset as ED
+
+import pandas as pd
+import numpy as np
+
+import os
+import json
+import shutil
+
+from scipy import sparse
+
+from lifecycle import database_state_hash, lca_from_matrices, score_lca_methods
+
+
+#######################
+### SCENARIO DELTAS ###
+#######################
+
+# A scenario database (see database_setup.scenario_db_name) is stored as the exchanges that differ from a base
+# database ('ecoinvent 3.8 cutoff'). Activities of the scenario are matched to the base activities by
+# (name, reference product, location), or by code; the others are new activities of the scenario.
+#
+# <delta_path>/<scenario>/
+#   delta.npz        matrix (0: technosphere, 1: biosphere), row, col and value of every changed exchange
+#   activities.csv   new activities of the scenario (position, code, name, reference product, location, unit, id)
+#   removed.npy      positions of the base activities not in the scenario
+#   metadata.json    base database and its state when the delta was computed
+#
+# Positions below the number of base activities are base activities (in the order of their ids), the others are
+# new activities. New activities keep the ids they had in the scenario database. Biosphere rows are the ids of the
+# biosphere flows.
+#
+# Only the matrices and the fields above are kept: exchange uncertainty and other activity fields (comments,
+# classifications, parameters, ...) are lost if the scenario database is deleted.
+
+MATRIX_CODES = {'technosphere': 0, 'biosphere': 1}
+
+# Activity fields kept in a delta
+DELTA_ACTIVITY_FIELDS = {'code', 'name', 'reference product', 'location', 'unit', 'database', 'type'}
+
+# Base matrices already built in this process, keyed by (base database, state)
+_base_matrices = {}
+
+
+def database_matrices(db_name):
+    """
+    Build the technosphere and biosphere matrices of a database (and the databases it depends on).
+
+    Returns:
+    - matrices: A dictionary with the 'technosphere' and 'biosphere' matrices (COO), the
+                'activity_ids' (technosphere rows and columns) and 'biosphere_ids' (biosphere rows) arrays.
+    """
+    node_id = AD.select(AD.id).where(AD.database == db_name).scalar()
+    if node_id is None:
+        raise ValueError(f"Database '{db_name}' is empty or doesn't exist")
+
+    db_names = bd.Database(db_name).find_graph_dependents()
+    lca = bc.LCA({node_id: 1}, data_objs=[bd.Database(name).datapackage() for name in db_names])
+    lca.load_lci_data()
+
+    product_ids = lca.technosphere_mm.row_mapper.array
+    activity_ids = lca.technosphere_mm.col_mapper.array
+    if not np.array_equal(product_ids, activity_ids):
+        raise ValueError(f"Database '{db_name}' has products that are not activities; it can't be delta-encoded")
+
+    return {
+        'technosphere': lca.technosphere_matrix.tocoo(),
+        'biosphere': lca.biosphere_matrix.tocoo(),
+        'activity_ids': activity_ids,
+        'biosphere_ids': lca.biosphere_mm.row_mapper.array
+    }
+
+
+def base_matrices(base_db):
+    """Matrices of the base database (see database_matrices), built once per process and database state."""
+    state = database_state_hash(base_db)
+    if (base_db, state) not in _base_matrices:
+        _base_matrices[base_db, state] = database_matrices(base_db)
+    return _base_matrices[base_db, state], state
+
+
+def activity_table(ids):
+    """Code, name, reference product, location and unit of the given node ids, in the same order."""
+    rows = AD.select(AD.id, AD.code, AD.name, AD.product, AD.location, AD.data).where(AD.id << [int(i) for i in ids]).tuples()
+    df = pd.DataFrame(
+        [(node_id, code, name, product, location, data.get('unit')) for node_id, code, name, product, location, data in rows],
+        columns=['id', 'code', 'name', 'reference product', 'location', 'unit']
+    )
+    return df.set_index('id').loc[list(ids)].reset_index()
+
+
+def match_activities(base_df, scenario_df):
+    """
+    Position of each scenario activity among the base activities, or -1 for new activities.
+    Matched by (name, reference product, location) when unique in both databases, then by code.
+    """
+    signature = ['name', 'reference product', 'location']
+    positions = pd.Series(-1, index=scenario_df.index)
+
+    base_unique = base_df.drop_duplicates(subset=signature, keep=False)
+    scenario_unique = scenario_df.drop_duplicates(subset=signature, keep=False)
+    matched = scenario_unique.reset_index().merge(
+        base_unique[signature].reset_index().rename(columns={'index': 'position'}), on=signature
+    )
+    positions[matched['index'].values] = matched['position'].values
+
+    # Then by code, for the activities left on both sides
+    remaining = positions[positions == -1].index
+    free_codes = base_df[~base_df.index.isin(positions[positions >= 0].values)]
+    code_positions = pd.Series(free_codes.index, index=free_codes['code']).groupby(level=0).first()
+    by_code = scenario_df.loc[remaining, 'code'].map(code_positions)
+    positions[by_code.dropna().index] = by_code.dropna().astype(int).values
+
+    return positions.to_numpy(copy=True)
+
+
+def _matrix_entries(matrix, rows, cols, code):
+    coo = matrix.tocoo()
+    coo.sum_duplicates()
+    return pd.DataFrame({
+        'matrix': np.full(coo.nnz, code, dtype=np.int8),
+        'row': np.asarray(rows)[coo.row].astype(np.int64),
+        'col': np.asarray(cols)[coo.col].astype(np.int64),
+        'value': coo.data.astype(np.float64)
+    })
+
+
+def write_scenario_delta(db_name, delta_path, base_db='ecoinvent 3.8 cutoff'):
+    """
+    Store a scenario database as its differences with the base database.
+
+    Parameters:
+    - db_name: Name of the scenario database.
+    - delta_path: Folder of the scenario deltas.
+    - base_db: Name of the base database.
+
+    Returns:
+    - delta_size: Number of exchanges stored.
+    """
+    base, base_state = base_matrices(base_db)
+    scenario = database_matrices(db_name)
+
+    base_df = activity_table(base['activity_ids'])
+    scenario_df = activity_table(scenario['activity_ids'])
+    positions = match_activities(base_df, scenario_df)
+
+    # New activities get positions after the base activities
+    new = positions == -1
+    positions[new] = len(base_df) + np.arange(new.sum())
+    removed = np.setdiff1d(np.arange(len(base_df)), positions)
+
+    # Exchanges of both databases, in positions
+    base_entries = pd.concat([
+        _matrix_entries(base['technosphere'], np.arange(len(base_df)), np.arange(len(base_df)), MATRIX_CODES['technosphere']),
+        _matrix_entries(base['biosphere'], base['biosphere_ids'], np.arange(len(base_df)), MATRIX_CODES['biosphere'])
+    ], ignore_index=True)
+    scenario_entries = pd.concat([
+        _matrix_entries(scenario['technosphere'], positions, positions, MATRIX_CODES['technosphere']),
+        _matrix_entries(scenario['biosphere'], scenario['biosphere_ids'], positions, MATRIX_CODES['biosphere'])
+    ], ignore_index=True)
+
+    # Exchanges of removed activities go with them
+    is_technosphere = base_entries['matrix'] == MATRIX_CODES['technosphere']
+    base_entries = base_entries[
+        ~base_entries['col'].isin(removed) & ~(is_technosphere & base_entries['row'].isin(removed))
+    ]
+
+    entries = base_entries.merge(scenario_entries, on=['matrix', 'row', 'col'], how='outer', suffixes=('_base', ''))
+    entries['value'] = entries['value'].fillna(0)  # Exchanges removed in the scenario
+    delta = entries[entries['value'] != entries['value_base'].fillna(0)]
+
+    scenario_dir = os.path.join(delta_path, db_name)
+    if os.path.isdir(scenario_dir):
+        shutil.rmtree(scenario_dir)
+    os.makedirs(scenario_dir)
+
+    np.savez_compressed(
+        os.path.join(scenario_dir, 'delta.npz'),
+        matrix=delta['matrix'].values.astype(np.int8),
+        row=delta['row'].values.astype(np.int64),
+        col=delta['col'].values.astype(np.int64),
+        value=delta['value'].values.astype(np.float64)
+    )
+    # New activities keep their ids, so that they are the same every time the scenario is rebuilt
+    new_df = scenario_df[new].assign(position=positions[new])
+    new_df[['position', 'code', 'name', 'reference product', 'location', 'unit', 'id']].to_csv(
+        os.path.join(scenario_dir, 'activities.csv'), index=False
+    )
+    np.save(os.path.join(scenario_dir, 'removed.npy'), removed)
+    with open(os.path.join(scenario_dir, 'metadata.json'), 'w') as f:
+        json.dump({'base_db': base_db, 'base_state': base_state}, f)
+
+    print(f"Saved delta of '{db_name}': {len(delta)} exchanges, {new.sum()} new and {len(removed)} removed activities")
+    return len(delta)
+
+
+def convert_scenario_databases(db_names, delta_path, base_db='ecoinvent 3.8 cutoff', delete_databases=False, discard_metadata=False):
+    """
+    Convert existing scenario databases into deltas against the base database.
+
+    Parameters:
+    - db_names: Names of the scenario databases.
+    - delta_path: Folder of the scenario deltas.
+    - base_db: Name of the base database.
+    - delete_databases: Delete each database once its delta is written and checked.
+    - discard_metadata: Also delete databases with data the delta doesn't keep (exchange uncertainty, activity fields
+                        other than DELTA_ACTIVITY_FIELDS). Such databases are kept by default: Monte Carlo runs with
+                        exchange uncertainty, or modifications of their activities, need the database.
+    """
+    for db_name in db_names:
+        write_scenario_delta(db_name, delta_path, base_db=base_db)
+
+        if delete_databases:
+            # Only delete a database that can be rebuilt exactly from its delta
+            original = database_matrices(db_name)
+            technosphere, biosphere, activity_ids, biosphere_ids = scenario_matrices(db_name, delta_path)
+            if not _same_matrices(original, technosphere, biosphere, activity_ids, biosphere_ids, db_name, delta_path):
+                print(f"Delta of '{db_name}' doesn't reproduce the database; the database is kept")
+                continue
+
+            extra_fields, uncertain_exchanges = data_lost_by_delta(db_name)
+            if (extra_fields or uncertain_exchanges) and not discard_metadata:
+                print(
+                    f"Delta of '{db_name}' doesn't keep {uncertain_exchanges} uncertain exchanges and the activity fields "
+                    f"{extra_fields}; the database is kept (use discard_metadata=True to delete it anyway)"
+                )
+                continue
+
+            del bd.databases[db_name]
+            print(f"Deleted database '{db_name}'")
+
+
+def data_lost_by_delta(db_name):
+    """
+    Data of a database that its delta doesn't keep.
+
+    Returns:
+    - extra_fields: Sorted list of the activity fields not in DELTA_ACTIVITY_FIELDS.
+    - uncertain_exchanges: Number of exchanges with an uncertainty distribution (uncertainty type above 1).
+    """
+    fields = set()
+    for (data,) in AD.select(AD.data).where(AD.database == db_name).tuples():
+        fields.update(data)
+
+    uncertain_exchanges = 0
+    for (data,) in ED.select(ED.data).where(ED.output_database == db_name).tuples():
+        if (data.get('uncertainty type') or 0) > 1:
+            uncertain_exchanges += 1
+
+    return sorted(fields - DELTA_ACTIVITY_FIELDS), uncertain_exchanges
+
+
+def _same_matrices(original, technosphere, biosphere, activity_ids, biosphere_ids, db_name, delta_path):
+    """Compare the matrices of a database with the matrices rebuilt from its delta."""
+    base_db = read_delta_metadata(db_name, delta_path)['base_db']
+    base, _ = base_matrices(base_db)
+
+    # Order the original activities as the rebuilt ones
+    original_ids = scenario_activity_ids(original['activity_ids'], base['activity_ids'], base_db, db_name, delta_path)
+    if len(original_ids) != len(activity_ids) or len(np.unique(original_ids)) != len(original_ids):
+        return False
+    order = pd.Series(np.arange(len(original_ids)), index=original_ids).reindex(activity_ids)
+    if order.isna().any():
+        return False
+    order = order.to_numpy(dtype=np.int64)
+
+    original_technosphere = original['technosphere'].tocsr()[order][:, order]
+    original_biosphere = original['biosphere'].tocsr()[:, order]
+    original_biosphere = _reindex_rows(original_biosphere, original['biosphere_ids'], biosphere_ids)
+    if original_biosphere is None:
+        return False
+
+    return (abs(original_technosphere - technosphere).max() == 0) and (abs(original_biosphere - biosphere).max() == 0)
+
+
+def _reindex_rows(matrix, ids, new_ids):
+    """Move the rows of a matrix from `ids` to `new_ids` (None if an id with values is missing)."""
+    coo = matrix.tocoo()
+    positions = np.searchsorted(new_ids, np.asarray(ids)[coo.row])
+    if (positions >= len(new_ids)).any() or not np.array_equal(np.asarray(new_ids)[positions], np.asarray(ids)[coo.row]):
+        return None
+    return sparse.csr_matrix((coo.data, (positions, coo.col)), shape=(len(new_ids), matrix.shape[1]))
+
+
+def read_delta_metadata(db_name, delta_path):
+    with open(os.path.join(delta_path, db_name, 'metadata.json')) as f:
+        return json.load(f)
+
+
+def scenario_activities(db_name, delta_path):
+    """
+    Activities of a delta-encoded scenario.
+
+    Returns:
+    - df: A DataFrame with the id, code, name, reference product, location and unit of every activity.
+          Base activities keep the ids of the base database, new activities the ids they had in the scenario database.
+    """
+    base_db = read_delta_metadata(db_name, delta_path)['base_db']
+    base, _ = base_matrices(base_db)
+    scenario_dir = os.path.join(delta_path, db_name)
+
+    removed = np.load(os.path.join(scenario_dir, 'removed.npy'))
+    base_df = activity_table(base['activity_ids'])
+    base_df = base_df.drop(index=removed)
+
+    new_df = read_delta_activities(db_name, delta_path)
+
+    return pd.concat([base_df, new_df.drop(columns=['position'])], ignore_index=True)
+
+
+def read_delta_activities(db_name, delta_path):
+    """New activities of a delta-encoded scenario (see write_scenario_delta), in the order of their positions."""
+    new_df = pd.read_csv(os.path.join(delta_path, db_name, 'activities.csv'), dtype={'code': str})
+    if 'id' not in new_df.columns:
+        raise ValueError(f"The delta of '{db_name}' was written without activity ids; convert the scenario database again")
+    return new_df.sort_values('position').reset_index(drop=True)
+
+
+def scenario_activity_ids(activity_ids, base_activity_ids, base_db, db_name, delta_path):
+    """Ids (as in scenario_activities) of the activities of a scenario database, in the order of `activity_ids`."""
+    base_df = activity_table(base_activity_ids)
+    scenario_df = activity_table(activity_ids)
+    positions = match_activities(base_df, scenario_df)
+
+    new_df = read_delta_activities(db_name, delta_path)
+    new_ids = dict(zip(new_df['code'], new_df['id']))
+
+    ids = np.where(positions >= 0, np.asarray(base_activity_ids)[np.maximum(positions, 0)], -1)
+    for i in np.flatnonzero(positions < 0):
+        ids[i] = new_ids[scenario_df.loc[i, 'code']]
+    return ids
+
+
+def scenario_matrices(db_name, delta_path):
+    """
+    Rebuild the technosphere and biosphere matrices of a delta-encoded scenario from the base matrices.
+
+    Returns:
+    - technosphere, biosphere: The matrices (CSR), rows and columns in the order of the ids below.
+    - activity_ids: Ids of the activities (see scenario_activities): base activities in the order of their ids, then new activities.
+    - biosphere_ids: Sorted ids of the biosphere flows.
+    """
+    metadata = read_delta_metadata(db_name, delta_path)
+    base, base_state = base_matrices(metadata['base_db'])
+    if base_state != metadata['base_state']:
+        raise ValueError(
+            f"The delta of '{db_name}' was computed against another state of '{metadata['base_db']}'; "
+            "convert the scenario database again"
+        )
+
+    scenario_dir = os.path.join(delta_path, db_name)
+    delta = np.load(os.path.join(scenario_dir, 'delta.npz'))
+    removed = np.load(os.path.join(scenario_dir, 'removed.npy'))
+    new_ids = read_delta_activities(db_name, delta_path)['id'].to_numpy(dtype=np.int64)
+    new_count = len(new_ids)
+
+    base_count = len(base['activity_ids'])
+    size = base_count + new_count
+
+    # Compact positions, without the removed activities
+    kept = np.ones(size, dtype=bool)
+    kept[removed] = False
+    compact = np.cumsum(kept) - 1
+    activity_ids = np.concatenate([np.asarray(base['activity_ids'])[kept[:base_count]], new_ids])
+
+    # Biosphere rows: flows of the base and of the delta
+    delta_biosphere = delta['matrix'] == MATRIX_CODES['biosphere']
+    biosphere_ids = np.union1d(base['biosphere_ids'], delta['row'][delta_biosphere])
+
+    matrices = {}
+    for name, code in MATRIX_CODES.items():
+        base_matrix = base[name]
+        rows = base_matrix.row if name == 'technosphere' else np.asarray(base['biosphere_ids'])[base_matrix.row]
+        cols, values = base_matrix.col, base_matrix.data
+
+        in_delta = delta['matrix'] == code
+        delta_rows, delta_cols, delta_values = delta['row'][in_delta], delta['col'][in_delta], delta['value'][in_delta]
+
+        # Base exchanges not replaced by the delta, and not of removed activities
+        n_cols = size
+        base_linear = rows.astype(np.int64) * n_cols + cols
+        delta_linear = delta_rows * n_cols + delta_cols
+        keep = ~np.isin(base_linear, delta_linear) & kept[cols]
+        if name == 'technosphere':
+            keep &= kept[rows]
+
+        rows = np.concatenate([rows[keep], delta_rows[delta_values != 0]])
+        cols = np.concatenate([cols[keep], delta_cols[delta_values != 0]])
+        values = np.concatenate([values[keep], delta_values[delta_values != 0]])
+
+        if name == 'technosphere':
+            rows, shape = compact[rows], (kept.sum(), kept.sum())
+        else:
+            rows, shape = np.searchsorted(biosphere_ids, rows), (len(biosphere_ids), kept.sum())
+        matrices[name] = sparse.csr_matrix((values, (rows, compact[cols])), shape=shape)
+
+    return matrices['technosphere'], matrices['biosphere'], activity_ids, biosphere_ids
+
+
+def build_scenario_lca(db_name, delta_path, activity_id, method):
+    """
+    Build an LCA object of a delta-encoded scenario, for one unit of an activity.
+
+    Parameters:
+    - db_name: Name of the scenario.
+    - delta_path: Folder of the scenario deltas.
+    - activity_id: Id of the activity (see scenario_activities).
+    - method: The LCIA method the LCA object is initialised with.
+
+    Returns:
+    - lca: An LCA object with the inventory calculated.
+    """
+    technosphere, biosphere, activity_ids, biosphere_ids = scenario_matrices(db_name, delta_path)
+    lca = lca_from_matrices({int(activity_id): 1}, method, technosphere, biosphere, activity_ids, activity_ids, biosphere_ids)
+    lca.lci()
+    return lca
+
+
+def run_scenario_lcia(db_name, delta_path, activity_name, reference_product, location, methods_list):
+    """
+    LCIA scores of an activity of a delta-encoded scenario (as run_comprehensive_lcia).
+
+    Returns:
+    - lca_results: A dictionary with methods as keys and their corresponding LCIA scores as values.
+    """
+    activities = scenario_activities(db_name, delta_path)
+    found = activities[
+        (activities['name'] == activity_name)
+        & (activities['location'] == location)
+        & ((activities['reference product'] == reference_product) if reference_product else True)
+    ]
+    if found.empty:
+        raise ValueError(f"Activity '{activity_name}' ({location}) not found in scenario '{db_name}'")
+
+    lca = build_scenario_lca(db_name, delta_path, found['id'].iloc[0], methods_list[0])
+    return score_lca_methods(lca, methods_list)
@@ -0,0 +1,218 @@
+# Import BW25 packages.
+import bw2data as bd
+
+import pandas as pd
+import numpy as np
+
+import os
+
+from scipy import sparse
+
+from lifecycle import lca_from_matrices, score_lca_methods
+from scenario_deltas import database_matrices, activity_table, match_activities
+from scenario_deltas import scenario_matrices, scenario_activities
+
+
+##########################
+### YEAR INTERPOLATION ###
+##########################
+
+# The matrices of an intermediate year are interpolated linearly between the matrices of the two neighbouring
+# scenario databases (e.g. 2025 and 2030 of the same pathway). Activities of both databases are matched as for
+# the scenario deltas (by name, reference product and location, then by code). Exchanges of matched activities
+# are interpolated, exchanges missing in one database counting as zero. Activities of only one database keep
+# their own exchanges, and only their use by the matched activities is interpolated.
+
+
+def load_scenario_matrices(db_name, delta_path=None):
+    """
+    Matrices and activities of a scenario database, from the project or from its delta (see scenario_deltas).
+
+    Parameters:
+    - db_name: Name of the scenario database.
+    - delta_path: Folder of the scenario deltas (optional), used if the database is not in the project.
+
+    Returns:
+    - matrices: A dictionary with the 'technosphere' and 'biosphere' matrices (CSR), the 'activity_ids' and
+                'biosphere_ids' of their rows and columns, and the 'activities' DataFrame (same order as 'activity_ids').
+    """
+    if db_name in bd.databases:
+        matrices = database_matrices(db_name)
+        return {
+            'technosphere': matrices['technosphere'].tocsr(),
+            'biosphere': matrices['biosphere'].tocsr(),
+            'activity_ids': np.asarray(matrices['activity_ids']),
+            'biosphere_ids': np.asarray(matrices['biosphere_ids']),
+            'activities': activity_table(matrices['activity_ids'])
+        }
+
+    if delta_path is not None and os.path.isdir(os.path.join(delta_path, db_name)):
+        technosphere, biosphere, activity_ids, biosphere_ids = scenario_matrices(db_name, delta_path)
+        return {
+            'technosphere': technosphere,
+            'biosphere': biosphere,
+            'activity_ids': np.asarray(activity_ids),
+            'biosphere_ids': np.asarray(biosphere_ids),
+            'activities': scenario_activities(db_name, delta_path)
+        }
+
+    raise ValueError(f"Database '{db_name}' not found in the current project or in the scenario deltas.")
+
+
+def _expand(matrix, rows, cols, shape):
+    """Move the entries of a matrix to new row and column positions, in a matrix of the given shape."""
+    coo = matrix.tocoo()
+    return sparse.csr_matrix((coo.data, (rows[coo.row], cols[coo.col])), shape=shape)
+
+
+def align_scenario_matrices(start, end):
+    """
+    Put the matrices of two scenario databases (see load_scenario_matrices) on the same rows and columns.
+    Activities of the start database keep their ids; activities only in the end database get ids above the ids of both.
+
+    Returns:
+    - aligned: A dictionary with the aligned 'start_technosphere', 'end_technosphere', 'start_biosphere' and 'end_biosphere'
+               matrices, the 'matched' activities (boolean array), the 'activity_ids', 'biosphere_ids' and 'activities'.
+    """
+    positions = match_activities(start['activities'], end['activities'])
+    new = positions == -1
+    start_count = len(start['activity_ids'])
+    size = start_count + new.sum()
+
+    positions[new] = start_count + np.arange(new.sum())
+    matched = np.zeros(size, dtype=bool)
+    matched[positions[~new]] = True
+
+    first_id = max(start['activity_ids'].max(), end['activity_ids'].max()) + 1
+    activity_ids = np.concatenate([start['activity_ids'], np.arange(first_id, first_id + new.sum(), dtype=np.int64)])
+    activities = pd.concat([
+        start['activities'].assign(id=start['activity_ids']),
+        end['activities'][new].assign(id=activity_ids[start_count:])
+    ], ignore_index=True)
+
+    biosphere_ids = np.union1d(start['biosphere_ids'], end['biosphere_ids'])
+    start_flows = np.searchsorted(biosphere_ids, start['biosphere_ids'])
+    end_flows = np.searchsorted(biosphere_ids, end['biosphere_ids'])
+    start_positions = np.arange(start_count)
+
+    return {
+        'start_technosphere': _expand(start['technosphere'], start_positions, start_positions, (size, size)),
+        'end_technosphere': _expand(end['technosphere'], positions, positions, (size, size)),
+        'start_biosphere': _expand(start['biosphere'], start_flows, start_positions, (len(biosphere_ids), size)),
+        'end_biosphere': _expand(end['biosphere'], end_flows, positions, (len(biosphere_ids), size)),
+        'matched': matched,
+        'activity_ids': activity_ids,
+        'biosphere_ids': biosphere_ids,
+        'activities': activities
+    }
+
+
+def interpolate_matrices(aligned, weight):
+    """
+    Technosphere and biosphere matrices between two aligned scenario databases (see align_scenario_matrices).
+
+    Parameters:
+    - aligned: The aligned matrices.
+    - weight: Position between the start (0) and end (1) databases.
+
+    Returns:
+    - technosphere, biosphere: The interpolated matrices (CSR).
+    """
+    matched = aligned['matched']
+    start_weights = sparse.diags(np.where(matched, 1 - weight, 1.0))
+    end_weights = sparse.diags(np.where(matched, weight, 1.0))
+
+    technosphere = aligned['start_technosphere'] @ start_weights + aligned['end_technosphere'] @ end_weights
+    biosphere = aligned['start_biosphere'] @ start_weights + aligned['end_biosphere'] @ end_weights
+    return technosphere.tocsr(), biosphere.tocsr()
+
+
+def find_interpolated_activity(activities, activity_name, reference_product, location):
+    """Id of an activity among the activities of aligned scenario databases."""
+    found = activities[
+        (activities['name'] == activity_name)
+        & (activities['location'] == location)
+        & ((activities['reference product'] == reference_product) if reference_product else True)
+    ]
+    if found.empty:
+        raise ValueError(f"Activity '{activity_name}' ({location}) not found in the scenario databases")
+    return int(found['id'].iloc[0])
+
+
+def interpolate_lcia_trajectory(project_name, databases, years, activity_name, reference_product, location, methods_list, target_years=None, delta_path=None):
+    """
+    LCIA scores of an activity for any year between the years of the scenario databases, from matrices interpolated
+    between the two neighbouring databases, without writing the intermediate databases.
+
+    Args:
+        project_name (str): Name of the Brightway2 project.
+        databases (list): Scenario databases of one pathway (in the project, or delta-encoded in `delta_path`).
+        years (list): Years of the databases, one per database.
+        activity_name (str): Name of the activity.
+        reference_product (str): Reference product of the activity.
+        location (str): Location of the activity.
+        methods_list (list): List of LCIA methods to be used.
+        target_years (list): Years to calculate (optional, every year from the first to the last database by default).
+        delta_path (str): Folder of the scenario deltas (optional).
+
+    Returns:
+        pd.DataFrame: One row per (year, method), with the 'Start Database' and 'End Database' interpolated,
+                      the 'Weight' of the end database and the 'Score'.
+    """
+    assert len(databases) == len(years), "Databases and years lists must be of the same length."
+
+    if bd.projects.current != project_name:
+        bd.projects.set_current(project_name)
+
+    order = np.argsort(years)
+    databases = [databases[i] for i in order]
+    years = [years[i] for i in order]
+    if target_years is None:
+        target_years = range(years[0], years[-1] + 1)
+
+    # Each pair of neighbouring databases is loaded and aligned once, for all the years between them
+    pairs = {}
+    for year in target_years:
+        if year < years[0] or year > years[-1]:
+            print(f"Year {year} is outside of the years of the databases ({years[0]}-{years[-1]}). Skipping.")
+            continue
+        pair = min(np.searchsorted(years, year, side='right') - 1, len(years) - 2) if len(years) > 1 else 0
+        pairs.setdefault(pair, []).append(year)
+
+    loaded = {}
+    rows = []
+    for pair, pair_years in sorted(pairs.items()):
+        start_db = databases[pair]
+        end_db = databases[min(pair + 1, len(databases) - 1)]
+        for db_name in (start_db, end_db):
+            if db_name not in loaded:
+                loaded[db_name] = load_scenario_matrices(db_name, delta_path)
+
+        aligned = align_scenario_matrices(loaded[start_db], loaded[end_db])
+        activity_id = find_interpolated_activity(aligned['activities'], activity_name, reference_product, location)
+
+        for year in pair_years:
+            span = years[min(pair + 1, len(years) - 1)] - years[pair]
+            weight = (year - years[pair]) / span if span else 0.0
+            technosphere, biosphere = interpolate_matrices(aligned, weight)
+
+            lca = lca_from_matrices(
+                {activity_id: 1}, methods_list[0], technosphere, biosphere,
+                aligned['activity_ids'], aligned['activity_ids'], aligned['biosphere_ids']
+            )
+            lca.lci()
+            scores = score_lca_methods(lca, methods_list)
+
+            print(f"{activity_name} ({location}), {year}: {weight:.2f} between '{start_db}' and '{end_db}'")
+            for method in methods_list:
+                rows.append({
+                    'Start Database': start_db,
+                    'End Database': end_db,
+                    'Year': year,
+                    'Weight': weight,
+                    'Activity': activity_name,
+                    'Method': method,
+                    'Score': scores[method]
+                })
+
+    return pd.DataFrame(rows)
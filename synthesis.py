@@ -1,9 +1,24 @@
+import os
 import pandas as pd
 
+from results_store import read_results
+
 def load_csv(file_path):
     """Load CSV file into a DataFrame."""
     return pd.read_csv(file_path)
 
+def load_results(path, activities=None, methods=None):
+    """
+    Load results from a results store folder (e.g. 'store/scenario=remindSSP1_baseline') or a CSV file.
+    From the store, only the rows of the given activities and methods are read.
+    """
+    if os.path.isdir(path):
+        return read_results(path, activities=activities, methods=methods)
+    df = load_csv(path)
+    if methods is not None:
+        df = df[df['Method'].isin([str(method) for method in methods])]
+    return df
+
 def filter_activities(df, activities):
     """Filter DataFrame for the specified activities."""
     return df[df['Activity'].isin([act[0] for act in activities])]
@@ -12,76 +27,119 @@ def extract_year_data(df, year, score_column):
     """Extract data for a specific year and assign the correct score column."""
     return df[df['Year'] == year][['Activity', 'Method', score_column]]
 
-def compute_changes(baseline_df, vsi_df, activities):
+def first_scores(df, year, score_column, keys):
+    """Scores of one year, keeping the first row of each (keys) combination."""
+    year_df = df[df['Year'] == year][keys + [score_column]]
+    return year_df.drop_duplicates(subset=keys, keep='first')
+
+def compute_changes(baseline_df, vsi_df, activities, start_year=2025, end_year=2040, by=None):
     """
     Compare impact changes between first and last year for each activity and category.
-    
+    All activities, methods (and scenarios, see `by`) are computed at once with merges.
 
-    [Note BM: Need to significantly improve this]
     - Baseline uses 'Score Before'
     - VSI uses 'Score After'
+    - activities: list of (activity, location) tuples, or a DataFrame with 'Activity' and 'Location' columns
+      (and any other column to carry, e.g. 'Activity Group').
+    - by: extra key columns present in both frames (e.g. ['SSP']) to compare several scenarios in one call.
     
     Returns a summary DataFrame.
     """
-    results = []
-
-    for activity, location in activities:
-        # Extract Baseline data
-        baseline_2025 = extract_year_data(baseline_df[baseline_df['Activity'] == activity], 2025, 'Score Before')
-        baseline_2040 = extract_year_data(baseline_df[baseline_df['Activity'] == activity], 2040, 'Score Before')
-
-        # Extract VSI data
-        vsi_2025 = extract_year_data(vsi_df[vsi_df['Activity'] == activity], 2025, 'Score After')
-        vsi_2040 = extract_year_data(vsi_df[vsi_df['Activity'] == activity], 2040, 'Score After')
-
-        for method in baseline_2025['Method'].unique():
-            base_2025 = baseline_2025[baseline_2025['Method'] == method]['Score Before'].values
-            base_2040 = baseline_2040[baseline_2040['Method'] == method]['Score Before'].values
-            vsi_2025_val = vsi_2025[vsi_2025['Method'] == method]['Score After'].values
-            vsi_2040_val = vsi_2040[vsi_2040['Method'] == method]['Score After'].values
-
-            if len(base_2025) > 0 and len(base_2040) > 0:
-                base_change = base_2040[0] - base_2025[0]
-                base_pct_change = (base_change / base_2025[0]) * 100 if base_2025[0] != 0 else 0
-            else:
-                base_change, base_pct_change = None, None
-
-            if len(vsi_2025_val) > 0 and len(vsi_2040_val) > 0:
-                vsi_change = vsi_2040_val[0] - vsi_2025_val[0]
-                vsi_pct_change = (vsi_change / vsi_2025_val[0]) * 100 if vsi_2025_val[0] != 0 else 0
-            else:
-                vsi_change, vsi_pct_change = None, None
-
-            if len(base_2040) > 0 and len(vsi_2040_val) > 0:
-                vsi_to_baseline_change = vsi_2040_val[0] - base_2040[0]
-                vsi_to_baseline_pct_change = (vsi_pct_change - base_pct_change)
-
-            results.append({
-                "Activity": activity,
-                "Location": location,
-                "Impact Category": method,
-                "Baseline 2025": base_2025[0] if len(base_2025) > 0 else None,
-                "Baseline 2040": base_2040[0] if len(base_2040) > 0 else None,
-                "Baseline Change": base_change,
-                "Baseline % Change": base_pct_change,
-                "VSI 2025": vsi_2025_val[0] if len(vsi_2025_val) > 0 else None,
-                "VSI 2040": vsi_2040_val[0] if len(vsi_2040_val) > 0 else None,
-                "VSI Change": vsi_change,
-                "VSI % Change": vsi_pct_change,
-                "VSI to baseline change": vsi_to_baseline_change,
-                "VSI to baseline change %": vsi_to_baseline_pct_change
-            })
-
-    return pd.DataFrame(results)
-
-def analyze_impacts(baseline_file, vsi_file, activities):
-    """Main function to load data, filter activities, and compute changes."""
-    baseline_df = load_csv(baseline_file)
-    vsi_df = load_csv(vsi_file)
+    by = list(by or [])
+    keys = by + ['Activity', 'Method']
+
+    if isinstance(activities, pd.DataFrame):
+        activities_df = activities.reset_index(drop=True)
+    else:
+        activities_df = pd.DataFrame(list(activities), columns=['Activity', 'Location'])
+
+    # One row per (scenario,) activity and method found in the baseline for the first year
+    summary = first_scores(baseline_df, start_year, 'Score Before', keys).rename(columns={'Score Before': 'base_start'})
+    for df, year, score_column, name in [
+        (baseline_df, end_year, 'Score Before', 'base_end'),
+        (vsi_df, start_year, 'Score After', 'vsi_start'),
+        (vsi_df, end_year, 'Score After', 'vsi_end'),
+    ]:
+        year_scores = first_scores(df, year, score_column, keys).rename(columns={score_column: name})
+        summary = summary.merge(year_scores, on=keys, how='left')
+
+    summary = activities_df.merge(summary, on='Activity', how='inner')
+
+    def change(start, end):
+        difference = summary[end] - summary[start]
+        pct_change = (difference / summary[start] * 100).where(summary[start] != 0, 0).where(difference.notna())
+        return difference, pct_change
+
+    base_change, base_pct_change = change('base_start', 'base_end')
+    vsi_change, vsi_pct_change = change('vsi_start', 'vsi_end')
+
+    # Columns carried from the activities (e.g. 'Activity Group') and scenario columns go last
+    extra_columns = [column for column in activities_df.columns if column not in ('Activity', 'Location')] + by
+
+    results = summary[['Activity', 'Location']].copy()
+    results['Impact Category'] = summary['Method']
+    results[f'Baseline {start_year}'] = summary['base_start']
+    results[f'Baseline {end_year}'] = summary['base_end']
+    results['Baseline Change'] = base_change
+    results['Baseline % Change'] = base_pct_change
+    results[f'VSI {start_year}'] = summary['vsi_start']
+    results[f'VSI {end_year}'] = summary['vsi_end']
+    results['VSI Change'] = vsi_change
+    results['VSI % Change'] = vsi_pct_change
+    results['VSI to baseline change'] = summary['vsi_end'] - summary['base_end']
+    results['VSI to baseline change %'] = vsi_pct_change - base_pct_change
+    for column in extra_columns:
+        results[column] = summary[column]
+
+    return results
+
+def analyze_impacts(baseline_file, vsi_file, activities, start_year=2025, end_year=2040, methods=None):
+    """Main function to load data, filter activities (and methods, optional), and compute changes."""
+    baseline_df = load_results(baseline_file, activities=activities, methods=methods)
+    vsi_df = load_results(vsi_file, activities=activities, methods=methods)
 
     baseline_df = filter_activities(baseline_df, activities)
     vsi_df = filter_activities(vsi_df, activities)
 
-    results_df = compute_changes(baseline_df, vsi_df, activities)
+    results_df = compute_changes(baseline_df, vsi_df, activities, start_year=start_year, end_year=end_year)
 
     return results_df
+
+def analyze_scenarios(scenario_files, activity_groups, start_year=2025, end_year=2040):
+    """
+    Compute the changes of all scenarios and activity groups in one call.
+    Each file (or results store folder) is loaded once.
+
+    - scenario_files: dictionary {scenario (e.g. 'SSP1'): (baseline_file, vsi_file)}
+    - activity_groups: dictionary {group name: list of (activity, location) tuples}, or a single list
+
+    Returns a summary DataFrame with 'SSP' (and 'Activity Group') columns.
+    """
+    if isinstance(activity_groups, dict):
+        activities_df = pd.concat(
+            [pd.DataFrame(list(activities), columns=['Activity', 'Location']).assign(**{'Activity Group': group})
+             for group, activities in activity_groups.items()],
+            ignore_index=True
+        )
+    else:
+        activities_df = pd.DataFrame(list(activity_groups), columns=['Activity', 'Location'])
+
+    activity_names = activities_df['Activity'].unique()
+
+    baseline_dfs, vsi_dfs = [], []
+    for scenario, (baseline_file, vsi_file) in scenario_files.items():
+        baseline_dfs.append(load_results(baseline_file, activities=list(activity_names)).assign(SSP=scenario))
+        vsi_dfs.append(load_results(vsi_file, activities=list(activity_names)).assign(SSP=scenario))
+
+    baseline_df = pd.concat(baseline_dfs, ignore_index=True)
+    vsi_df = pd.concat(vsi_dfs, ignore_index=True)
+    baseline_df = baseline_df[baseline_df['Activity'].isin(activity_names)]
+    vsi_df = vsi_df[vsi_df['Activity'].isin(activity_names)]
+
+    results_df = compute_changes(baseline_df, vsi_df, activities_df, start_year=start_year, end_year=end_year, by=['SSP'])
+
+    # Same order as looping over the scenarios first
+    order = {scenario: position for position, scenario in enumerate(scenario_files)}
+    results_df = results_df.sort_values('SSP', key=lambda column: column.map(order), kind='stable')
+
+    return results_df.reset_index(drop=True)
@@ -0,0 +1,89 @@
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The modules live at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Brightway projects of the tests are kept apart from the user's projects
+os.environ['BRIGHTWAY_DIR'] = tempfile.mkdtemp(prefix='vsi-tests-')
+
+TEST_METHODS = [('test', 'climate change'), ('test', 'ecotoxicity')]
+
+
+@pytest.fixture
+def coefficient_csv(tmp_path):
+    """Coefficient CSV of one activity, with a missing 2030 coefficient for the first exchange."""
+    csv_file = tmp_path / 'activity.csv'
+    pd.DataFrame({
+        'activity_name': ['nickel mine operation'] * 2,
+        'activity_location': ['GLO'] * 2,
+        'VSI_modify': [True, True],
+        'sub_activity': ['Carbon dioxide, fossil', 'Nickel'],
+        'coeff_2025': [0.9, 0.8],
+        'coeff_2030': [np.nan, 0.7],
+        'coeff_2040': [0.5, 0.4]
+    }).to_csv(csv_file, index=False)
+    return csv_file
+
+
+@pytest.fixture(scope='session')
+def test_database():
+    """
+    Small database in a project of its own: electricity, a nickel mine whose tailings go to a waste treatment
+    (negative production amount), and the refining of the mine's concentrate. Returns the database name.
+    """
+    import bw2data as bd
+
+    bd.projects.set_current('vsi-tests')
+    bd.Database('test biosphere').write({
+        ('test biosphere', 'co2'): {'name': 'Carbon dioxide, fossil', 'unit': 'kg', 'categories': ('air',), 'type': 'emission'},
+        ('test biosphere', 'ch4'): {'name': 'Methane, fossil', 'unit': 'kg', 'categories': ('air',), 'type': 'emission'},
+        ('test biosphere', 'ni'): {'name': 'Nickel', 'unit': 'kg', 'categories': ('water',), 'type': 'emission'},
+    })
+
+    db_name = 'test db'
+    bd.Database(db_name).write({
+        (db_name, 'elec'): {
+            'name': 'electricity production', 'reference product': 'electricity', 'location': 'CN', 'unit': 'kWh',
+            'exchanges': [
+                {'input': (db_name, 'elec'), 'amount': 1, 'type': 'production'},
+                {'input': ('test biosphere', 'co2'), 'amount': 0.9, 'type': 'biosphere'},
+                {'input': ('test biosphere', 'ch4'), 'amount': 0.002, 'type': 'biosphere'},
+            ]},
+        (db_name, 'tailings'): {
+            'name': 'treatment of tailings', 'reference product': 'tailings', 'location': 'GLO', 'unit': 'kg',
+            'exchanges': [
+                {'input': (db_name, 'tailings'), 'amount': -1, 'type': 'production'},
+                {'input': (db_name, 'elec'), 'amount': 0.1, 'type': 'technosphere'},
+                {'input': ('test biosphere', 'ch4'), 'amount': 0.02, 'type': 'biosphere'},
+                {'input': ('test biosphere', 'ni'), 'amount': 0.001, 'type': 'biosphere'},
+            ]},
+        (db_name, 'mine'): {
+            'name': 'nickel mine operation', 'reference product': 'nickel concentrate', 'location': 'GLO', 'unit': 'kg',
+            'exchanges': [
+                {'input': (db_name, 'mine'), 'amount': 1, 'type': 'production'},
+                {'input': (db_name, 'elec'), 'amount': 2, 'type': 'technosphere'},
+                {'input': (db_name, 'tailings'), 'amount': -0.5, 'type': 'technosphere'},
+                {'input': ('test biosphere', 'co2'), 'amount': 0.5, 'type': 'biosphere'},
+                {'input': ('test biosphere', 'ni'), 'amount': 0.01, 'type': 'biosphere'},
+            ]},
+        (db_name, 'refining'): {
+            'name': 'smelting and refining of nickel concentrate', 'reference product': 'nickel, class 1', 'location': 'GLO', 'unit': 'kg',
+            'exchanges': [
+                {'input': (db_name, 'refining'), 'amount': 1, 'type': 'production'},
+                {'input': (db_name, 'mine'), 'amount': 3, 'type': 'technosphere'},
+                {'input': (db_name, 'elec'), 'amount': 5, 'type': 'technosphere'},
+                {'input': ('test biosphere', 'co2'), 'amount': 1.2, 'type': 'biosphere'},
+                {'input': ('test biosphere', 'ch4'), 'amount': 0.01, 'type': 'biosphere'},
+            ]},
+    })
+
+    bd.Method(TEST_METHODS[0]).write([(('test biosphere', 'co2'), 1.0), (('test biosphere', 'ch4'), 28.0)])
+    bd.Method(TEST_METHODS[1]).write([(('test biosphere', 'ni'), 100.0), (('test biosphere', 'ch4'), 0.5)])
+
+    return db_name
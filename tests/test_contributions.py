@@ -0,0 +1,27 @@
+import bw2data as bd
+import numpy as np
+
+from conftest import TEST_METHODS
+from lifecycle import build_database_lca, find_most_impactful_exchanges
+
+
+def test_most_impactful_exchanges(test_database):
+    lca = build_database_lca(bd.get_node(database=test_database, code='refining'), TEST_METHODS[0])
+    lca.lcia()
+    largest = np.abs(lca.characterized_inventory.data).max()
+
+    # Default: individual entries of the characterized inventory, by biosphere flow
+    top = find_most_impactful_exchanges(lca, top_n=3)
+    assert [len(entry) for entry in top] == [3, 3, 3]
+    assert np.isclose(abs(top[0][0]), largest)
+    assert [abs(entry[0]) for entry in top] == sorted((abs(entry[0]) for entry in top), reverse=True)
+    assert {entry[2] for entry in top} == {'biosphere'}
+    assert top[0][1] == 'Carbon dioxide, fossil'
+
+    # Same entries, labelled with their process
+    exchanges = find_most_impactful_exchanges(lca, top_n=3, aggregate_by='exchange')
+    assert [entry[0] for entry in exchanges] == [entry[0] for entry in top]
+    assert exchanges[0][1] == 'Carbon dioxide, fossil (electricity production)'
+
+    processes = find_most_impactful_exchanges(lca, top_n=10, aggregate_by='process')
+    assert np.isclose(sum(entry[0] for entry in processes), lca.score)
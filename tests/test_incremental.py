@@ -0,0 +1,31 @@
+import os
+
+import pandas as pd
+
+from conftest import TEST_METHODS
+from activity_modify import process_all_csvs_incremental
+
+
+def test_results_file_follows_the_manifest(test_database, tmp_path):
+    input_folder = tmp_path / 'coefficients'
+    input_folder.mkdir()
+    pd.DataFrame({
+        'activity_name': ['nickel mine operation'],
+        'activity_location': ['GLO'],
+        'VSI_modify': [True],
+        'sub_activity': ['Nickel'],
+        'coeff_2025': [0.5]
+    }).to_csv(input_folder / 'mine.csv', index=False)
+    results_file = str(tmp_path / 'results.parquet')
+
+    def run():
+        return process_all_csvs_incremental('vsi-tests', str(input_folder), TEST_METHODS, [test_database], [2025], results_file)
+
+    results_df = run()
+    assert len(results_df) == len(TEST_METHODS)
+    assert len(pd.read_parquet(results_file)) == len(TEST_METHODS)
+
+    # Nothing left to report: the results file is emptied with the manifest
+    os.remove(input_folder / 'mine.csv')
+    assert run().empty
+    assert pd.read_parquet(results_file).empty
@@ -0,0 +1,22 @@
+import numpy as np
+
+from activity_modify import load_coefficients, interpolate_missing_coefficients
+
+
+def test_interpolation_leaves_raw_coefficients_unchanged(coefficient_csv):
+    raw_df = load_coefficients(coefficient_csv)
+    coeff_df = interpolate_missing_coefficients(raw_df, years=[2025, 2030, 2035, 2040])
+
+    assert coeff_df is not raw_df
+    assert np.isnan(raw_df.loc[0, 'coeff_2030'])
+    assert 'coeff_2035' not in raw_df.columns
+    assert not np.isnan(coeff_df.loc[0, 'coeff_2030'])
+
+
+def test_interpolation_keeps_known_coefficients(coefficient_csv):
+    coeff_df = interpolate_missing_coefficients(load_coefficients(coefficient_csv), years=[2025, 2030, 2040])
+
+    assert np.allclose(coeff_df['coeff_2025'], [0.9, 0.8])
+    assert np.allclose(coeff_df['coeff_2040'], [0.5, 0.4])
+    assert np.isclose(coeff_df.loc[1, 'coeff_2030'], 0.7)
+    assert 0.5 < coeff_df.loc[0, 'coeff_2030'] < 0.9
@@ -0,0 +1,43 @@
+import bw2data as bd
+import numpy as np
+
+from conftest import TEST_METHODS
+from activity_modify import load_coefficients, interpolate_missing_coefficients, get_coefficient_sigmas
+from activity_modify import monte_carlo_activity, prepare_scaling_evaluator, evaluate_scaling
+from lifecycle import build_database_lca
+
+
+def test_interpolated_coefficients_get_combined_sigma(coefficient_csv):
+    # As in _monte_carlo_csv: the sigmas come from the raw coefficients, after interpolation
+    raw_df = load_coefficients(coefficient_csv)
+    interpolate_missing_coefficients(raw_df, years=[2025, 2030, 2035, 2040])
+
+    sigmas = get_coefficient_sigmas(raw_df, 'nickel mine operation', 'GLO', 2030, coefficient_sigma=0.1, interpolation_sigma=0.1)
+    assert np.isclose(sigmas['Carbon dioxide, fossil'], np.sqrt(0.1 ** 2 + 0.1 ** 2))
+    assert np.isclose(sigmas['Nickel'], 0.1)
+
+    # Years without a column in the CSV are interpolated for every row
+    sigmas = get_coefficient_sigmas(raw_df, 'nickel mine operation', 'GLO', 2035, coefficient_sigma=0.1, interpolation_sigma=0.1)
+    assert np.allclose(list(sigmas.values()), np.sqrt(0.02))
+
+
+def test_monte_carlo_centres_on_the_modified_scores(test_database):
+    activity = bd.get_node(database=test_database, code='mine')
+    lca = build_database_lca(activity, TEST_METHODS[0])
+    scaling_coefficients = {'Carbon dioxide, fossil': 0.7, 'Nickel': 1.3}
+    expected = evaluate_scaling(prepare_scaling_evaluator(activity, TEST_METHODS, lca=lca), scaling_coefficients)
+
+    # Without spread, every sample is the modified score, with or without sampling the (certain) exchanges
+    for exchange_uncertainty in (False, True):
+        scores_after, samples = monte_carlo_activity(
+            activity, scaling_coefficients, {}, TEST_METHODS, iterations=5, exchange_uncertainty=exchange_uncertainty, lca=lca, seed=1
+        )
+        assert np.allclose([scores_after[method] for method in TEST_METHODS], [expected[method] for method in TEST_METHODS])
+        assert np.allclose(samples, np.array([[expected[method]] for method in TEST_METHODS]))
+
+    # Lognormal coefficients: the median of the samples is the modified score
+    scores_after, samples = monte_carlo_activity(
+        activity, scaling_coefficients, {'Nickel': 0.1}, TEST_METHODS, iterations=20000, lca=lca, seed=1
+    )
+    assert np.allclose(np.median(samples, axis=1), [scores_after[method] for method in TEST_METHODS], rtol=1e-2)
+    assert samples[1].std() > 0
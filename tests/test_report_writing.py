@@ -0,0 +1,25 @@
+import openpyxl
+import pandas as pd
+
+from data_parsing import combine_csvs_into_excel
+
+
+def test_sheets_share_column_types(tmp_path):
+    # 'code' is numeric in the first group only, 'amount' is missing in the second group only
+    pd.DataFrame({
+        'activity_id': ['a', 'a', 'b'],
+        'code': ['1', '2', 'x1'],
+        'amount': [1, 2, None]
+    }).to_csv(tmp_path / 'contributions.csv', index=False)
+
+    output_file = tmp_path / 'report.xlsx'
+    combine_csvs_into_excel(str(tmp_path), ['contributions.csv'], str(output_file), progress_every=0)
+
+    workbook = openpyxl.load_workbook(output_file)
+    first, second = workbook['EF Contributions_1'], workbook['EF Contributions_2']
+    # Same values as the whole CSV read with pandas
+    assert [cell.value for cell in first[2]] == ['a', '1', 1.0]
+    assert [cell.value for cell in second[2]] == ['b', 'x1', None]
+
+    header = first['A1']
+    assert header.font.b and header.border.left.style == 'thin' and header.alignment.horizontal == 'center'
@@ -0,0 +1,28 @@
+import bw2data as bd
+import pandas as pd
+
+from conftest import TEST_METHODS
+from database_setup import results_to_dataframe
+
+
+def test_text_columns_can_be_filled_and_assigned(test_database):
+    activity = bd.get_node(database=test_database, code='mine')
+    exchange = {'exchange_id': 1, 'exchange_unit': 'kg', 'exchange_location': None, 'type': 'biosphere'}
+    results = {
+        (activity['name'], activity['location'], TEST_METHODS[0]): {
+            'activity': activity,
+            'impacts': [
+                dict(exchange, exchange_name='Carbon dioxide, fossil', impact=0.5, compartment=('air',)),
+                dict(exchange, exchange_name='Methane, fossil', impact=0.2, compartment=('air', 'urban air close to ground'))
+            ]
+        }
+    }
+
+    df = results_to_dataframe(results, 'vsi-tests', test_database)
+    assert df['sub_compartment'].isna().tolist() == [True, False]
+    assert not any(isinstance(dtype, pd.CategoricalDtype) for dtype in df.dtypes)
+
+    df['sub_compartment'] = df['sub_compartment'].fillna('unspecified')
+    df.loc[0, 'sub_activity'] = 'Carbon dioxide, non-fossil'
+    assert df['sub_compartment'].tolist() == ['unspecified', 'urban air close to ground']
+    assert len(df.groupby('impact_indicator', dropna=False)) == 1
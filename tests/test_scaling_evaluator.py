@@ -0,0 +1,50 @@
+import bw2calc as bc
+import bw2data as bd
+import numpy as np
+import pytest
+
+from conftest import TEST_METHODS
+from activity_modify import prepare_scaling_evaluator, evaluate_scaling, evaluate_scaling_array
+from lifecycle import build_database_lca, lca_matrix_index
+
+
+def full_scores(activity, scaling_coefficients):
+    """Scores of the activity from a full lci()/lcia(), with its biosphere exchanges scaled in the matrix."""
+    scores = {}
+    for method in TEST_METHODS:
+        lca = bc.LCA({activity: 1}, method)
+        lca.load_lci_data()
+        activity_col = lca_matrix_index(lca.dicts.activity, activity)
+        for exc in activity.biosphere():
+            flow_row = lca_matrix_index(lca.dicts.biosphere, exc.input)
+            lca.biosphere_matrix[flow_row, activity_col] *= scaling_coefficients.get(exc.input['name'], 1)
+        lca.lci()
+        lca.lcia()
+        scores[method] = lca.score
+    return scores
+
+
+# The mine sends its tailings to a waste treatment, whose production amount is negative
+@pytest.mark.parametrize('code', ['mine', 'tailings', 'refining'])
+def test_evaluator_matches_full_lcia(test_database, code):
+    activity = bd.get_node(database=test_database, code=code)
+    evaluator = prepare_scaling_evaluator(activity, TEST_METHODS, lca=build_database_lca(activity, TEST_METHODS[0]))
+
+    unchanged = full_scores(activity, {})
+    assert np.allclose(evaluator['scores_before'], [unchanged[method] for method in TEST_METHODS])
+
+    scaling_coefficients = {'Carbon dioxide, fossil': 0.7, 'Methane, fossil': 0.5, 'Nickel': 1.3}
+    expected = full_scores(activity, scaling_coefficients)
+    assert not np.allclose([expected[method] for method in TEST_METHODS], [unchanged[method] for method in TEST_METHODS])
+    results_after = evaluate_scaling(evaluator, scaling_coefficients)
+    for method in TEST_METHODS:
+        assert np.isclose(results_after[method], expected[method], rtol=1e-6)
+
+    # One column per set of coefficients
+    coefficient_matrix = np.array([
+        [scaling_coefficients.get(name, 1) for name in evaluator['names']],
+        np.ones(len(evaluator['names']))
+    ]).T
+    scores = evaluate_scaling_array(evaluator, coefficient_matrix)
+    assert np.allclose(scores[:, 0], [expected[method] for method in TEST_METHODS], rtol=1e-6)
+    assert np.allclose(scores[:, 1], [unchanged[method] for method in TEST_METHODS], rtol=1e-6)
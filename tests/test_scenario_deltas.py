@@ -0,0 +1,72 @@
+import bw2data as bd
+import numpy as np
+import pytest
+
+from conftest import TEST_METHODS
+from lifecycle import run_comprehensive_lcia
+from scenario_deltas import convert_scenario_databases, run_scenario_lcia, scenario_activities
+
+
+@pytest.fixture
+def scenario_database(test_database):
+    """Copy of the test database with less electricity for the mine, and a new recycling activity."""
+    db_name = 'test scenario'
+    if db_name in bd.databases:
+        del bd.databases[db_name]
+
+    data = {}
+    for activity in bd.Database(test_database):
+        exchanges = []
+        for exc in activity.exchanges():
+            database, code = exc.input.key
+            exchanges.append({
+                'input': (db_name, code) if database == test_database else exc.input.key,
+                'amount': exc['amount'] * (0.5 if activity['code'] == 'mine' and code == 'elec' else 1),
+                'type': exc['type']
+            })
+        data[(db_name, activity['code'])] = {
+            field: activity[field] for field in ('name', 'reference product', 'location', 'unit')
+        } | {'exchanges': exchanges}
+    data[(db_name, 'recycling')] = {
+        'name': 'nickel recycling', 'reference product': 'nickel, class 1', 'location': 'GLO', 'unit': 'kg',
+        'exchanges': [
+            {'input': (db_name, 'recycling'), 'amount': 1, 'type': 'production'},
+            {'input': (db_name, 'elec'), 'amount': 1.5, 'type': 'technosphere'},
+        ]}
+    bd.Database(db_name).write(data)
+
+    yield db_name
+    if db_name in bd.databases:
+        del bd.databases[db_name]
+
+
+def test_new_activities_keep_their_ids(test_database, scenario_database, tmp_path):
+    recycling = bd.get_node(database=scenario_database, code='recycling')
+    expected = run_comprehensive_lcia(recycling, TEST_METHODS)
+
+    convert_scenario_databases([scenario_database], str(tmp_path), base_db=test_database, delete_databases=True)
+    assert scenario_database not in bd.databases
+
+    # Nodes created after the conversion don't change the ids of the scenario
+    bd.Database('test other').write({('test other', 'x'): {'name': 'x', 'exchanges': []}})
+    activities = scenario_activities(scenario_database, str(tmp_path))
+    del bd.databases['test other']
+    assert activities.loc[activities['code'] == 'recycling', 'id'].tolist() == [recycling.id]
+
+    scores = run_scenario_lcia(scenario_database, str(tmp_path), 'nickel recycling', 'nickel, class 1', 'GLO', TEST_METHODS)
+    for method in TEST_METHODS:
+        assert np.isclose(scores[method], expected[method])
+
+
+def test_uncertain_databases_are_kept(test_database, scenario_database, tmp_path):
+    exc = next(iter(bd.get_node(database=scenario_database, code='mine').biosphere()))
+    exc['uncertainty type'] = 2
+    exc['loc'] = np.log(exc['amount'])
+    exc['scale'] = 0.1
+    exc.save()
+
+    convert_scenario_databases([scenario_database], str(tmp_path), base_db=test_database, delete_databases=True)
+    assert scenario_database in bd.databases
+
+    convert_scenario_databases([scenario_database], str(tmp_path), base_db=test_database, delete_databases=True, discard_metadata=True)
+    assert scenario_database not in bd.databases
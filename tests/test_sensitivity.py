@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+from conftest import TEST_METHODS
+from activity_modify import rank_coefficients
+
+
+def test_rank_coefficients(test_database, tmp_path):
+    pd.DataFrame({
+        'activity_name': ['nickel mine operation'] * 2,
+        'activity_location': ['GLO'] * 2,
+        'VSI_modify': [True, True],
+        'sub_activity': ['Carbon dioxide, fossil', 'Nickel'],
+        'coeff_2025': [0.7, 1.3]
+    }).to_csv(tmp_path / 'mine.csv', index=False)
+
+    rankings = rank_coefficients('vsi-tests', str(tmp_path), TEST_METHODS, [test_database], [2025], interpolate=False)
+    assert len(rankings) == 2 * len(TEST_METHODS)
+    assert np.allclose(rankings['First Order'], rankings['Total Order'])
+    assert np.allclose(rankings.groupby('Method')['First Order'].sum(), 1)
+
+    # Only carbon dioxide has a climate change factor, only nickel an ecotoxicity factor
+    top = rankings[rankings['Rank'] == 1].set_index('Method')['sub_activity']
+    assert top[TEST_METHODS[0]] == 'Carbon dioxide, fossil'
+    assert top[TEST_METHODS[1]] == 'Nickel'
+
+    # Certain coefficients: no variance to share out, so no ranking
+    rankings = rank_coefficients(
+        'vsi-tests', str(tmp_path), TEST_METHODS, [test_database], [2025], interpolate=False,
+        coefficient_sigma=0, interpolation_sigma=0
+    )
+    assert rankings['First Order'].isna().all() and rankings['Total Order'].isna().all()
+    assert rankings['Rank'].isna().all()
@@ -0,0 +1,28 @@
+import bw2data as bd
+import numpy as np
+
+from conftest import TEST_METHODS
+from lifecycle import build_database_lca, traverse_supply_chain
+
+
+def test_waste_treatment_nodes(test_database):
+    activity = bd.get_node(database=test_database, code='refining')
+    lca = build_database_lca(activity, TEST_METHODS[1])
+    lca.lcia()
+
+    tree = traverse_supply_chain(activity, TEST_METHODS[1], lca=lca, cutoff=0)
+    assert np.isclose(tree[0]['cumulative_impact'], lca.score)
+
+    # The tailings sent by the mine are treated by the waste treatment, whose production amount is negative
+    tailings = [node for node in tree if node['key'] == (test_database, 'tailings')]
+    assert tailings
+    for node in tailings:
+        assert node['name'] == 'treatment of tailings'
+        assert tree[node['parent']]['name'] == 'nickel mine operation'
+        assert node['amount'] < 0
+
+    # Every expanded node is the sum of its own emissions, its cut-off inputs and its children
+    for position, node in enumerate(tree):
+        if node['expanded']:
+            children = sum(child['cumulative_impact'] for child in tree if child['parent'] == position)
+            assert np.isclose(node['cumulative_impact'], node['direct_impact'] + node['cutoff_impact'] + children)